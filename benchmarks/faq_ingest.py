@@ -0,0 +1,81 @@
+"""
+Memory and time of reading the FAQ spreadsheet for the import.
+
+Generates a workbook with many properties (answer columns) spread over several sheets and reads
+it with src.faq_reader.iter_faq_records, reporting the records per second and the peak Python
+memory (tracemalloc). With --compare-pandas the old pd.read_excel + iterrows path is measured too.
+
+    python benchmarks/faq_ingest.py --rows 2000 --properties 300 --sheets 2
+    python benchmarks/faq_ingest.py --rows 2000 --properties 300 --compare-pandas
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.faq_reader import iter_faq_records
+
+
+def write_workbook(path, rows, properties, sheets):
+    workbook = openpyxl.Workbook(write_only=True)
+    locations = [f"Hotel {index}" for index in range(properties)]
+    for sheet_index in range(sheets):
+        worksheet = workbook.create_sheet(f"FAQ {sheet_index + 1}")
+        worksheet.append(["Frage von onsai ergänzt", "Spezifisch", "Zur Bearbeitung", "language"] + locations)
+        for row in range(rows // sheets):
+            worksheet.append(
+                [f"Frage {sheet_index}-{row}, Variante {row}", "ja" if row % 5 == 0 else "nein", "x" if row % 50 == 0 else None, "de-DE"]
+                + [f"Antwort {row} für {location}" if (row + index) % 3 else None for index, location in enumerate(locations)]
+            )
+    workbook.save(path)
+    return locations
+
+
+def measure(name, read):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = read()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<10} {count:>9} records  {seconds:7.2f}s  {count / seconds:>9.0f} records/s  peak {peak / 2**20:7.1f} MiB")
+
+
+def read_pandas(path, locations):
+    import pandas as pd
+    count = 0
+    for df in pd.read_excel(path, engine="openpyxl", sheet_name=None).values():
+        df.columns = [str(col).lower() for col in df.columns]
+        for _, row in df.iterrows():
+            if pd.isna(row.get("frage von onsai ergänzt")) or "x" in str(row.get("zur bearbeitung")).lower():
+                continue
+            phrases = [phrase for phrase in str(row["frage von onsai ergänzt"]).split(",") if phrase.strip()]
+            count += len(phrases) * sum(1 for location in locations if not pd.isna(row.get(location.lower())))
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the FAQ spreadsheet ingestion")
+    parser.add_argument("--rows", type=int, default=2000, help="FAQ rows over all sheets")
+    parser.add_argument("--properties", type=int, default=300, help="Answer columns (properties)")
+    parser.add_argument("--sheets", type=int, default=2)
+    parser.add_argument("--compare-pandas", action="store_true", help="Also measure pd.read_excel + iterrows")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "faq.xlsx")
+        locations = write_workbook(path, args.rows, args.properties, args.sheets)
+        print(f"Workbook: {args.rows} rows, {args.properties} properties, {args.sheets} sheets, {os.path.getsize(path) / 2**20:.1f} MiB")
+        measure("streaming", lambda: sum(1 for _ in iter_faq_records(path, locations)))
+        if args.compare_pandas:
+            measure("pandas", lambda: read_pandas(path, locations))
+
+
+if __name__ == "__main__":
+    main()
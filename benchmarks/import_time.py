@@ -0,0 +1,112 @@
+"""
+Cold start benchmark for the Lambda handler.
+
+Imports lambda_function in fresh interpreters with `python -X importtime`, reports the import
+(cold start) time and the slowest modules, and compares against a baseline. Exits with status 1
+if the median import time regressed by more than the tolerance.
+
+    python benchmarks/import_time.py --update-baseline
+    python benchmarks/import_time.py --runs 5 --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "import_time_baseline.json")
+
+# placeholders for the variables read at import time, no request is made
+DUMMY_ENV = {
+    "TWILIO_ACCOUNT_SID": "AC00000000000000000000000000000000",
+    "TWILIO_AUTH_TOKEN": "benchmark",
+    "AZURE_LLM_URL": "https://localhost",
+    "AZURE_LLM_KEY": "benchmark",
+    "OPENAI_API_AZURE_KEY": "benchmark",
+    "OPENAI_AZURE_BASE_URL": "https://localhost",
+    "PINECONE_API_KEY": "benchmark",
+    "DYNAMO_DB_TABLE": "benchmark",
+    "AWS_DEFAULT_REGION": "eu-central-1",
+}
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+
+def measure(module):
+    """
+    Import the module in a fresh interpreter.
+
+    Returns:
+        seconds (float): Wall time of the import
+        modules (dict): Cumulative import time in microseconds per top-level package (outermost import)
+    """
+    env = {**DUMMY_ENV, **os.environ}
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            name = match.group(3).split(".")[0]
+            modules[name] = max(modules.get(name, 0), int(match.group(2)))
+    return float(result.stdout.strip().splitlines()[-1]), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="lambda_function", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure, the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest packages to print")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression against the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run as the new baseline")
+    args = parser.parse_args()
+
+    # the first run compiles the bytecode, it is not a realistic cold start
+    measure(args.module)
+    runs = [measure(args.module) for _ in range(args.runs)]
+    seconds = statistics.median(run[0] for run in runs)
+    modules = {
+        name: statistics.median(run[1].get(name, 0) for run in runs)
+        for name in runs[0][1]
+    }
+
+    print(f"Cold start: import {args.module} took {seconds:.3f}s (median of {args.runs} runs)")
+    for name, micros in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {name:<30} {micros / 1e6:.3f}s")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "module": args.module,
+                "seconds": round(seconds, 3),
+                "python": sys.version.split()[0],
+                "measured_at": time.strftime("%Y-%m-%d"),
+            }, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline first")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    limit = baseline["seconds"] * (1 + args.tolerance)
+    print(f"Baseline: {baseline['seconds']:.3f}s, limit {limit:.3f}s")
+    if seconds > limit:
+        print(f"REGRESSION: cold start import is {seconds / baseline['seconds'] - 1:.0%} slower than the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
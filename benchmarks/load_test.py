@@ -0,0 +1,135 @@
+"""
+Load test for the AudioCodes conversation endpoints of one worker.
+
+Simulates concurrent phone calls (start activity followed by a few caller utterances) against a
+running server, e.g. the local docker-compose setup, and reports turn latencies per concurrency
+level and the highest concurrency whose p95 stays below the warning threshold.
+
+    python benchmarks/load_test.py --url http://localhost:5000 --label after --output after.json
+    python benchmarks/load_test.py --url http://localhost:5000 --label before --compare after.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+import httpx
+
+UTTERANCES = [
+    "Wann gibt es Frühstück?",
+    "Gibt es einen Parkplatz?",
+    "Wie lautet das WLAN Passwort?",
+    "Danke",
+]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+async def simulate_call(client, base_url, turns, latencies, errors):
+    conversation_id = str(uuid.uuid4())
+    activities_url = f"{base_url}/conversation/activities/{conversation_id}"
+    caller = "4917" + str(uuid.uuid4().int)[:9]
+    start_activity = {"activities": [{
+        "type": "event",
+        "name": "start",
+        "parameters": {"caller": caller, "callerDisplayName": "Load Test"},
+    }]}
+    try:
+        await client.post(f"{base_url}/", json={"conversation": conversation_id})
+        await client.post(activities_url, json=start_activity)
+        for turn in range(turns):
+            message_activity = {"activities": [{
+                "type": "message",
+                "text": UTTERANCES[turn % len(UTTERANCES)],
+                "parameters": {
+                    "caller": caller,
+                    "recognitionOutput": {"PrimaryLanguage": {"Language": "de-DE"}},
+                },
+            }]}
+            start_time = time.perf_counter()
+            response = await client.post(activities_url, json=message_activity)
+            latencies.append(time.perf_counter() - start_time)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+    except httpx.HTTPError as e:
+        errors.append(str(e))
+
+
+async def run_level(base_url, concurrency, calls, turns, timeout):
+    latencies = []
+    errors = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def limited_call():
+            async with semaphore:
+                await simulate_call(client, base_url, turns, latencies, errors)
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(limited_call() for _ in range(calls)))
+        duration = time.perf_counter() - start_time
+
+    return {
+        "concurrency": concurrency,
+        "calls": calls,
+        "turns": len(latencies),
+        "errors": len(errors),
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "max": max(latencies, default=0.0),
+        "mean": statistics.mean(latencies) if latencies else 0.0,
+        "turns_per_second": len(latencies) / duration if duration else 0.0,
+    }
+
+
+def print_results(label, results, max_p95):
+    print(f"\n{label}")
+    print(f"{'conc':>5} {'turns':>6} {'err':>4} {'p50 s':>7} {'p95 s':>7} {'max s':>7} {'turns/s':>8}")
+    for result in results:
+        print(f"{result['concurrency']:>5} {result['turns']:>6} {result['errors']:>4} {result['p50']:>7.2f} "
+              f"{result['p95']:>7.2f} {result['max']:>7.2f} {result['turns_per_second']:>8.2f}")
+    sustainable = [r["concurrency"] for r in results if r["p95"] <= max_p95 and not r["errors"]]
+    print(f"Sustainable concurrency (p95 <= {max_p95}s, no errors): {max(sustainable, default=0)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000", help="Base URL of the running server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5, 10, 20, 40], help="Concurrent calls per level")
+    parser.add_argument("--calls-per-level", type=int, default=None, help="Calls per level (default: 2 x concurrency)")
+    parser.add_argument("--turns", type=int, default=3, help="Caller utterances per call")
+    parser.add_argument("--timeout", type=float, default=30.0, help="HTTP timeout in seconds")
+    parser.add_argument("--max-p95", type=float, default=3.0, help="Latency budget, matches call.timeout.warning_threshold_seconds")
+    parser.add_argument("--label", default="run", help="Name of this run, e.g. before/after")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous run to print next to this one")
+    args = parser.parse_args()
+
+    results = []
+    for concurrency in args.concurrency:
+        calls = args.calls_per_level or concurrency * 2
+        results.append(await run_level(args.url.rstrip("/"), concurrency, calls, args.turns, args.timeout))
+        print(f"concurrency {concurrency}: p95 {results[-1]['p95']:.2f}s")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print_results(previous["label"], previous["results"], args.max_p95)
+    print_results(args.label, results, args.max_p95)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"label": args.label, "url": args.url, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
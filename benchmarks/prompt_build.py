@@ -0,0 +1,87 @@
+"""
+Micro-benchmark of the per-turn system prompt assembly.
+
+Compares the previous approach (JSON schemas generated and the whole template formatted on every
+turn) with the precompiled template of default_prompt.get_system_prompt_template, and checks that
+both produce the same prompt. Also prints the estimated tokens per segment of the "prefix_cache"
+layout and checks that its system prompt does not change between turns.
+
+    python benchmarks/prompt_build.py --turns 2000
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import default_prompt
+from src.config import get_settings
+from src.helpers import get_current_date_with_weekday
+from src.pydantic_models import FAQResponse, Booking, Farewell, EmployeeHandover
+
+CONTEXT = "\nContext 1: Das Frühstück gibt es von 6:30 bis 10:30 Uhr.\nContext 2: Parkplätze gibt es in der Tiefgarage."
+PHONE_NUMBER = "+4917612345678"
+
+
+def build_uncached(context, language, guest_phone_number):
+    settings = get_settings()
+    template = default_prompt.SYSTEM_PROMPT_TEMPLATE_EN if language == "en-US" else default_prompt.SYSTEM_PROMPT_TEMPLATE_DE
+    return template.format(
+        str_date=get_current_date_with_weekday(language=language),
+        context=context,
+        guest_phone_number=guest_phone_number,
+        faq_schema=json.dumps(FAQResponse.model_json_schema(), indent=2),
+        booking_schema=json.dumps(Booking.model_json_schema(), indent=2),
+        farewell_schema=json.dumps(Farewell.model_json_schema(), indent=2),
+        employee_handover_schema=json.dumps(EmployeeHandover.model_json_schema(), indent=2),
+        bot_name=settings.bot.name,
+        hotel_brand=settings.hotel_info.hotel_brand,
+    )
+
+
+def build_cached(context, language, guest_phone_number):
+    # get_system_prompt_template prints its inputs, which is not part of the cost we measure
+    with contextlib.redirect_stdout(io.StringIO()):
+        return default_prompt.get_system_prompt_template(context, language=language, guest_phone_number=guest_phone_number)
+
+
+def build_prefix_cache(context, language, guest_phone_number):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return default_prompt.get_prefix_cache_prompt(context, language=language, guest_phone_number=guest_phone_number)
+
+
+def measure(build, turns, language):
+    start = time.perf_counter()
+    for _ in range(turns):
+        build(CONTEXT, language, PHONE_NUMBER)
+    return (time.perf_counter() - start) / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=2000, help="Prompts to build per variant")
+    args = parser.parse_args()
+
+    for language in ["de-DE", "en-US"]:
+        if build_uncached(CONTEXT, language, PHONE_NUMBER) != build_cached(CONTEXT, language, PHONE_NUMBER):
+            raise SystemExit(f"The precompiled prompt differs from the formatted template for {language}")
+        uncached = measure(build_uncached, args.turns, language)
+        cached = measure(build_cached, args.turns, language)
+        print(f"{language}: uncached {uncached * 1e6:8.1f} us/turn, precompiled {cached * 1e6:8.1f} us/turn ({uncached / cached:.1f}x)")
+
+        system_prompt, turn_context = build_prefix_cache(CONTEXT, language, PHONE_NUMBER)
+        if build_prefix_cache("\nContext 1: Anderer Kontext.", language, "+4930123456")[0] != system_prompt:
+            raise SystemExit(f"The prefix_cache system prompt depends on the turn for {language}")
+        inline_tokens = default_prompt.estimate_tokens(build_cached(CONTEXT, language, PHONE_NUMBER))
+        print(
+            f"{language}: inline prompt ~{inline_tokens} tokens, prefix_cache static system prompt "
+            f"~{default_prompt.estimate_tokens(system_prompt)} tokens + turn context ~{default_prompt.estimate_tokens(turn_context)} tokens"
+        )
+
+
+if __name__ == "__main__":
+    main()
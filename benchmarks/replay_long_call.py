@@ -0,0 +1,115 @@
+"""
+Replay of a long phone call to check that the LLM input per turn stays flat.
+
+Replays a scripted call of 40 turns (FAQ questions, then a booking) and reports for every turn
+the estimated input tokens of the full history and of the history compacted by
+history_manager.HistoryManager. With --live the compacted messages are sent to the configured
+Azure chat model and the latency per turn is reported as well (needs AZURE_LLM_URL/KEY).
+Exits with status 1 if the compacted input of the last turns is more than the tolerance above
+the input of the first compacted turns.
+
+    python benchmarks/replay_long_call.py --turns 40
+    python benchmarks/replay_long_call.py --turns 40 --live
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import default_prompt
+from src.history_manager import HistoryManager
+
+CONTEXT = "\nContext 1: Das Frühstück gibt es von 6:30 bis 10:30 Uhr.\nContext 2: Parkplätze gibt es in der Tiefgarage."
+PHONE_NUMBER = "+4917612345678"
+
+FAQ_TURNS = [
+    ("Wann gibt es Frühstück?", "Frühstück gibt es von 6:30 bis 10:30 Uhr im Restaurant im Erdgeschoss."),
+    ("Gibt es einen Parkplatz?", "Ja, Parkplätze gibt es in der Tiefgarage direkt unter dem Hotel."),
+    ("Wie lautet das WLAN Passwort?", "Das WLAN Passwort bekommst du beim Check-In an der Rezeption."),
+    ("Darf ich meinen Hund mitbringen?", "Hunde sind bei uns herzlich willkommen, wir berechnen eine kleine Reinigungsgebühr."),
+]
+BOOKING_TURNS = [
+    ("Ich möchte ein Zimmer buchen.", {"arrival_date": None}),
+    ("Vom 12. bis 14. Dezember.", {"arrival_date": "2026-12-12", "departure_date": "2026-12-14"}),
+    ("Für zwei Erwachsene.", {"number_of_adults": 2}),
+    ("Max Mustermann.", {"first_name": "Max", "last_name": "Mustermann"}),
+    ("Ja, an diese Nummer.", {"guest_whatsapp_number": PHONE_NUMBER}),
+]
+
+
+def script(turns):
+    """
+    Yields (user_query, assistant_json, booking_slots) for every turn, FAQ questions first.
+    """
+    faq_turns = max(turns - len(BOOKING_TURNS), 0)
+    for index in range(faq_turns):
+        user_query, answer = FAQ_TURNS[index % len(FAQ_TURNS)]
+        yield user_query, {"mode": "faq", "response": answer, "booking": False, "follow_up": "Kann ich dir sonst noch helfen?"}, {}
+    for user_query, slots in BOOKING_TURNS[:turns - faq_turns]:
+        yield user_query, {"mode": "booking", "booking": True, "response": "Alles klar, ich habe mir das notiert.", **slots}, slots
+
+
+def count_tokens(messages):
+    return sum(default_prompt.estimate_tokens(message["content"]) for message in messages)
+
+
+async def complete(messages):
+    from src.clients import get_chat_client
+    start = time.perf_counter()
+    await get_chat_client().complete(messages=messages, response_format="json_object", temperature=0, max_tokens=4000)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=40, help="Turns of the replayed call")
+    parser.add_argument("--keep-exchanges", type=int, default=6, help="HistoryManager keep_exchanges")
+    parser.add_argument("--max-tokens", type=int, default=3000, help="HistoryManager max_tokens")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed growth of the compacted input")
+    parser.add_argument("--live", action="store_true", help="Send the compacted messages to the chat model and report latencies")
+    args = parser.parse_args()
+
+    manager = HistoryManager(keep_exchanges=args.keep_exchanges, max_tokens=args.max_tokens)
+    with contextlib.redirect_stdout(io.StringIO()):
+        system_prompt = default_prompt.get_system_prompt_template(CONTEXT, language="de-DE", guest_phone_number=PHONE_NUMBER)
+    history = [
+        {"role": "system", "content": system_prompt},
+        {"role": "assistant", "content": default_prompt.get_ai_prompt_template(language="de-DE")},
+    ]
+    booking_data = {}
+    loop = asyncio.new_event_loop()
+
+    compacted_tokens = []
+    print(f"{'turn':>4} {'full':>8} {'compacted':>10} {'compact ms':>11}" + (f" {'llm s':>7}" if args.live else ""))
+    for turn, (user_query, assistant_json, slots) in enumerate(script(args.turns), start=1):
+        history.append({"role": "user", "content": user_query})
+        start = time.perf_counter()
+        messages = manager.compact(history, booking_data)
+        compact_ms = (time.perf_counter() - start) * 1000
+        compacted_tokens.append(count_tokens(messages))
+        line = f"{turn:>4} {count_tokens(history):>8} {compacted_tokens[-1]:>10} {compact_ms:>11.3f}"
+        if args.live:
+            line += f" {loop.run_until_complete(complete(messages)):>7.2f}"
+        print(line)
+        history.append({"role": "assistant", "content": json.dumps(assistant_json, ensure_ascii=False)})
+        booking_data.update(slots)
+
+    window = max(len(compacted_tokens) // 4, 1)
+    # the first keep_exchanges turns grow until the window is full
+    first = statistics.mean(compacted_tokens[args.keep_exchanges:args.keep_exchanges + window] or compacted_tokens[:window])
+    last = statistics.mean(compacted_tokens[-window:])
+    print(f"Compacted input: {first:.0f} tokens after the window filled, {last:.0f} tokens in the last {window} turns")
+    if last > first * (1 + args.tolerance):
+        print(f"REGRESSION: the compacted input grew by {last / first - 1:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
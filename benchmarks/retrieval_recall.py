@@ -0,0 +1,133 @@
+"""
+Offline recall@k of the FAQ retrieval on a labelled set of caller questions.
+
+Compares the vector search (local index on the embedding store), the BM25 index and the hybrid
+reciprocal rank fusion of both, and reports how often the lexical shortcut fires and how often
+its answer is right. The labelled set is a JSON lines file, one caller question per line:
+
+    {"question": "WLAN Passwort?", "location": "Demo Hotel", "language": "de-DE", "expected": ["Wie lautet das WLAN Passwort?"]}
+
+"expected" lists the relevant FAQ entries as vector IDs or as FAQ question phrases (compared
+case-insensitively with the question part of the metadata text). The vector rankings need the
+embeddings API (OPENAI_API_AZURE_*); --lexical-only evaluates the BM25 index alone.
+--check-fusion runs a built-in case without a store: a non-exact lexical-only hit outranks the
+second vector hit and must not push it out of the hybrid top 2.
+
+    python benchmarks/retrieval_recall.py data/caller_questions.jsonl --k 1 2 5
+    python benchmarks/retrieval_recall.py data/caller_questions.jsonl --lexical-only
+    python benchmarks/retrieval_recall.py --check-fusion
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import load_config
+from src.embedding_store import EmbeddingStore
+from src.lexical_index import LexicalIndex, question_of, reciprocal_rank_fusion
+from src.local_index import LocalVectorIndex
+
+
+def load_questions(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def embed_questions(questions, batch_size=16):
+    from src.clients import get_openai_client
+    model = os.getenv("OPENAI_API_AZURE_EMBEDDING")
+    # same preprocessing as backend.preprocess_query_for_embedding
+    texts = [question["question"].strip().strip('.').strip(',').strip('?').strip('!').lower() for question in questions]
+    embeddings = []
+    for start in range(0, len(texts), batch_size):
+        response = get_openai_client().embeddings.create(input=texts[start:start + batch_size], model=model)
+        embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+    return embeddings
+
+
+def is_confident(match):
+    # same rule as bot_embeddings.is_confident, applied to the fused matches before the cut to top_k
+    return match["score"] > 0.5 or match.get("exact", False)
+
+
+def check_fusion():
+    """
+    A non-exact lexical-only hit ranks between the two vector hits after the fusion; it has no
+    cosine score, so the confidence filter must drop it before the cut to the top 2.
+    """
+    def match(vector_id, score, exact=False):
+        return {"id": vector_id, "score": score, "metadata": {"text": f"{vector_id}: answer"}, "exact": exact}
+
+    vector = [match("parking", 0.82), match("garage", 0.74)]
+    lexical = [match("parking_fee", 3.1), match("parking", 2.4)]
+    fused = reciprocal_rank_fusion({"vector": vector, "lexical": lexical}, top_k=2, keep=is_confident)
+    unfiltered = [entry for entry in reciprocal_rank_fusion({"vector": vector, "lexical": lexical}, top_k=2) if is_confident(entry)]
+    ids = [entry["id"] for entry in fused]
+    print(f"fusion check: filter before cut {ids}, filter after cut {[entry['id'] for entry in unfiltered]}")
+    return ids == ["parking", "garage"]
+
+
+def is_relevant(match, expected):
+    return match["id"] in expected or question_of(match["metadata"].get("text", "")).strip().lower() in expected
+
+
+def main():
+    config = load_config()
+    retrieval_config = config.get("retrieval", {})
+    hybrid_config = retrieval_config.get("hybrid", {})
+    parser = argparse.ArgumentParser(description="Recall@k of the vector, lexical and hybrid FAQ retrieval")
+    parser.add_argument("questions", nargs="?", help="Labelled caller questions (JSON lines)")
+    parser.add_argument("--store", default=retrieval_config.get("local", {}).get("store_path", "data/embedding_store"))
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 5])
+    parser.add_argument("--candidates", type=int, default=hybrid_config.get("candidates", 10))
+    parser.add_argument("--rrf-k", type=int, default=hybrid_config.get("rrf_k", 60))
+    parser.add_argument("--min-coverage", type=float, default=hybrid_config.get("shortcut_min_coverage", 0.6))
+    parser.add_argument("--lexical-only", action="store_true", help="Do not call the embeddings API")
+    parser.add_argument("--check-fusion", action="store_true", help="Only run the built-in fusion case")
+    args = parser.parse_args()
+
+    if args.check_fusion:
+        sys.exit(0 if check_fusion() else 1)
+    if not args.questions:
+        parser.error("the questions file is required")
+
+    questions = load_questions(args.questions)
+    store = EmbeddingStore.load(args.store)
+    lexical_index = LexicalIndex.from_store(store)
+    vector_index = None if args.lexical_only else LocalVectorIndex.from_store(store)
+    embeddings = None if args.lexical_only else embed_questions(questions)
+    depth = max(max(args.k), args.candidates)
+
+    hits = {}
+    shortcuts = shortcut_hits = 0
+    for position, question in enumerate(questions):
+        expected = set(question["expected"]) | {value.strip().lower() for value in question["expected"]}
+        query_filter = {"location": question["location"], "language": question.get("language", "de-DE")}
+        lexical = lexical_index.query(question["question"], top_k=depth, filter=query_filter, min_coverage=args.min_coverage)["results"][0]["matches"]
+        rankings = {"lexical": lexical}
+        if vector_index is not None:
+            vector = vector_index.query(embeddings[position], top_k=depth, filter=query_filter)["results"][0]["matches"]
+            rankings["vector"] = vector
+            rankings["hybrid"] = reciprocal_rank_fusion({"vector": vector[:args.candidates], "lexical": lexical[:args.candidates]}, k=args.rrf_k, top_k=depth, keep=is_confident)
+        for name, matches in rankings.items():
+            for k in args.k:
+                hits.setdefault((name, k), 0)
+                hits[(name, k)] += any(is_relevant(match, expected) for match in matches[:k])
+        exact = [match for match in lexical if match["exact"]]
+        if exact:
+            shortcuts += 1
+            shortcut_hits += is_relevant(exact[0], expected)
+
+    print(f"{len(questions)} questions, {len(store)} FAQ entries in {args.store}")
+    for name in ["vector", "lexical", "hybrid"]:
+        if (name, args.k[0]) in hits:
+            print(f"{name:<8} " + "  ".join(f"recall@{k}: {hits[(name, k)] / len(questions):.3f}" for k in args.k))
+    if questions:
+        precision = f"{shortcut_hits / shortcuts:.3f}" if shortcuts else "-"
+        print(f"lexical shortcut: {shortcuts / len(questions):.3f} of the questions, precision@1 {precision}")
+
+
+if __name__ == "__main__":
+    main()
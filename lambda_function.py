@@ -1,4 +1,31 @@
-from mangum import Mangum 
+import asyncio
+import json
+from mangum import Mangum
 from src.server import app
+from src.booking_worker import run_booking_job
+from src.backend import booking_queue_config
 
-lambda_handler = Mangum(app, lifespan="off")
\ No newline at end of file
+# one event loop per container, shared by Mangum and the booking jobs of the SQS path
+loop = asyncio.new_event_loop()
+asyncio.set_event_loop(loop)
+
+http_handler = Mangum(app, lifespan="off")
+
+
+def lambda_handler(event, context):
+    records = event.get("Records", []) if isinstance(event, dict) else []
+    if records and records[0].get("eventSource") == "aws:sqs":
+        # booking jobs from the booking queue; failed jobs are reported as batch item failures, so
+        # SQS retries them (needs ReportBatchItemFailures on the event source mapping) and moves
+        # them to the dead-letter queue after max_attempts receives
+        failures = []
+        for record in records:
+            attempt = int(record.get("attributes", {}).get("ApproximateReceiveCount", 1))
+            final_attempt = attempt >= booking_queue_config.get("max_attempts", 3)
+            try:
+                loop.run_until_complete(run_booking_job(json.loads(record["body"]), final_attempt=final_attempt))
+            except Exception as e:
+                print(f"Booking job of message {record['messageId']} failed (attempt {attempt}): {e}")
+                failures.append({"itemIdentifier": record["messageId"]})
+        return {"batchItemFailures": failures}
+    return http_handler(event, context)
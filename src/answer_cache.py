@@ -0,0 +1,134 @@
+import os
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+from src.embedding_cache import normalize_text
+
+
+def read_faq_version(path):
+    """
+    Read the FAQ version marker written by data_import.py. Returns None if there is none.
+    """
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _faq_version_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def write_faq_version(path):
+    """
+    Write a new FAQ version marker. Called after every FAQ re-import to invalidate cached answers.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    version = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    with open(path, "w") as f:
+        f.write(version)
+    return version
+
+
+class AnswerCache:
+    """
+    Semantic cache for FAQ-mode LLM answers.
+
+    Answers are grouped by (property_name, language, IDs of the retrieved FAQ matches). Within a
+    group, a query is answered from the cache if it matches a stored query exactly (after
+    normalization) or if the cosine similarity of the query embeddings reaches similarity_threshold.
+    The whole cache is dropped when the FAQ version marker changes. The marker's modification time
+    is checked at most every version_check_interval_seconds; None reads it only once, e.g. on
+    Lambda, where the marker is part of the read-only package and only changes with a redeploy.
+    """
+
+    def __init__(self, similarity_threshold=0.95, max_entries=1024, ttl_seconds=21600, faq_version_path=None, version_check_interval_seconds=5):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.faq_version_path = faq_version_path
+        self.version_check_interval_seconds = version_check_interval_seconds
+        self.faq_version = read_faq_version(faq_version_path) if faq_version_path else None
+        self._faq_version_mtime = _faq_version_mtime(faq_version_path) if faq_version_path else None
+        self._checked_at = time.monotonic()
+        self.groups = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        self.groups.clear()
+
+    def _check_faq_version(self):
+        if not self.faq_version_path or self.version_check_interval_seconds is None:
+            return
+        if time.monotonic() - self._checked_at < self.version_check_interval_seconds:
+            return
+        self._checked_at = time.monotonic()
+        mtime = _faq_version_mtime(self.faq_version_path)
+        if mtime == self._faq_version_mtime:
+            return
+        self._faq_version_mtime = mtime
+        version = read_faq_version(self.faq_version_path)
+        if version != self.faq_version:
+            print(f"FAQ version changed ({self.faq_version} -> {version}), clearing the answer cache")
+            self.faq_version = version
+            self.invalidate()
+
+    def _group_key(self, property_name, language, match_ids):
+        return (property_name, language, tuple(sorted(match_ids)))
+
+    def lookup(self, property_name, language, match_ids, query, embedding):
+        """
+        Return the cached answer dict for a query, or None.
+        """
+        self._check_faq_version()
+        group = self.groups.get(self._group_key(property_name, language, match_ids))
+        now = time.time()
+        answer = None
+        if group:
+            for key in [key for key, entry in group.items() if entry[2] <= now]:
+                del group[key]
+            entry = group.get(normalize_text(query))
+            if entry is not None:
+                answer = entry[1]
+            elif group and embedding is not None:
+                entries = list(group.values())
+                matrix = np.array([entry[0] for entry in entries], dtype=np.float32)
+                query_vector = np.asarray(embedding, dtype=np.float32)
+                scores = matrix @ query_vector / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector) + 1e-12)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    answer = entries[best][1]
+        if answer is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.groups.move_to_end(self._group_key(property_name, language, match_ids))
+        return dict(answer)
+
+    def store(self, property_name, language, match_ids, query, embedding, answer):
+        """
+        Store an FAQ-mode answer (response, follow_up, ...) for a query.
+        """
+        if embedding is None:
+            # answered by the lexical shortcut, there is no query embedding to compare to
+            return
+        key = self._group_key(property_name, language, match_ids)
+        group = self.groups.setdefault(key, OrderedDict())
+        group[normalize_text(query)] = (list(embedding), dict(answer), time.time() + self.ttl_seconds)
+        self.groups.move_to_end(key)
+        while sum(len(group) for group in self.groups.values()) > self.max_entries:
+            oldest_key, oldest_group = next(iter(self.groups.items()))
+            oldest_group.popitem(last=False)
+            if not oldest_group:
+                del self.groups[oldest_key]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "faq_version": self.faq_version}
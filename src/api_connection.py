@@ -1,18 +1,21 @@
-import requests
+import httpx
 import os
+import time
+import asyncio
 from datetime import datetime, timedelta
 import re
 import json
 import math
 import uuid
 import sentry_sdk
-import yaml
+from src.config import load_config
+from src.http_client import request_with_retry
+from src.offer_cache import OfferCache
 
 # from dotenv import load_dotenv
 # load_dotenv()
 
-with open('config.yaml', 'r') as file:
-    config = yaml.safe_load(file)
+config = load_config()
 
 CLIENT_ID = os.getenv('APALEO_CLIENT_ID')
 CLIENT_SECRET = os.getenv('APALEO_CLIENT_SECRET')
@@ -21,30 +24,121 @@ CLIENT_SECRET = os.getenv('APALEO_CLIENT_SECRET')
 TOKEN_URL = 'https://identity.apaleo.com/connect/token'
 API_URL = 'https://api.apaleo.com'
 
-def get_oauth_token():
+async def request_oauth_token():
+    """
+    Request a new access token from the Apaleo identity server.
+
+    Returns:
+    - dict: The token response with access_token and expires_in, or None if the request failed.
+    """
     data = {
         'client_id': CLIENT_ID,
         'client_secret': CLIENT_SECRET,
         'grant_type': 'client_credentials' 
     }
 
-    response = requests.post(TOKEN_URL, data=data)
+    response = await request_with_retry('POST', TOKEN_URL, data=data)
     if response.status_code == 200:
-        return response.json().get('access_token')
+        return response.json()
     else:
         print(f"Failed to get token: {response.status_code}")
         print(response.text)
         #sentry_sdk.capture_message(f"Failed to get token: {response.status_code}")
+        return None
+
+
+class TokenManager:
+    """
+    Process-wide cache for the Apaleo access token.
+
+    The token is reused until refresh_margin_seconds before it expires. Within the second margin
+    before that, it is refreshed in the background while callers keep using the current token.
+    Concurrent refreshes are deduplicated with a lock. The token is optionally persisted to
+    cache_path, so processes in the same (warm Lambda) container share it.
+    """
+
+    def __init__(self, refresh_margin_seconds=60, cache_path=None):
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.cache_path = cache_path
+        self.access_token = None
+        self.expires_at = 0
+        self.lock = asyncio.Lock()
+        self.refresh_task = None
+        self._load()
+
+    def _load(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            self.access_token = cached['access_token']
+            self.expires_at = cached['expires_at']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        try:
+            fd = os.open(self.cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'access_token': self.access_token, 'expires_at': self.expires_at}, f)
+        except OSError as e:
+            print(f"Failed to persist Apaleo token: {e}")
+
+    def _is_valid(self, margin):
+        return self.access_token is not None and time.time() < self.expires_at - margin
+
+    def invalidate(self):
+        self.access_token = None
+        self.expires_at = 0
+
+    async def refresh(self):
+        async with self.lock:
+            # another caller may have refreshed the token while we were waiting for the lock
+            if self._is_valid(2 * self.refresh_margin_seconds):
+                return self.access_token
+            token_response = await request_oauth_token()
+            if token_response and token_response.get('access_token'):
+                self.access_token = token_response['access_token']
+                self.expires_at = time.time() + int(token_response.get('expires_in', 3600))
+                self._save()
+            return self.access_token if self._is_valid(0) else None
+
+    async def get_token(self):
+        if self._is_valid(self.refresh_margin_seconds):
+            if not self._is_valid(2 * self.refresh_margin_seconds) and (self.refresh_task is None or self.refresh_task.done()):
+                # close to expiry, refresh in the background
+                self.refresh_task = asyncio.create_task(self.refresh())
+            return self.access_token
+        return await self.refresh()
+
+
+token_manager = TokenManager(
+    refresh_margin_seconds=config["apaleo"].get("token_refresh_margin_seconds", 60),
+    cache_path=config["apaleo"].get("token_cache_path"),
+)
+
+async def get_oauth_token():
+    return await token_manager.get_token()
 
 def get_location_id(location_name):
     location_id = "BER"
     return location_id
     
-def check_apaleo_offers(language, location: str, arrival_date: str, departure_date: str, adults_num: int, children_ages: list = []):
-    access_token = get_oauth_token()
-    print(f"Location: {location}")
-    location_id = get_location_id(location)
-    print(f"Location ID: {location_id}")
+async def fetch_apaleo_offers(language, location_id: str, arrival_date: str, departure_date: str, adults_num: int, children_ages: list = [], select_offer: bool = True):
+    """
+    Query the Apaleo offers endpoint and pick the best matching offer.
+
+    Args:
+    - select_offer (bool): Set to False to get all offers instead of the best matching one.
+
+    Returns:
+    - list: The selected offer, or None if no suitable offer was found.
+    - bool: False if the request failed, so the result must not be cached.
+    """
+    access_token = await get_oauth_token()
     lang = 'de' if language == 'de-DE' else 'en'
     headers = {
         'Authorization': f'Bearer {access_token}',
@@ -61,22 +155,24 @@ def check_apaleo_offers(language, location: str, arrival_date: str, departure_da
         #'promoCode': 'ONSAI'
     }
 
-    response = requests.get(
-        f'{API_URL}/booking/v1/offers', headers=headers, params=params
+    response = await request_with_retry(
+        'GET', f'{API_URL}/booking/v1/offers', headers=headers, params=params
     )
 
     if response.status_code != 200:
         print(f"Request failed with status code: {response.status_code}")
         print(f"Response content: {response.content}")
         #sentry_sdk.capture_message(f"Request failed with status code: {response.status_code}")
-        return None
+        return None, False
 
     try:
         response_json = response.json()
         offers = response_json.get('offers', [])
         if not offers:
             print("No offers found.")
-            return None
+            return None, True
+        if not select_offer:
+            return offers, True
         
         
         #Filter offers based on rate plan
@@ -101,7 +197,7 @@ def check_apaleo_offers(language, location: str, arrival_date: str, departure_da
             sorted_offers_exact = [sorted_offers_exact[0]]
             # print(f"Found {len(offers)} offers with exact number of persons.")
             # print(f"Selected offer: {sorted_offers_exact}")
-            return sorted_offers_exact
+            return sorted_offers_exact, True
 
         # Step 2: If no offers found, look for offers where maxPersons == adults_num + 1
         offers_plus_one = [
@@ -121,17 +217,96 @@ def check_apaleo_offers(language, location: str, arrival_date: str, departure_da
             sorted_offers_plus_one = [sorted_offers_plus_one[0]]
             # print(f"Found {len(sorted_offers_plus_one)} offers with one extra person")
             # print(f"Selected offer: {sorted_offers_plus_one}")
-            return sorted_offers_plus_one
+            return sorted_offers_plus_one, True
 
         # Step 3: If still no offers found, return None
         print("No suitable offers found.")
-        return None
+        return None, True
 
 
     except Exception as e:
         print(f"Error parsing response JSON: {e}")
         sentry_sdk.capture_message(f"Error parsing response JSON for Apaleo offers: {e}")
-        return None
+        return None, False
+
+offer_cache_config = config.get("offer_cache", {})
+offer_cache = OfferCache(
+    ttl_seconds=offer_cache_config.get("ttl_seconds", 120),
+    max_entries=offer_cache_config.get("max_entries", 2048),
+) if offer_cache_config.get("enabled") else None
+
+async def check_apaleo_offers(language, location: str, arrival_date: str, departure_date: str, adults_num: int, children_ages: list = [], use_cache: bool = True):
+    """
+    Return the best matching Apaleo offer for the stay, served from the offer cache if possible.
+
+    Args:
+    - use_cache (bool): Set to False to always ask Apaleo, e.g. right before creating a booking.
+    """
+    print(f"Location: {location}")
+    location_id = get_location_id(location)
+    print(f"Location ID: {location_id}")
+    lang = 'de' if language == 'de-DE' else 'en'
+    key = OfferCache.key(location_id, arrival_date, departure_date, adults_num, lang, children_ages)
+
+    if use_cache and offer_cache is not None:
+        found, offers = offer_cache.get(key)
+        if found:
+            print(f"Offer cache hit: {offer_cache.stats()}")
+            return offers
+
+    offers, cacheable = await fetch_apaleo_offers(language, location_id, arrival_date, departure_date, int(adults_num), children_ages)
+    if cacheable and offer_cache is not None:
+        offer_cache.put(key, offers)
+    return offers
+
+async def prefetch_offers():
+    """
+    Fill the offer cache with the availability of the next days for every property in
+    hotel_info.properties, so the bot can quote a price without waiting for Apaleo.
+    """
+    prefetch_config = offer_cache_config.get("prefetch", {})
+    semaphore = asyncio.Semaphore(prefetch_config.get("concurrency", 4))
+    today = datetime.now().date()
+    ttl_seconds = prefetch_config.get("ttl_seconds")
+
+    async def prefetch(location_id, language, arrival, nights, adults_num):
+        arrival_date = arrival.isoformat()
+        departure_date = (arrival + timedelta(days=nights)).isoformat()
+        lang = 'de' if language == 'de-DE' else 'en'
+        async with semaphore:
+            try:
+                offers, cacheable = await fetch_apaleo_offers(language, location_id, arrival_date, departure_date, adults_num)
+            except Exception as e:
+                print(f"Error prefetching offers for {location_id} {arrival_date}: {e}")
+                return
+        if cacheable:
+            offer_cache.put(OfferCache.key(location_id, arrival_date, departure_date, adults_num, lang), offers, ttl_seconds)
+
+    # several properties can share one Apaleo location (get_location_id), fetch each location once
+    location_ids = dict.fromkeys(get_location_id(location) for location in (config["hotel_info"].get("properties") or {}))
+    tasks = [
+        prefetch(location_id, language, today + timedelta(days=day), nights, adults_num)
+        for location_id in location_ids
+        for language in prefetch_config.get("languages", ["de-DE"])
+        for day in range(prefetch_config.get("days", 7))
+        for nights in prefetch_config.get("nights", [1])
+        for adults_num in prefetch_config.get("adults", [1, 2, 3, 4])
+    ]
+    await asyncio.gather(*tasks)
+    print(f"Prefetched {len(tasks)} offer lookups: {offer_cache.stats()}")
+
+async def prefetch_offers_loop():
+    """
+    Refresh the prefetched offers periodically. Runs until cancelled.
+    """
+    interval_seconds = offer_cache_config.get("prefetch", {}).get("interval_seconds", 300)
+    while True:
+        try:
+            await prefetch_offers()
+        except Exception as e:
+            print(f"Offer prefetch failed: {e}")
+            sentry_sdk.capture_message(f"Offer prefetch failed: {e}")
+        await asyncio.sleep(interval_seconds)
 
 
 def get_booking_data(first_name, last_name, telephone_number, offer, adults_num, children_ages=[]):
@@ -172,16 +347,16 @@ def get_booking_data(first_name, last_name, telephone_number, offer, adults_num,
     return data
 
 
-def create_booking(booking_data):
-    access_token = get_oauth_token()
+async def create_booking(booking_data, idempotency_key=None):
+    access_token = await get_oauth_token()
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json',
-        'Idempotency-Key': str(uuid.uuid4())
+        'Idempotency-Key': idempotency_key or str(uuid.uuid4())
     }
     endpoint = f'{API_URL}/booking/v1/bookings'
 
-    response = requests.post(endpoint, headers=headers, json=booking_data)
+    response = await request_with_retry('POST', endpoint, headers=headers, json=booking_data)
     if response.status_code == 201:
         return response.json()
     else:
@@ -191,7 +366,7 @@ def create_booking(booking_data):
 
         return None
 
-def get_folio_id_by_booking_id(booking_id):
+async def get_folio_id_by_booking_id(booking_id):
     """
     Get the ID of the folio with a negative balance for a given booking ID.
 
@@ -202,13 +377,13 @@ def get_folio_id_by_booking_id(booking_id):
     - str: The ID of the folio with a negative balance, or None if no such folio exists.
 
     """
-    access_token = get_oauth_token()
+    access_token = await get_oauth_token()
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json'
     }
     endpoint = f'{API_URL}/finance/v1/folios?bookingIds={booking_id}'
-    response = requests.get(endpoint, headers=headers)
+    response = await request_with_retry('GET', endpoint, headers=headers)
     if response.status_code == 200:
         folios = response.json().get('folios', [])
         negative_balance_folios = [folio for folio in folios if folio.get('balance', {}).get('amount') < 0]
@@ -218,7 +393,7 @@ def get_folio_id_by_booking_id(booking_id):
     print(response.text)
     return None
 
-def find_folio_by_id(folio_id: str):
+async def find_folio_by_id(folio_id: str):
     """
     Find a folio by its ID.
 
@@ -229,7 +404,7 @@ def find_folio_by_id(folio_id: str):
     - dict: The detailed folio data, or None if the folio was not found. 
 
     """
-    access_token = get_oauth_token()
+    access_token = await get_oauth_token()
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json',
@@ -239,7 +414,7 @@ def find_folio_by_id(folio_id: str):
         # get folio 
     url = f"{API_URL}/finance/v1/folios/{folio_id}"
     try:
-        response = requests.get(url, headers=headers)
+        response = await request_with_retry('GET', url, headers=headers)
 
         # Check if request was successful (status code 200)
         if response.status_code == 200:
@@ -250,11 +425,11 @@ def find_folio_by_id(folio_id: str):
             print(f"Failed to retrieve folio. Status code: {response.status_code}")
             print(f"Response content: {response.text}")
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error fetching folio: {e}")
         sentry_sdk.capture_message(f"Error fetching folio in Apaleo: {e}")
 
-def create_payment_link(folio, country_code: str, description: str):
+async def create_payment_link(folio, country_code: str, description: str, idempotency_key=None):
     """
     Create a payment link for a given folio.
 
@@ -262,11 +437,12 @@ def create_payment_link(folio, country_code: str, description: str):
     - folio: The folio data.
     - country_code: The country code for the payment link (e.g. 'de', 'en'). Depending on the country code, the payment methods and the language of the payment page will be set.
     - description: Payment description. It will be shown on the payment form of the link
+    - idempotency_key: Optional, a retried request with the same key does not create a second link
 
     Returns:
     - dict: id of the created payment link as a string
     """
-    access_token = get_oauth_token()
+    access_token = await get_oauth_token()
     folio_id = folio.get('id')
     open_balance = folio["balance"]["amount"]
 
@@ -277,7 +453,7 @@ def create_payment_link(folio, country_code: str, description: str):
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json',
-        'Idempotency-Key': str(uuid.uuid4())
+        'Idempotency-Key': idempotency_key or str(uuid.uuid4())
     }
 
     charges = [
@@ -298,7 +474,7 @@ def create_payment_link(folio, country_code: str, description: str):
         "paidCharges": charges
     }
     endpoints = f"{API_URL}/finance/v1/folios/{folio_id}/payments/by-link"
-    response = requests.post(endpoints, headers=headers, json=payment_link_data)
+    response = await request_with_retry('POST', endpoints, headers=headers, json=payment_link_data)
     if response.status_code == 201:
         payment_info = response.json()
         return payment_info.get('id')
@@ -309,15 +485,15 @@ def create_payment_link(folio, country_code: str, description: str):
         print(response.text)
         return None
 
-def get_payment_link_data(folio_data, payment_id):
-    access_token = get_oauth_token()
+async def get_payment_link_data(folio_data, payment_id):
+    access_token = await get_oauth_token()
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json',
     }
     folio_id = folio_data.get('id')
     endpoints = f"{API_URL}/finance/v1/folios/{folio_id}/payments/{payment_id}"
-    response = requests.get(endpoints, headers=headers)
+    response = await request_with_retry('GET', endpoints, headers=headers)
     if response.status_code == 200:
         payment_link_data = response.json()
         print("Payment Link Data:", payment_link_data)
@@ -326,6 +502,34 @@ def get_payment_link_data(folio_data, payment_id):
         print(response.text)
         return None
 
+async def wait_for_payment_link(folio_data, payment_id, timeout_seconds=30, initial_delay_seconds=0.5, max_delay_seconds=4):
+    """
+    Poll the payment until Apaleo has created its link, with exponential backoff.
+
+    Parameters:
+    - folio_data: The folio data.
+    - payment_id: The id returned by create_payment_link.
+    - timeout_seconds: Give up after this many seconds.
+
+    Returns:
+    - dict: The payment link data including the url.
+    - float: Seconds until the link was ready.
+    """
+    started = time.perf_counter()
+    delay = initial_delay_seconds
+    polls = 0
+    while True:
+        await asyncio.sleep(delay)
+        polls += 1
+        payment_link_data = await get_payment_link_data(folio_data, payment_id)
+        elapsed = time.perf_counter() - started
+        if payment_link_data and payment_link_data.get('url'):
+            print(f"Payment link ready after {elapsed:.2f}s ({polls} polls)")
+            return payment_link_data, round(elapsed, 2)
+        if elapsed + delay > timeout_seconds:
+            raise TimeoutError(f"Payment link {payment_id} not ready after {elapsed:.1f}s ({polls} polls)")
+        delay = min(delay * 2, max_delay_seconds, timeout_seconds - elapsed)
+
 
 
 
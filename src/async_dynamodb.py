@@ -0,0 +1,26 @@
+import asyncio
+
+
+class AsyncTable:
+    """
+    Async adapter for a boto3 DynamoDB Table resource.
+
+    Every call is executed in a worker thread, so a slow DynamoDB request does not block the
+    event loop and the other calls handled by the same worker. Items keep the boto3 resource
+    types (e.g. Decimal for numbers).
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    async def get_item(self, **kwargs):
+        return await asyncio.to_thread(self.table.get_item, **kwargs)
+
+    async def put_item(self, **kwargs):
+        return await asyncio.to_thread(self.table.put_item, **kwargs)
+
+    async def update_item(self, **kwargs):
+        return await asyncio.to_thread(self.table.update_item, **kwargs)
+
+    async def query(self, **kwargs):
+        return await asyncio.to_thread(self.table.query, **kwargs)
@@ -1,144 +1,159 @@
 import os
 import json
 import time
-import boto3
 from dotenv import load_dotenv
-from src.default_prompt import get_system_prompt_template, get_ai_prompt_template
-from src.bot_embeddings import get_embeddings, search_results, confidence_score_filter
+from src.config import load_config, get_settings
+from src.clients import get_chat_client, get_lambda_client
+from src.default_prompt import get_system_prompt_template, get_prefix_cache_prompt, get_ai_prompt_template, estimate_tokens
+from src.bot_embeddings import get_embeddings, search_results, lexical_shortcut, confidence_score_filter, get_match_ids
+from src.answer_cache import AnswerCache
+from src.history_manager import HistoryManager
+from src.streaming import ResponseSentenceStream
+from src.timing import timed
 from src.location_recognition import get_location
 from src.helpers import time_checker, no_property_info, get_text, get_text_with_variables, convert_decimals_to_floats, convert_floats_to_decimals, send_teams_message, check_call_redirect_condition
 from src.helpers import convert_to_international, correct_data_year, process_dates_pronunciation
-from src.api_connection import check_apaleo_offers, get_booking_data, create_booking, get_folio_id_by_booking_id, find_folio_by_id, create_payment_link, get_payment_link_data
+from src.api_connection import check_apaleo_offers
+from src.booking_queue import create_booking_queue, enqueue_booking, booking_job_id
 from pydantic import BaseModel
 import sentry_sdk
 import asyncio
 from src.pydantic_models import BookingValidator
 from pydantic import ValidationError
-from azure.ai.inference import ChatCompletionsClient
-from azure.core.credentials import AzureKeyCredential
 import pytz
 from collections import defaultdict
-from twilio.rest import Client
 from datetime import datetime
-import yaml
 
 load_dotenv()
 
 # Load configuration from YAML
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+config = load_config()
 
 LOCAL_DYNAMO_DB_URL = os.getenv('LOCAL_DYNAMO_DB_URL')
 WEBHOOK_URL = os.getenv("MS_TEAMS_WEBHOOK_URL")
-account_sid=os.environ["TWILIO_ACCOUNT_SID"]
-auth_token=os.environ["TWILIO_AUTH_TOKEN"]
-twillio_client = Client(account_sid, auth_token)
+answer_cache_config = config.get("answer_cache", {})
+answer_cache = AnswerCache(
+    similarity_threshold=answer_cache_config.get("similarity_threshold", 0.95),
+    max_entries=answer_cache_config.get("max_entries", 1024),
+    ttl_seconds=answer_cache_config.get("ttl_seconds", 21600),
+    faq_version_path=answer_cache_config.get("faq_version_path"),
+    # on Lambda the marker is in the read-only package, it is only read at import
+    version_check_interval_seconds=None if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else answer_cache_config.get("version_check_interval_seconds", 5),
+) if answer_cache_config.get("enabled") else None
+
+history_config = config.get("history", {})
+history_manager = HistoryManager(
+    keep_exchanges=history_config.get("keep_exchanges", 6),
+    max_tokens=history_config.get("max_tokens", 3000),
+) if history_config.get("enabled") else None
+
+booking_queue_config = config.get("booking_queue", {})
+_booking_queue = None
+
+def get_booking_queue():
+    """
+    Create the booking queue and job store on first use. The sqlite backend is only used by the
+    local server (LOCAL_DYNAMO_DB_URL): on Lambda the package directory is read-only and the
+    bookings keep going to lambda_client.booking_function.
 
-async def background_task(booking_data, offers):
+    Returns:
+        queue (SQLiteQueue | SQSQueue): None if no booking queue is used in this process
+        job_store (SQLiteJobStore): None for SQS or without a queue
     """
-    Background task to create a reservation and send the details to Teams.
+    global _booking_queue
+    if _booking_queue is None:
+        if not booking_queue_config.get("enabled"):
+            _booking_queue = (None, None)
+        elif booking_queue_config.get("backend", "sqlite") == "sqlite" and not LOCAL_DYNAMO_DB_URL:
+            _booking_queue = (None, None)
+        else:
+            _booking_queue = create_booking_queue(booking_queue_config)
+    return _booking_queue
+
+def streaming_config():
     """
-    print("background_task "*10)
-    # Some long-running process
-    try:
-        print("Booking data: ", booking_data)
-        print("Choice: ", offers)
-        print("Offers: ", offers)
-        offers = convert_decimals_to_floats(offers)
-        print("Adults: ", booking_data["number_of_adults"])
-        whatsapp_number = convert_to_international(booking_data["guest_whatsapp_number"])
-        print("Whatsapp Phone Number: ", whatsapp_number)
-        print("First Name: ", booking_data["first_name"])
-        print("Last Name: ", booking_data["last_name"])
-        fill_booking_data = get_booking_data(
-            booking_data["first_name"],
-            booking_data["last_name"],
-            whatsapp_number,
-            offers[0],
-            int(booking_data["number_of_adults"])
-        )
-        print("Booking data: ", fill_booking_data)
-        # booking_response = await create_booking(fill_booking_data)
-        booking_response = create_booking(fill_booking_data)
-        booking_id = booking_response.get('id')
-        description = f"Payment link for booking {booking_id}"
-        country_code = "DE"
-        folio_id = get_folio_id_by_booking_id(booking_id)
-        folio_data = find_folio_by_id(folio_id)
-        payment_id = create_payment_link(folio_data, country_code, description)
-        print("Payment ID: ", payment_id)
-        time.sleep(10)
-        payment_link_data = get_payment_link_data(folio_data, payment_id)
-        print("Payment Link: ", payment_link_data['url'])
-
-        url = payment_link_data['url']
-        # converted_number = convert_to_international(booking_data["caller"])
-        cleaned_url = url.replace("https://test.adyen.link/", "")
-        whatsapp = "whatsapp:" + whatsapp_number
-        print("Whatsapp: ", whatsapp)
-        message = twillio_client.messages.create(
-            content_sid="HX60be4a148ae7982d794064fc0c653111",
-            content_variables=json.dumps({"1": cleaned_url}),
-            from_='whatsapp:+4930585847900',  # Twilio Sandbox WhatsApp number
-            to=whatsapp
-        )
-        print(f"Message sent with SID: {message.sid}")
-
-        # Prepare booking details
-        booking_details = {
-            "Booking ID": booking_id if booking_id else "N/A",
-            "First Name": booking_data.get("first_name") if booking_data.get("first_name") else "N/A",
-            "Last Name": booking_data.get("last_name") if booking_data.get("last_name") else "N/A",
-            "Whatsapp Phone Number": whatsapp_number if whatsapp_number else "N/A",
-            "Adults": str(booking_data.get("number_of_adults")) if booking_data.get("number_of_adults") else "N/A",
-            "Offer Chosen": offers[0]['unitGroup']['name'] if offers else "N/A",
-            "Price": f"{offers[0]['totalGrossAmount']['amount']} {offers[0]['totalGrossAmount']['currency']} " if offers else "N/A",
-            "Arrival Date": booking_data.get("arrival_date") if booking_data.get("arrival_date") else "N/A",
-            "Departure Date": booking_data.get("departure_date") if booking_data.get("arrival_date") else "N/A",
-        }
+    The llm.streaming settings, read on every turn so a reloaded config.yaml takes effect.
+    """
+    return get_settings().llm.streaming
 
-        # Send success message to Teams
-        send_teams_message(
-            webhook_url=WEBHOOK_URL,
-            title=f"📅 {config["hotel_info"]["hotel_brand"]} Reservation Created Successfully", # TO DO: add property name
-            message=config["microsoft_teams_channel"]["success_message"],
-            details=booking_details,
-            is_error=False  # Indicates a successful operation
-        )
-    
-    except Exception as e:
-        # Handle exceptions and send error message to Teams
-        booking_data['error'] = str(e)
-        error_details = {
-            "Error Message": str(e),
-            "Reservation Data": str(booking_data)
-            # Add more contextual information if available
-        }
-        print("ERROR IN BACKGROUND TASK: " * 100, str(e))
-        
-        send_teams_message(
-            webhook_url=config["microsoft_teams_channel"]["webhook_url"],
-            title=f"❌ {config["hotel_info"]["hotel_brand"]} Reservation Failed",
-            message=config["microsoft_teams_channel"]["failure_message"],
-            details=error_details,
-            is_error=True
-        )
-        sentry_sdk.capture_message(f"Error in background task {config["hotel_info"]["hotel_brand"]}: " + str(e), "error")
-
-# Initialize the Azure LLM client for chat completions
-azure_client = ChatCompletionsClient(
-    endpoint=os.getenv("AZURE_LLM_URL"),
-    credential=AzureKeyCredential(os.getenv("AZURE_LLM_KEY"))
-)
-
-async def handle_results(embedded_query, update_system_prompt=False, history=None, property_name=None, user_query=None, language=None, offers=None, guest_phone_number=None):
+async def stream_chat_completion(messages, on_sentence):
+    """
+    Stream the chat completion and pass every complete sentence of an FAQ answer to on_sentence
+    as soon as it has been generated.
+
+    Returns:
+        str: The full assistant message content
+    """
+    sentence_stream = ResponseSentenceStream(min_sentence_chars=streaming_config().get("min_sentence_chars", 20))
+    response = await get_chat_client().complete(
+        messages=messages,
+        response_format="json_object",
+        temperature=0,
+        max_tokens=4000,
+        stream=True,
+    )
+    async with response:
+        async for update in response:
+            if update.choices and update.choices[0].delta.content:
+                for sentence in sentence_stream.feed(update.choices[0].delta.content):
+                    print("Streamed sentence: " + sentence)
+                    on_sentence(sentence)
+    return sentence_stream.buffer
+
+def with_turn_context(history, turn_context):
+    """
+    Get the messages for the LLM call, with the turn context message inserted before the latest
+    user message. The turn context is not stored in the history.
+    """
+    if turn_context is None:
+        return history
+    messages = list(history)
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index]["role"] == "user":
+            messages.insert(index, {"role": "system", "content": turn_context})
+            break
+    else:
+        messages.append({"role": "system", "content": turn_context})
+    return messages
+
+def log_prompt_segments(history, turn_context):
+    """
+    Print the estimated tokens per prompt segment: the static system prompt, the conversation,
+    the turn context and the latest user message.
+    """
+    segments = {
+        "system_prompt": estimate_tokens(history[0]["content"]) if history else 0,
+        "conversation": sum(estimate_tokens(message["content"]) for message in history[1:-1]),
+        "turn_context": estimate_tokens(turn_context),
+        "user_query": estimate_tokens(history[-1]["content"]) if len(history) > 1 else 0,
+    }
+    print(f"Prompt segments (estimated tokens): {segments}")
+
+def log_usage(chat_completion):
+    """
+    Print the token usage of a chat completion, including the cached prompt tokens if the provider reports them.
+    """
+    usage = getattr(chat_completion, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) if details is not None else None
+    print(f"LLM usage: prompt_tokens={usage.prompt_tokens}, completion_tokens={usage.completion_tokens}, cached_tokens={cached_tokens}")
+
+async def handle_results(embedded_query, update_system_prompt=False, history=None, property_name=None, user_query=None, language=None, offers=None, guest_phone_number=None, results=None):
     """
     Handle the results from the embeddings search, add the assistant response to the history, and update the system prompt.
+    results: optional search results that were already found (lexical shortcut), the index is not queried then
+
+    Returns the turn context message for the "prefix_cache" prompt layout, None for the "inline" layout.
     """
     if language is None:
         language = "de-DE"
 
-    results = search_results(embedded_query, property_name=property_name, language=language)
+    if results is None:
+        query_text = preprocess_query_for_embedding(user_query) if user_query else None
+        results = await asyncio.to_thread(search_results, embedded_query, property_name=property_name, language=language, query_text=query_text)
+    match_ids = get_match_ids(results)
     results_with_confidence = confidence_score_filter(results)
     print("Results with confidence score:")
     print(results_with_confidence)
@@ -167,7 +182,11 @@ async def handle_results(embedded_query, update_system_prompt=False, history=Non
         paragraphs = ""
 
     # Get the system prompt template
-    prompt_system = get_system_prompt_template(paragraphs, language=language, offers=offers, guest_phone_number=guest_phone_number)
+    turn_context = None
+    if get_settings().llm.prompt_layout == "prefix_cache":
+        prompt_system, turn_context = get_prefix_cache_prompt(paragraphs, language=language, offers=offers, guest_phone_number=guest_phone_number)
+    else:
+        prompt_system = get_system_prompt_template(paragraphs, language=language, offers=offers, guest_phone_number=guest_phone_number)
 
     prompt_dict = {
         "role": "system", 
@@ -182,10 +201,26 @@ async def handle_results(embedded_query, update_system_prompt=False, history=Non
         history.append(prompt_dict)
         history.append({"role": "assistant", "content": prompt_ai})
 
-    return history, unique, call_redirect_condition
+    return history, unique, call_redirect_condition, match_ids, turn_context
 
-async def generate_conversation(user_query, history=None, property_name=None, language=None, offers=None, booking_data=None, location_data=None):
+def preprocess_query_for_embedding(user_query):
+    # remove ',', '.', '?', '!' from the user query and convert to lowercase
+    return user_query.strip().strip('.').strip(',').strip('?').strip('!').lower()
+
+async def embed_user_query(user_query):
+    """
+    Get the embedding of a user query, can be started before the session is loaded.
+    """
+    return await get_embeddings(preprocess_query_for_embedding(user_query))
+
+async def generate_conversation(user_query, history=None, property_name=None, language=None, offers=None, booking_data=None, location_data=None, on_sentence=None, embedding_task=None, timings=None):
     # Function to handle the repeated process of getting results and updating history
+    # on_sentence: optional callback receiving FAQ answer sentences as they are streamed from the LLM
+    # embedding_task: optional task computing embed_user_query(user_query), started concurrently with the session read
+    # timings: optional dict the per-stage durations are recorded in
+    settings = get_settings()
+    if timings is None:
+        timings = {}
 
     # Initialize history if not present
     print("User query: " + user_query)
@@ -208,10 +243,15 @@ async def generate_conversation(user_query, history=None, property_name=None, la
         history = []
     # if location recognition needed, get the location, counting the attempts
     elif history[-1]['role'] == "onsai" and history[-1]['content'] == "location":
+        # the caller named the property: the turn either returns the location answer or continues
+        # with the original query from the history, the embedding of this utterance is not needed
+        if embedding_task is not None:
+            embedding_task.cancel()
+            embedding_task = None
         try:
             if location_data["location_attempts"] < 2:
                     location_data["location_attempts"] += 1
-                    property_name_json = get_location(user_query=user_query, language=language, city=city)
+                    property_name_json = await timed(timings, "location_recognition", get_location(user_query=user_query, language=language, city=city))
                     print("property_name JSON:")
                     print(property_name_json)
                     # location detected
@@ -249,7 +289,7 @@ async def generate_conversation(user_query, history=None, property_name=None, la
                         print("Location attempts: " + str(location_data["location_attempts"]))
                         return response
             else: # location attempts exceeded, transfer to service desk
-                phone_number = config["call"]["transfer"]["default_extension"]
+                phone_number = settings.call.transfer.default_extension
                 # transfer to service desk
                 assistant = get_text("service_hotline_open", language)
                 offers = None
@@ -272,14 +312,22 @@ async def generate_conversation(user_query, history=None, property_name=None, la
 
     # Determine the embedded query based on history presence
     start_time_emb = time.time()  # get current time
-    # remove ',', '.', '?', '!' from the user query and convert to lowercase
-    user_query_preprocessed = user_query.strip().strip('.').strip(',').strip('?').strip('!').lower()
+    user_query_preprocessed = preprocess_query_for_embedding(user_query)
     print("Embedded query final: " + user_query_preprocessed)
-    embedded_query = await get_embeddings(user_query_preprocessed)
+    # exact keyword hits are answered from the lexical index without waiting for the embedding
+    results = lexical_shortcut(user_query_preprocessed, property_name=property_name, language=language or "de-DE")
+    if results is not None:
+        embedded_query = None
+        if embedding_task is not None:
+            embedding_task.cancel()
+    elif embedding_task is not None:
+        embedded_query = await embedding_task
+    else:
+        embedded_query = await timed(timings, "embedding", get_embeddings(user_query_preprocessed))
     if history:
-        history, unique, call_redirect_condition  = await handle_results(embedded_query, update_system_prompt=True, property_name=property_name, history=history, user_query=user_query, language=language, offers=offers, guest_phone_number=booking_data.get("guest_phone_number"))
+        history, unique, call_redirect_condition, match_ids, turn_context = await timed(timings, "retrieval", handle_results(embedded_query, update_system_prompt=True, property_name=property_name, history=history, user_query=user_query, language=language, offers=offers, guest_phone_number=booking_data.get("guest_phone_number"), results=results))
     else:
-        history, unique, call_redirect_condition = await handle_results(embedded_query, property_name=property_name, history=history, user_query=user_query, language=language, offers=offers, guest_phone_number=booking_data.get("guest_phone_number"))
+        history, unique, call_redirect_condition, match_ids, turn_context = await timed(timings, "retrieval", handle_results(embedded_query, property_name=property_name, history=history, user_query=user_query, language=language, offers=offers, guest_phone_number=booking_data.get("guest_phone_number"), results=results))
     
     end_time_emb = time.time()  # get current time after the API call
     print("Time taken for Embeddedings: " + str(end_time_emb - start_time_emb))
@@ -323,8 +371,24 @@ async def generate_conversation(user_query, history=None, property_name=None, la
     print("History:")
     print(history)
 
+    # FAQ answers only depend on the retrieved contexts, so they can be served from the answer cache
+    # as long as no booking is in progress
+    use_answer_cache = answer_cache is not None and match_ids and not offers and booking_data.get("booking") not in ["true", True]
+    if use_answer_cache:
+        cached_answer = answer_cache.lookup(property_name, language, match_ids, user_query_preprocessed, embedded_query)
+        print(f"Answer cache: {answer_cache.stats()}")
+        if cached_answer is not None:
+            print("Answer served from the answer cache")
+            follow_up_response = await follow_up(json.dumps(cached_answer, ensure_ascii=False), history, property_name, language, booking_data, offers, city)
+            follow_up_response["match_ids"] = match_ids
+            return follow_up_response
+
     # Get the assistant response
+    messages = history_manager.compact(history, booking_data) if history_manager is not None else history
+    log_prompt_segments(messages, turn_context)
+    messages = with_turn_context(messages, turn_context)
     start_time = time.time()  # get current time
+    assistant_content = None
     try:
         # chat_completion = groq_client.chat.completions.create(
         #     messages=history,
@@ -333,20 +397,27 @@ async def generate_conversation(user_query, history=None, property_name=None, la
         #     temperature=0,
         #     # timeout=6.0   
         # )
-        chat_completion = azure_client.complete(
-            messages=history,
-            response_format="json_object",
-            temperature=0, 
-            max_tokens=4000,
-        )
-        print("Chat completion result:")
-        print(chat_completion)
+        if streaming_config().get("enabled", False) and on_sentence is not None:
+            assistant_content = await timed(timings, "llm", stream_chat_completion(messages, on_sentence))
+        else:
+            chat_completion = await timed(timings, "llm", get_chat_client().complete(
+                messages=messages,
+                response_format="json_object",
+                temperature=0, 
+                max_tokens=4000,
+            ))
+            print("Chat completion result:")
+            print(chat_completion)
+            log_usage(chat_completion)
+            assistant_content = chat_completion.choices[0].message.content
         try:
-            json.loads(chat_completion.choices[0].message.content)
+            assistant_json = json.loads(assistant_content)
+            if use_answer_cache and isinstance(assistant_json, dict) and assistant_json.get("mode") == "faq" and assistant_json.get("booking") not in ["true", True]:
+                answer_cache.store(property_name, language, match_ids, user_query_preprocessed, embedded_query, assistant_json)
         except json.JSONDecodeError:
             print("Invalid JSON response from LLM")
             sentry_sdk.capture_message("Invalid JSON response from LLM", "warning")
-            chat_completion = None
+            assistant_content = None
     
     except Exception as e:
         print("Error: " + str(e))
@@ -360,7 +431,7 @@ async def generate_conversation(user_query, history=None, property_name=None, la
         response = {
             "gpt_response": assistant,
             "history": history,
-            "phone_number": config["call"]["transfer"]["default_extension"],
+            "phone_number": settings.call.transfer.default_extension,
             "property_name": property_name,
             "hangup": False,
             "offers": convert_floats_to_decimals(offers) if offers else None,
@@ -369,13 +440,16 @@ async def generate_conversation(user_query, history=None, property_name=None, la
         return response
 
     end_time = time.time()  # get current time after the API call
-    follow_up_response = await follow_up(chat_completion, history, property_name, language, booking_data, offers, city)
+    follow_up_response = await follow_up(assistant_content, history, property_name, language, booking_data, offers, city)
+    # the retrieved FAQ IDs are stored with the turn in the session
+    follow_up_response["match_ids"] = match_ids
     print("Time taken for LLM API call: " + str(end_time - start_time))
     return follow_up_response
 
-async def follow_up(chat_completion, history, property_name, language, booking_data=None, offers=None, city=None):
+async def follow_up(assistant_content, history, property_name, language, booking_data=None, offers=None, city=None):
+    settings = get_settings()
     print("GPT Response:")
-    print(chat_completion)
+    print(assistant_content)
     hangup = False
 
     # Initialize booking_data if it's None
@@ -386,9 +460,9 @@ async def follow_up(chat_completion, history, property_name, language, booking_d
     #making sure the response is not None and has a length greater than 0
     assistant_json = None
     try:
-        if chat_completion is not None and len(chat_completion.choices[0].message.content) > 1:
+        if assistant_content is not None and len(assistant_content) > 1:
             try: 
-                assistant_json = json.loads(chat_completion.choices[0].message.content)
+                assistant_json = json.loads(assistant_content)
                 print("Assistant json:", assistant_json)
                 if language == "de-DE":
                     # if no response from LLM, set assistant to "Telefonzentrale"
@@ -400,7 +474,7 @@ async def follow_up(chat_completion, history, property_name, language, booking_d
                 print(json.dumps(assistant_json, ensure_ascii=False, indent=2)) # indent was 4
             except json.JSONDecodeError as e:
                 print("Error parsing assistant JSON: " + str(e))
-                assistant = chat_completion.choices[0].message.content
+                assistant = assistant_content
                 assistant_json = None  # Ensure assistant_json is None if parsing fails
         else:
             print("No response from LLM")
@@ -434,7 +508,7 @@ async def follow_up(chat_completion, history, property_name, language, booking_d
             response = {
                 "gpt_response" : assistant,
                 "history": history, 
-                "phone_number": config["call"]["transfer"]["default_extension"],
+                "phone_number": settings.call.transfer.default_extension,
                 "property_name": property_name,
                 "hangup": hangup,
                 "offers": convert_floats_to_decimals(offers) if offers else None,
@@ -446,19 +520,27 @@ async def follow_up(chat_completion, history, property_name, language, booking_d
             # do not allow reservations for the same day
             print("Start booking process")
             booking_data["property_name"] = property_name
+            booking_data["language"] = language
             if "booking_confirmed" in assistant_json and assistant_json["booking_confirmed"] in ["true", True]:
                 if offers:
                     print("BOOKING PART")
                     assistant = get_text("booking_confirmation", language)
                     try:
-                        if LOCAL_DYNAMO_DB_URL:
+                        booking_queue, booking_job_store = get_booking_queue()
+                        if booking_queue is not None:
+                            # the booking workers (local worker pool or the SQS triggered Lambda) take it from here
+                            job_id = await enqueue_booking(booking_queue, booking_job_store, convert_decimals_to_floats(booking_data), convert_decimals_to_floats(offers))
+                            print(f"Booking job enqueued: {job_id}")
+                        elif LOCAL_DYNAMO_DB_URL:
+                            from src.booking_worker import run_booking_job
                             booking_data = convert_decimals_to_floats(booking_data)
                             print("LOCAL DYNAMO DB. Starting background task")
                             # Start background task
-                            asyncio.create_task(background_task(booking_data, offers))
+                            job = {"job_id": booking_job_id(booking_data, offers), "booking_data": booking_data, "offers": offers}
+                            asyncio.create_task(run_booking_job(job))
                         else:
-                            lambda_client = boto3.client('lambda')
-                            response = lambda_client.invoke(
+                            response = await asyncio.to_thread(
+                                get_lambda_client().invoke,
                                 FunctionName=config["lambda_client"]["booking_function"]["name"],
                                 InvocationType='Event',  # Asynchronous invocation
                             Payload=json.dumps({
@@ -483,10 +565,10 @@ async def follow_up(chat_completion, history, property_name, language, booking_d
                             "Timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
                             # Add more contextual information if available
                         }
-                        send_teams_message(
-                            webhook_url=config["microsoft_teams_channel"]["webhook_url"],
-                            title=f"❌ {config["hotel_info"]["hotel_brand"]} ({property_name}) Reservation Failed",
-                            message=config["microsoft_teams_channel"]["failure_message"],
+                        await send_teams_message(
+                            webhook_url=settings.microsoft_teams_channel.webhook_url,
+                            title=f"❌ {settings.hotel_info.hotel_brand} ({property_name}) Reservation Failed",
+                            message=settings.microsoft_teams_channel.failure_message,
                             details=error_details,
                             is_error=True
                         )
@@ -524,7 +606,7 @@ async def follow_up(chat_completion, history, property_name, language, booking_d
                         print("CHECK PRIME AVAILABILITY in APALEO")
                         # correct the current date if it's in the past
                         booking_data["arrival_date"], booking_data["departure_date"] = correct_data_year(booking_data.get("arrival_date"), booking_data.get("departure_date"))
-                        offers = check_apaleo_offers(language, property_name, booking_data.get("arrival_date"), booking_data.get("departure_date"), booking_data.get("number_of_adults"))
+                        offers = await check_apaleo_offers(language, property_name, booking_data.get("arrival_date"), booking_data.get("departure_date"), booking_data.get("number_of_adults"))
                         if offers:
                             print("Rooms available")
                             assistant = get_text_with_variables(
@@ -650,7 +732,7 @@ async def follow_up(chat_completion, history, property_name, language, booking_d
     if "telefonzentrale" in assistant.lower() or "switchboard" in assistant.lower() or (assistant_json and assistant_json.get("mode") == "employee_handover"):
         print("TELEFONZENTRALE")
         assistant = get_text("service_hotline_open", language)
-        phone_number = config["call"]["transfer"]["default_extension"]
+        phone_number = settings.call.transfer.default_extension
         hangup = False
 
 
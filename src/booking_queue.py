@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import boto3
+
+
+def booking_job_id(booking_data, offers):
+    """
+    Derive a stable job id from the guest data and the chosen offer, so a booking that is confirmed
+    twice (e.g. a repeated turn) is only enqueued and booked once. The id is also used as the
+    Idempotency-Key of the Apaleo requests.
+    """
+    offer = offers[0] if offers else {}
+    fields = {
+        "first_name": booking_data.get("first_name"),
+        "last_name": booking_data.get("last_name"),
+        "guest_whatsapp_number": booking_data.get("guest_whatsapp_number"),
+        "property_name": booking_data.get("property_name"),
+        "arrival_date": booking_data.get("arrival_date"),
+        "departure_date": booking_data.get("departure_date"),
+        "number_of_adults": str(booking_data.get("number_of_adults")),
+        "rate_plan": offer.get("ratePlan", {}).get("id"),
+        "unit_group": offer.get("unitGroup", {}).get("id"),
+    }
+    digest = hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"booking-{digest[:32]}"
+
+
+class SQLiteQueue:
+    """
+    Durable local queue with the subset of the SQS client interface used by the booking workers
+    (send_message, receive_message, delete_message, change_message_visibility).
+
+    Received messages become visible again after the visibility timeout unless they are deleted,
+    so a job that was in flight when the worker died is picked up again.
+    """
+
+    def __init__(self, path, visibility_timeout=300):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id TEXT PRIMARY KEY, body TEXT, visible_at REAL, receive_count INTEGER, receipt_handle TEXT, created_at REAL)"
+        )
+        self.connection.commit()
+
+    def send_message(self, MessageBody, MessageDeduplicationId=None, **kwargs):
+        message_id = MessageDeduplicationId or str(uuid.uuid4())
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO messages VALUES (?, ?, ?, 0, NULL, ?)",
+                (message_id, MessageBody, now, now),
+            )
+            self.connection.commit()
+        return {"MessageId": message_id}
+
+    def receive_message(self, MaxNumberOfMessages=1, VisibilityTimeout=None, **kwargs):
+        visibility_timeout = self.visibility_timeout if VisibilityTimeout is None else VisibilityTimeout
+        now = time.time()
+        messages = []
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, body, receive_count FROM messages WHERE visible_at <= ? ORDER BY created_at LIMIT ?",
+                (now, MaxNumberOfMessages),
+            ).fetchall()
+            for message_id, body, receive_count in rows:
+                receipt_handle = f"{message_id}:{uuid.uuid4()}"
+                self.connection.execute(
+                    "UPDATE messages SET visible_at = ?, receive_count = ?, receipt_handle = ? WHERE id = ?",
+                    (now + visibility_timeout, receive_count + 1, receipt_handle, message_id),
+                )
+                messages.append({
+                    "MessageId": message_id,
+                    "ReceiptHandle": receipt_handle,
+                    "Body": body,
+                    "Attributes": {"ApproximateReceiveCount": str(receive_count + 1)},
+                })
+            self.connection.commit()
+        return {"Messages": messages} if messages else {}
+
+    def delete_message(self, ReceiptHandle, **kwargs):
+        with self.lock:
+            self.connection.execute("DELETE FROM messages WHERE receipt_handle = ?", (ReceiptHandle,))
+            self.connection.commit()
+
+    def change_message_visibility(self, ReceiptHandle, VisibilityTimeout, **kwargs):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE messages SET visible_at = ? WHERE receipt_handle = ?",
+                (time.time() + VisibilityTimeout, ReceiptHandle),
+            )
+            self.connection.commit()
+
+
+class SQSQueue:
+    """
+    Amazon SQS queue with the same interface as SQLiteQueue.
+    """
+
+    def __init__(self, queue_url, region_name=None, fifo=False):
+        self.queue_url = queue_url
+        self.fifo = fifo
+        self.client = boto3.client("sqs", region_name=region_name)
+
+    def send_message(self, MessageBody, MessageDeduplicationId=None, **kwargs):
+        if self.fifo:
+            # FIFO queues drop duplicates with the same deduplication id within five minutes
+            kwargs.update(MessageDeduplicationId=MessageDeduplicationId, MessageGroupId=MessageDeduplicationId)
+        return self.client.send_message(QueueUrl=self.queue_url, MessageBody=MessageBody, **kwargs)
+
+    def receive_message(self, MaxNumberOfMessages=1, VisibilityTimeout=None, WaitTimeSeconds=10, **kwargs):
+        if VisibilityTimeout is not None:
+            kwargs["VisibilityTimeout"] = VisibilityTimeout
+        return self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=MaxNumberOfMessages,
+            WaitTimeSeconds=WaitTimeSeconds,
+            AttributeNames=["ApproximateReceiveCount"],
+            **kwargs,
+        )
+
+    def delete_message(self, ReceiptHandle, **kwargs):
+        return self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=ReceiptHandle)
+
+    def change_message_visibility(self, ReceiptHandle, VisibilityTimeout, **kwargs):
+        return self.client.change_message_visibility(
+            QueueUrl=self.queue_url, ReceiptHandle=ReceiptHandle, VisibilityTimeout=VisibilityTimeout
+        )
+
+
+class SQLiteJobStore:
+    """
+    Persists the status and the results of the finished stages of every booking job, so a job
+    that is retried continues after the last successful stage instead of booking again.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS booking_jobs (job_id TEXT PRIMARY KEY, status TEXT, state TEXT, updated_at REAL)"
+        )
+        self.connection.commit()
+
+    def create(self, job_id):
+        """
+        Register a new job, or queue a failed job again (its finished stages are kept).
+        Returns False if a job with this id is already queued, running or done.
+        """
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT INTO booking_jobs VALUES (?, 'queued', '{}', ?) "
+                "ON CONFLICT(job_id) DO UPDATE SET status = 'queued', updated_at = excluded.updated_at WHERE booking_jobs.status = 'failed'",
+                (job_id, time.time()),
+            )
+            self.connection.commit()
+        return cursor.rowcount == 1
+
+    def get(self, job_id):
+        """
+        Returns:
+            status (str): queued, running, done or failed, None for an unknown job
+            state (dict): The results of the finished stages
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT status, state FROM booking_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None, {}
+        return row[0], json.loads(row[1])
+
+    def save(self, job_id, status, state):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO booking_jobs VALUES (?, ?, ?, ?)",
+                (job_id, status, json.dumps(state, default=str), time.time()),
+            )
+            self.connection.commit()
+
+
+def create_booking_queue(queue_config):
+    """
+    Create the queue and the job store for the configured backend ("sqlite" or "sqs").
+
+    Returns:
+        queue (SQLiteQueue | SQSQueue)
+        job_store (SQLiteJobStore): None for SQS, the Apaleo idempotency keys protect retried jobs there
+    """
+    backend = queue_config.get("backend", "sqlite")
+    if backend == "sqs":
+        queue = SQSQueue(
+            queue_config["sqs_queue_url"],
+            region_name=queue_config.get("region"),
+            fifo=queue_config.get("fifo", False),
+        )
+        return queue, None
+    if backend == "sqlite":
+        queue = SQLiteQueue(queue_config["path"], visibility_timeout=queue_config.get("visibility_timeout_seconds", 300))
+        return queue, SQLiteJobStore(queue_config["path"])
+    raise ValueError(f"Unknown booking queue backend: {backend}")
+
+
+async def enqueue_booking(queue, job_store, booking_data, offers):
+    """
+    Put a booking job on the queue. Returns the job id, or None if the job was already enqueued.
+    """
+    job_id = booking_job_id(booking_data, offers)
+    if job_store is not None and not job_store.create(job_id):
+        print(f"Booking job {job_id} already exists, not enqueued again")
+        return None
+    body = json.dumps({"job_id": job_id, "booking_data": booking_data, "offers": offers}, default=str)
+    if isinstance(queue, SQLiteQueue):
+        # a local insert, cheap enough to stay on the caller's path
+        queue.send_message(MessageBody=body, MessageDeduplicationId=job_id)
+    else:
+        await asyncio.to_thread(queue.send_message, MessageBody=body, MessageDeduplicationId=job_id)
+    return job_id
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import time
+
+import sentry_sdk
+
+from src.api_connection import fetch_apaleo_offers, get_location_id, get_booking_data, create_booking, get_folio_id_by_booking_id, find_folio_by_id, create_payment_link, wait_for_payment_link
+from src.backend import config, WEBHOOK_URL
+from src.clients import get_twillio_client
+from src.config import get_settings
+from src.helpers import convert_decimals_to_floats, convert_to_international, send_teams_message
+
+booking_queue_config = config.get("booking_queue", {})
+payment_link_config = config["apaleo"].get("payment_link", {})
+
+
+class BookingStageError(Exception):
+    pass
+
+
+class OfferChangedError(Exception):
+    """
+    The quoted offer is no longer available or its price changed, the booking is not retried.
+    """
+
+
+async def run_stage(name, stage, state, job_store=None, job_id=None, timings=None):
+    """
+    Run one stage of a booking job with retries and store its result in state.
+
+    Stages that already have a result in state (from an earlier attempt of the same job) are skipped.
+    The duration of the stage including retries is recorded in timings.
+    """
+    if name in state:
+        print(f"Booking job {job_id}: stage {name} already done")
+        return state[name]
+    start = time.perf_counter()
+    retries = booking_queue_config.get("stage_retries", 3)
+    delay = booking_queue_config.get("stage_retry_delay_seconds", 2)
+    for attempt in range(1, retries + 1):
+        try:
+            result = await stage()
+            break
+        except OfferChangedError:
+            raise
+        except Exception as e:
+            print(f"Booking job {job_id}: stage {name} failed (attempt {attempt}/{retries}): {e}")
+            if attempt == retries:
+                raise BookingStageError(f"Stage {name} failed: {e}") from e
+            await asyncio.sleep(delay * 2 ** (attempt - 1))
+    if timings is not None:
+        timings[name] = round(time.perf_counter() - start, 3)
+    state[name] = result
+    if job_store is not None:
+        # copy, the caller keeps adding results while the state is written in the thread
+        await asyncio.to_thread(job_store.save, job_id, "running", dict(state))
+    return result
+
+
+async def run_booking_job(job, job_store=None, final_attempt=True):
+    """
+    Create the reservation for a confirmed booking, send the payment link via WhatsApp and the
+    details to Teams. The stages (offer re-check, booking, folio, payment link, WhatsApp, Teams) run
+    in order: each depends on the result of the previous one, and the Teams success card is only
+    posted once the guest has the payment link. Every stage has its own retries and its latency is
+    recorded.
+
+    Args:
+        job (dict): job_id, booking_data and offers as enqueued by booking_queue.enqueue_booking
+        job_store (SQLiteJobStore): Optional, keeps the stage results across retries of the job
+        final_attempt (bool): The job is not retried if it fails, the failure is reported to Teams
+
+    Raises:
+        BookingStageError: If a stage still fails after its retries, so the queue can retry the job.
+            A changed or unavailable offer (OfferChangedError) is reported at once and not retried.
+    """
+    settings = get_settings()
+    job_id = job["job_id"]
+    booking_data = job["booking_data"]
+    offers = convert_decimals_to_floats(job["offers"])
+    state = {}
+    timings = {}
+    job_start = time.perf_counter()
+    if job_store is not None:
+        status, state = await asyncio.to_thread(job_store.get, job_id)
+        if status == "done":
+            print(f"Booking job {job_id} is already done")
+            return
+    print(f"Running booking job {job_id}")
+    print("Booking data: ", booking_data)
+    print("Offers: ", offers)
+
+    try:
+        whatsapp_number = convert_to_international(booking_data["guest_whatsapp_number"])
+        print("Whatsapp Phone Number: ", whatsapp_number)
+
+        async def recheck_offer():
+            # the quoted offer may come from the offer cache, re-check it with Apaleo before booking
+            current_offers, request_succeeded = await fetch_apaleo_offers(
+                booking_data.get("language", "de-DE"),
+                get_location_id(booking_data.get("property_name")),
+                booking_data.get("arrival_date"),
+                booking_data.get("departure_date"),
+                int(booking_data["number_of_adults"]),
+                select_offer=False
+            )
+            if not request_succeeded:
+                raise Exception("Apaleo offers request failed")
+            quoted = offers[0]
+            unit_group_id = quoted.get("unitGroup", {}).get("id")
+            rate_plan_id = quoted.get("ratePlan", {}).get("id")
+            current = next((
+                offer for offer in current_offers or []
+                if offer.get("unitGroup", {}).get("id") == unit_group_id and offer.get("ratePlan", {}).get("id") == rate_plan_id
+            ), None)
+            if current is None:
+                raise OfferChangedError(f"The quoted offer (unit group {unit_group_id}, rate plan {rate_plan_id}) is no longer available")
+            if current['totalGrossAmount'] != quoted['totalGrossAmount']:
+                raise OfferChangedError(
+                    f"The price of the quoted offer changed: {quoted['totalGrossAmount']['amount']} -> "
+                    f"{current['totalGrossAmount']['amount']} {current['totalGrossAmount']['currency']}"
+                )
+            return [current]
+        offers = await run_stage("offers", recheck_offer, state, job_store, job_id, timings)
+
+        async def book():
+            fill_booking_data = get_booking_data(
+                booking_data["first_name"],
+                booking_data["last_name"],
+                whatsapp_number,
+                offers[0],
+                int(booking_data["number_of_adults"])
+            )
+            print("Booking data: ", fill_booking_data)
+            booking_response = await create_booking(fill_booking_data, idempotency_key=job_id)
+            if not booking_response:
+                raise Exception("Apaleo did not create the booking")
+            return booking_response.get('id')
+        booking_id = await run_stage("booking_id", book, state, job_store, job_id, timings)
+
+        async def folio():
+            folio_id = await get_folio_id_by_booking_id(booking_id)
+            folio_data = await find_folio_by_id(folio_id) if folio_id else None
+            if not folio_data:
+                raise Exception(f"No open folio found for booking {booking_id}")
+            return folio_data
+        folio_data = await run_stage("folio", folio, state, job_store, job_id, timings)
+
+        async def payment_link():
+            payment_id = await create_payment_link(folio_data, "DE", f"Payment link for booking {booking_id}", idempotency_key=f"{job_id}-payment-link")
+            if not payment_id:
+                raise Exception("Apaleo did not create the payment link")
+            print("Payment ID: ", payment_id)
+            return payment_id
+        payment_id = await run_stage("payment_id", payment_link, state, job_store, job_id, timings)
+
+        async def payment_link_url():
+            payment_link_data, payment_link_seconds = await wait_for_payment_link(
+                folio_data,
+                payment_id,
+                timeout_seconds=payment_link_config.get("timeout_seconds", 30),
+                initial_delay_seconds=payment_link_config.get("initial_delay_seconds", 0.5),
+                max_delay_seconds=payment_link_config.get("max_delay_seconds", 4),
+            )
+            return {"url": payment_link_data['url'], "seconds": payment_link_seconds}
+        payment_link_result = await run_stage("payment_link", payment_link_url, state, job_store, job_id, timings)
+        print("Payment Link: ", payment_link_result["url"])
+
+        async def whatsapp():
+            cleaned_url = payment_link_result["url"].replace("https://test.adyen.link/", "")
+            whatsapp = "whatsapp:" + whatsapp_number
+            print("Whatsapp: ", whatsapp)
+            message = await get_twillio_client().messages.create_async(
+                content_sid="HX60be4a148ae7982d794064fc0c653111",
+                content_variables=json.dumps({"1": cleaned_url}),
+                from_='whatsapp:+4930585847900',  # Twilio Sandbox WhatsApp number
+                to=whatsapp
+            )
+            print(f"Message sent with SID: {message.sid}")
+            return message.sid
+
+        # Prepare booking details
+        booking_details = {
+            "Booking ID": booking_id if booking_id else "N/A",
+            "First Name": booking_data.get("first_name") if booking_data.get("first_name") else "N/A",
+            "Last Name": booking_data.get("last_name") if booking_data.get("last_name") else "N/A",
+            "Whatsapp Phone Number": whatsapp_number if whatsapp_number else "N/A",
+            "Adults": str(booking_data.get("number_of_adults")) if booking_data.get("number_of_adults") else "N/A",
+            "Offer Chosen": offers[0]['unitGroup']['name'] if offers else "N/A",
+            "Price": f"{offers[0]['totalGrossAmount']['amount']} {offers[0]['totalGrossAmount']['currency']} " if offers else "N/A",
+            "Arrival Date": booking_data.get("arrival_date") if booking_data.get("arrival_date") else "N/A",
+            "Departure Date": booking_data.get("departure_date") if booking_data.get("arrival_date") else "N/A",
+            "Payment Link Ready After": f"{payment_link_result['seconds']} s",
+        }
+
+        async def teams():
+            # Send success message to Teams
+            await send_teams_message(
+                webhook_url=WEBHOOK_URL,
+                title=f"📅 {settings.hotel_info.hotel_brand} Reservation Created Successfully", # TO DO: add property name
+                message=settings.microsoft_teams_channel.success_message,
+                details=booking_details,
+                is_error=False  # Indicates a successful operation
+            )
+            return True
+
+        sentry_sdk.add_breadcrumb(
+            category="booking",
+            message=f"Booking {booking_id} created",
+            data={"job_id": job_id, "payment_id": payment_id},
+            level="info",
+        )
+        await run_stage("whatsapp_sid", whatsapp, state, job_store, job_id, timings)
+        await run_stage("teams", teams, state, job_store, job_id, timings)
+        timings["total"] = round(time.perf_counter() - job_start, 3)
+        print(f"Booking job {job_id} stage timings: {timings}")
+
+        if job_store is not None:
+            await asyncio.to_thread(job_store.save, job_id, "done", state)
+
+    except Exception as e:
+        # Handle exceptions and send error message to Teams
+        booking_data['error'] = str(e)
+        error_details = {
+            "Error Message": str(e),
+            "Reservation Data": str(booking_data),
+            "Job ID": job_id,
+            "Completed Stages": ", ".join(state) if state else "none",
+            "Stage Timings": str(timings),
+        }
+        if isinstance(e, OfferChangedError):
+            error_details["Action"] = "Nothing was booked, please contact the guest about the changed offer"
+        print("ERROR IN BOOKING JOB: ", job_id, str(e))
+        if job_store is not None:
+            # the finished stages are kept, a retry continues after them
+            await asyncio.to_thread(job_store.save, job_id, "failed", state)
+
+        if not final_attempt and not isinstance(e, OfferChangedError):
+            print(f"Booking job {job_id} will be retried")
+            sentry_sdk.capture_message(f"Booking job {job_id} failed, retrying: " + str(e), "warning")
+            raise
+
+        await send_teams_message(
+            webhook_url=settings.microsoft_teams_channel.webhook_url,
+            title=f"❌ {settings.hotel_info.hotel_brand} Reservation Failed",
+            message=settings.microsoft_teams_channel.failure_message,
+            details=error_details,
+            is_error=True
+        )
+        sentry_sdk.capture_message(f"Error in booking job {settings.hotel_info.hotel_brand}: " + str(e), "error")
+        if not isinstance(e, OfferChangedError):
+            raise
+
+
+class BookingWorkerPool:
+    """
+    Pool of asyncio workers that take booking jobs from the queue. Throughput scales with the
+    number of workers, the Apaleo calls of a job are I/O bound.
+    """
+
+    def __init__(self, queue, job_store=None, workers=2, poll_interval_seconds=1, max_attempts=3, retry_delay_seconds=60):
+        self.queue = queue
+        self.job_store = job_store
+        self.workers = workers
+        self.poll_interval_seconds = poll_interval_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        self.tasks = []
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.work(worker)) for worker in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def work(self, worker):
+        print(f"Booking worker {worker} started")
+        while True:
+            try:
+                response = await asyncio.to_thread(self.queue.receive_message, MaxNumberOfMessages=1)
+                messages = response.get("Messages", [])
+                if not messages:
+                    await asyncio.sleep(self.poll_interval_seconds)
+                    continue
+                for message in messages:
+                    attempt = int(message.get("Attributes", {}).get("ApproximateReceiveCount", 1))
+                    final_attempt = attempt >= self.max_attempts
+                    try:
+                        await run_booking_job(json.loads(message["Body"]), self.job_store, final_attempt=final_attempt)
+                    except Exception as e:
+                        print(f"Booking worker {worker}: job failed (attempt {attempt}/{self.max_attempts}): {e}")
+                        if not final_attempt:
+                            # keep the message, it becomes visible again after the retry delay
+                            await asyncio.to_thread(self.queue.change_message_visibility, ReceiptHandle=message["ReceiptHandle"], VisibilityTimeout=self.retry_delay_seconds)
+                            continue
+                    await asyncio.to_thread(self.queue.delete_message, ReceiptHandle=message["ReceiptHandle"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Booking worker {worker} error: {e}")
+                sentry_sdk.capture_message(f"Booking worker error: {e}", "error")
+                await asyncio.sleep(self.poll_interval_seconds)
@@ -1,63 +1,106 @@
 import os
-import pinecone
-from dotenv import load_dotenv
-import boto3
-import json
 import asyncio
-import openai
-import yaml
 import random
-from pathlib import Path
-
-load_dotenv()
-
-def load_config():
-    config_path = Path("config.yaml")
-    with open(config_path) as f:
-        config = yaml.safe_load(f)
-    
-    # Replace environment variables
-    # You might want to add more sophisticated environment variable handling
-    if "${PINECONE_INDEX}" in config["pinecone"]["index_name"]:
-        config["pinecone"]["index_name"] = os.getenv("PINECONE_INDEX")
-    if "${LOCAL_DYNAMO_DB_URL}" in config["pinecone"]["environment"]:
-        config["pinecone"]["environment"] = os.getenv("PINECONE_ENVIRONMENT")
-    return config
+from src.config import load_config
+from src.clients import get_pinecone_index, get_openai_client, get_async_openai_client
+from src.local_index import LocalVectorIndex
+from src.lexical_index import load_lexical_index, reciprocal_rank_fusion
+from src.embedding_store import EmbeddingStore
+from src.embedding_cache import EmbeddingCache, SQLiteEmbeddingStore, DynamoDBEmbeddingStore
 
 # Load configuration at startup
 config = load_config()
-pinecone_api_key = os.getenv('PINECONE_API_KEY')
-pinecone_environment = config["pinecone"]["environment"]
-pinecone_index = config["pinecone"]["index_name"]
 
-OPENAI_API_AZURE_KEY = os.getenv('OPENAI_API_AZURE_KEY')
-OPENAI_AZURE_BASE_URL = os.getenv('OPENAI_AZURE_BASE_URL')
 OPENAI_API_AZURE_EMBEDDING = os.getenv('OPENAI_API_AZURE_EMBEDDING')
 
+retrieval_config = config.get("retrieval", {})
+RETRIEVAL_BACKEND = retrieval_config.get("backend", "pinecone")
+TOP_K = retrieval_config.get("top_k", 2)
+
+local_index = None
+if RETRIEVAL_BACKEND == "local":
+    store_path = retrieval_config["local"].get("store_path")
+    vectors_path = retrieval_config["local"]["vectors_path"]
+    try:
+        if store_path and os.path.exists(store_path):
+            # memory-mapped, the vectors are not copied into the process
+            local_index = LocalVectorIndex.from_store(EmbeddingStore.load(store_path))
+            print(f"Loaded {len(local_index)} FAQ vectors into the local index from {store_path}")
+        else:
+            local_index = LocalVectorIndex.from_file(vectors_path)
+            print(f"Loaded {len(local_index)} FAQ vectors into the local index from {vectors_path}")
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        print(f"Could not load local index, falling back to Pinecone: {e}")
+
+# Hybrid retrieval: BM25 over the FAQ texts, fused with the vector matches
+hybrid_config = retrieval_config.get("hybrid", {})
+lexical_index = None
+if hybrid_config.get("enabled"):
+    try:
+        lexical_index = load_lexical_index(
+            store_path=retrieval_config.get("local", {}).get("store_path"),
+            manifest_path=config.get("data_import", {}).get("manifest_path"),
+        )
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Could not build the lexical index: {e}")
+    if lexical_index is not None:
+        print(f"Loaded {len(lexical_index)} FAQ texts into the lexical index")
+    else:
+        print("No embedding store or import manifest found, hybrid retrieval is disabled")
 
-# Load configuration from YAML
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+def create_embedding_cache(cache_config):
+    """
+    Create the query embedding cache from the embedding_cache block of config.yaml.
+    """
+    store = None
+    try:
+        if cache_config.get("store") == "file":
+            store = SQLiteEmbeddingStore(cache_config["file_path"])
+        elif cache_config.get("store") == "dynamodb":
+            store = DynamoDBEmbeddingStore(
+                cache_config["dynamodb_table"],
+                region_name=config["database"]["region"],
+            )
+    except Exception as e:
+        print(f"Could not open the embedding cache store, using memory only: {e}")
+    return EmbeddingCache(
+        max_entries=cache_config.get("max_entries", 2048),
+        ttl_seconds=cache_config.get("ttl_seconds", 86400),
+        store=store,
+    )
+
+embedding_cache_config = config.get("embedding_cache", {})
+embedding_cache = create_embedding_cache(embedding_cache_config) if embedding_cache_config.get("enabled") else None
 
-pinecone.init(      
-	api_key=pinecone_api_key,      
-	environment=pinecone_environment  
-)      
-index = pinecone.Index(pinecone_index)
+def get_embeddings_sync(user_query):
+    response = get_openai_client().embeddings.create(input=user_query, model=OPENAI_API_AZURE_EMBEDDING)
+    return response.data[0].embedding
 
-client = openai.AzureOpenAI(
-    api_key=OPENAI_API_AZURE_KEY, azure_endpoint=OPENAI_AZURE_BASE_URL, api_version = "2023-05-15"
-)
+def get_embeddings_batch_sync(texts):
+    """
+    Embed a list of texts with one request, the embeddings are returned in the order of texts.
+    """
+    response = get_openai_client().embeddings.create(input=texts, model=OPENAI_API_AZURE_EMBEDDING)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
-def get_embeddings_sync(user_query):
-    response = client.embeddings.create(input=user_query, model=OPENAI_API_AZURE_EMBEDDING)
+async def get_embeddings_async(user_query):
+    response = await get_async_openai_client().embeddings.create(input=user_query, model=OPENAI_API_AZURE_EMBEDDING)
     return response.data[0].embedding
 
 async def get_embeddings(user_query):
-    # Run the synchronous function in a thread
-    return await asyncio.to_thread(get_embeddings_sync, user_query)
-
-def search_results(query_result, property_name=None, language="de-DE"):
+    if embedding_cache is None:
+        return await get_embeddings_async(user_query)
+
+    embedding = embedding_cache.get(OPENAI_API_AZURE_EMBEDDING, user_query)
+    if embedding is None:
+        embedding = await asyncio.to_thread(embedding_cache.get_from_store, OPENAI_API_AZURE_EMBEDDING, user_query)
+    if embedding is None:
+        embedding = await get_embeddings_async(user_query)
+        await asyncio.to_thread(embedding_cache.put, OPENAI_API_AZURE_EMBEDDING, user_query, embedding)
+    print(f"Embedding cache: {embedding_cache.stats()}")
+    return embedding
+
+def search_results(query_result, property_name=None, language="de-DE", query_text=None):
     print(f"query_result: {query_result}, property_name: {property_name}, language: {language}")
     """
     Search for the most similar results in the index.
@@ -65,18 +108,34 @@ def search_results(query_result, property_name=None, language="de-DE"):
     Args:
         query_result (list): List of embeddings from get_embeddings
         property_name (str): property_name location
+        query_text (str): The preprocessed user query, with hybrid retrieval the vector matches
+            are fused with the BM25 matches of this text
     
     Returns:
         responses (list): List of responses from search_results with metadata, scores and ids
     """
-    if property_name is not None:
-        responses = index.query(queries=[query_result], top_k=2, include_metadata=True, filter={"location": property_name, "language":language})
+    if property_name is None:
+        properties = config["hotel_info"]["properties"]
+        property_name = random.choice(list(properties.keys()))
 
+    query_filter = {"location": property_name, "language": language}
+    hybrid = lexical_index is not None and query_text
+    top_k = hybrid_config.get("candidates", 10) if hybrid else TOP_K
+    if local_index is not None:
+        responses = local_index.query(query_result, top_k=top_k, filter=query_filter)
     else:
-        # 
-        properties = config["hotel_info"]["properties"]
-        random_property = random.choice(list(properties.keys()))
-        responses = index.query(queries=[query_result], top_k=2, include_metadata=True, filter={"location": random_property, "language":language})
+        responses = get_pinecone_index().query(queries=[query_result], top_k=top_k, include_metadata=True, filter=query_filter)
+
+    if hybrid:
+        lexical = lexical_index.query(query_text, top_k=top_k, filter=query_filter, min_coverage=hybrid_config.get("shortcut_min_coverage", 0.6))
+        matches = reciprocal_rank_fusion(
+            {"vector": responses["results"][0]["matches"] if responses["results"] else [], "lexical": lexical["results"][0]["matches"]},
+            k=hybrid_config.get("rrf_k", 60),
+            top_k=TOP_K,
+            # lexical-only matches have no cosine score, unless exact they would take a slot and be filtered out later
+            keep=is_confident,
+        )
+        responses = {"results": [{"matches": matches}]}
 
     print("Responses"*50)
     print(responses)
@@ -84,9 +143,34 @@ def search_results(query_result, property_name=None, language="de-DE"):
     return responses
 
 
+def lexical_shortcut(query_text, property_name=None, language="de-DE"):
+    """
+    Answer an exact keyword hit from the lexical index alone, without waiting for the query embedding.
+
+    Returns:
+        responses (dict): The exact matches in the shape of search_results, None if there is no exact hit
+    """
+    if lexical_index is None or not hybrid_config.get("shortcut", True) or property_name is None:
+        return None
+    responses = lexical_index.query(
+        query_text,
+        top_k=TOP_K,
+        filter={"location": property_name, "language": language},
+        min_coverage=hybrid_config.get("shortcut_min_coverage", 0.6),
+    )
+    matches = [match for match in responses["results"][0]["matches"] if match["exact"]]
+    if not matches:
+        return None
+    print(f"Lexical shortcut for '{query_text}': {[match['metadata']['text'] for match in matches]}")
+    return {"results": [{"matches": matches}]}
+
+def is_confident(match):
+    # exact keyword hits of the lexical index are kept regardless of the cosine score
+    return match["score"] > 0.5 or match.get("exact", False) # 0.8
+
 def confidence_score_filter(responses):
     """
-    Filter out results with confidence score < 0.5.
+    Filter out results with confidence score < 0.5 (exact keyword hits are kept).
 
     Args:
         responses (list): List of responses from search_results with metadata, scores and ids
@@ -100,8 +184,20 @@ def confidence_score_filter(responses):
 
     for result in responses["results"]:
         # Matches to keep
-        responses = [(match["metadata"]["text"], match["metadata"]["location"], match["metadata"]["uniqe"], match["score"]) for match in result["matches"] if match["score"] > 0.5] # 0.8 
+        responses = [(match["metadata"]["text"], match["metadata"]["location"], match["metadata"]["uniqe"], match["score"]) for match in result["matches"] if is_confident(match)]
         # If no results with confidence score > 0.5, return an empty Paragraph
         if len(responses) == 0:
             responses = [(' ', None, False)]
     return responses
+
+def get_match_ids(responses):
+    """
+    Get the IDs of the matches that pass the confidence score filter.
+
+    Args:
+        responses (list): List of responses from search_results with metadata, scores and ids
+
+    Returns:
+        match_ids (list): IDs of the matches with confidence score > 0.5
+    """
+    return [match["id"] for result in responses["results"] for match in result["matches"] if is_confident(match)]
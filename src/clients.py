@@ -0,0 +1,88 @@
+"""
+Shared clients for the external services, created on first use.
+
+The SDKs are imported inside the getters, so importing the Lambda handler does not pay for
+SDKs the request does not need (e.g. Pinecone with the local retrieval backend).
+"""
+import os
+import threading
+
+from src.config import load_config
+
+config = load_config()
+
+chat_client = None
+twillio_client = None
+pinecone_index = None
+openai_client = None
+async_openai_client = None
+lambda_client = None
+
+# search_results runs in worker threads, the Pinecone index must only be initialized once
+pinecone_lock = threading.Lock()
+
+
+def get_chat_client():
+    """
+    Azure AI inference client for chat completions, shared by the conversation and the location recognition.
+    """
+    global chat_client
+    if chat_client is None:
+        from azure.ai.inference.aio import ChatCompletionsClient
+        from azure.core.credentials import AzureKeyCredential
+        chat_client = ChatCompletionsClient(
+            endpoint=os.getenv("AZURE_LLM_URL"),
+            credential=AzureKeyCredential(os.getenv("AZURE_LLM_KEY"))
+        )
+    return chat_client
+
+
+def get_twillio_client():
+    # The async HTTP client needs a running event loop, so the Twilio client is created on first use
+    global twillio_client
+    if twillio_client is None:
+        from twilio.rest import Client
+        from twilio.http.async_http_client import AsyncTwilioHttpClient
+        twillio_client = Client(os.environ["TWILIO_ACCOUNT_SID"], os.environ["TWILIO_AUTH_TOKEN"], http_client=AsyncTwilioHttpClient())
+    return twillio_client
+
+
+def get_pinecone_index():
+    global pinecone_index
+    with pinecone_lock:
+        if pinecone_index is None:
+            import pinecone
+            pinecone.init(
+                api_key=os.getenv('PINECONE_API_KEY'),
+                environment=config["pinecone"]["environment"]
+            )
+            pinecone_index = pinecone.Index(config["pinecone"]["index_name"])
+    return pinecone_index
+
+
+def get_openai_client():
+    global openai_client
+    if openai_client is None:
+        import openai
+        openai_client = openai.AzureOpenAI(
+            api_key=os.getenv('OPENAI_API_AZURE_KEY'), azure_endpoint=os.getenv('OPENAI_AZURE_BASE_URL'), api_version="2023-05-15"
+        )
+    return openai_client
+
+
+def get_async_openai_client():
+    global async_openai_client
+    if async_openai_client is None:
+        import openai
+        async_openai_client = openai.AsyncAzureOpenAI(
+            api_key=os.getenv('OPENAI_API_AZURE_KEY'), azure_endpoint=os.getenv('OPENAI_AZURE_BASE_URL'), api_version="2023-05-15"
+        )
+    return async_openai_client
+
+
+def get_lambda_client():
+    global lambda_client
+    if lambda_client is None:
+        import boto3
+        lambda_client = boto3.client('lambda')
+    return lambda_client
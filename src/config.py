@@ -0,0 +1,219 @@
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Literal, Optional
+
+import yaml
+from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict, ValidationError
+
+load_dotenv()
+
+CONFIG_PATH = "config.yaml"
+
+_ENV_PATTERN = re.compile(r"\$\{(\w+)\}")
+
+
+def interpolate_env(value):
+    """
+    Replace ${VAR} placeholders with environment variables, recursively.
+
+    A value that is only a placeholder becomes None if the variable is not set, so optional
+    settings like database.local.url stay disabled. Placeholders inside longer strings are
+    replaced with an empty string if the variable is not set.
+    """
+    if isinstance(value, dict):
+        return {key: interpolate_env(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [interpolate_env(item) for item in value]
+    if isinstance(value, str):
+        match = _ENV_PATTERN.fullmatch(value)
+        if match:
+            return os.getenv(match.group(1))
+        return _ENV_PATTERN.sub(lambda m: os.getenv(m.group(1), ""), value)
+    return value
+
+
+class ConfigSection(BaseModel):
+    # blocks that are not modelled (yet) stay available as plain dicts
+    model_config = ConfigDict(extra="allow", frozen=True)
+
+
+class SpeechSettings(ConfigSection):
+    default_language: str
+    default_voice: str
+
+
+class LocalDatabaseSettings(ConfigSection):
+    enabled: bool = False
+    url: Optional[str] = None
+    region: str = "localhost"
+
+
+class DatabaseSettings(ConfigSection):
+    table_name: Optional[str] = None
+    region: str
+    local: LocalDatabaseSettings
+    indexes: Dict[str, str] = {}
+    compress_min_bytes: Optional[int] = 2048
+
+
+class TransferSettings(ConfigSection):
+    default_extension: str
+    sip_domain: str
+    target: str
+
+
+class RepeatCallerSettings(ConfigSection):
+    window_minutes: int
+    max_calls: int
+    transfer_message: str
+    shared_table: Optional[str] = None
+
+
+class CallTimeoutSettings(ConfigSection):
+    warning_threshold_seconds: float
+    session_expiry_seconds: int
+    refresh_expiry_seconds: int
+
+
+class CallSettings(ConfigSection):
+    whitelist: List[str] = []
+    transfer: TransferSettings
+    repeat_caller: RepeatCallerSettings
+    timeout: CallTimeoutSettings
+
+
+class VoiceSettings(ConfigSection):
+    speech_rate: str
+
+
+class ConversationPaths(ConfigSection):
+    activities: str
+    refresh: str
+    disconnect: str
+
+
+class ApiSettings(ConfigSection):
+    base_paths: List[str] = []
+    conversation_paths: ConversationPaths
+
+
+class ResponseSettings(ConfigSection):
+    init_message: str
+    bot_response_format: str
+
+
+class HotelInfo(ConfigSection):
+    hotel_brand: str
+    properties: Dict[str, Optional[str]] = {}
+
+
+class BotSettings(ConfigSection):
+    name: str
+
+
+class TeamsChannelSettings(ConfigSection):
+    webhook_url: Optional[str] = None
+    success_message: str
+    failure_message: str
+
+
+class LlmSettings(ConfigSection):
+    prompt_layout: Literal["inline", "prefix_cache"] = "inline"
+    streaming: Dict[str, Any] = {}
+
+
+class SessionStoreSettings(ConfigSection):
+    backend: Literal["dynamodb", "sqlite", "memory"] = "dynamodb"
+    path: str = "data/sessions.db"
+    cache_max_entries: Optional[int] = None
+    cache_ttl_seconds: float = 900
+    write_behind: bool = False
+
+
+class ConfigReloadSettings(ConfigSection):
+    enabled: bool = True
+    check_interval_seconds: float = 5
+
+
+class Settings(ConfigSection):
+    """
+    Validated contents of config.yaml with typed attribute access, e.g.
+    get_settings().call.transfer.default_extension.
+    """
+    speech: SpeechSettings
+    database: DatabaseSettings
+    call: CallSettings
+    voice: VoiceSettings
+    api: ApiSettings
+    response: ResponseSettings
+    hotel_info: HotelInfo
+    microsoft_teams_channel: TeamsChannelSettings
+    bot: BotSettings
+    llm: LlmSettings = LlmSettings()
+    session_store: SessionStoreSettings = SessionStoreSettings()
+    config_reload: ConfigReloadSettings = ConfigReloadSettings()
+
+
+_settings = None
+_config = {}
+_mtime = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _read():
+    with open(CONFIG_PATH) as f:
+        raw = interpolate_env(yaml.safe_load(f))
+    return Settings.model_validate(raw), raw
+
+
+def get_settings():
+    """
+    Get the settings, parsed once per process.
+
+    If config_reload is enabled, the file's modification time is checked at most every
+    check_interval_seconds and a changed file is loaded without a restart. An invalid file
+    keeps the previous settings. Values copied into clients and caches at import time keep
+    their old value until a restart, config.yaml lists these keys under config_reload.
+    """
+    global _settings, _mtime, _checked_at
+    if _settings is not None:
+        reload_settings = _settings.config_reload
+        if not reload_settings.enabled or time.monotonic() - _checked_at < reload_settings.check_interval_seconds:
+            return _settings
+    with _lock:
+        _checked_at = time.monotonic()
+        try:
+            mtime = os.stat(CONFIG_PATH).st_mtime_ns
+        except OSError:
+            mtime = _mtime
+        if _settings is not None and mtime == _mtime:
+            return _settings
+        try:
+            settings, raw = _read()
+        except (OSError, yaml.YAMLError, ValidationError) as e:
+            if _settings is None:
+                raise
+            print(f"Could not reload {CONFIG_PATH}, keeping the previous settings: {e}")
+            _mtime = mtime
+            return _settings
+        if _settings is not None:
+            print(f"Reloaded {CONFIG_PATH}")
+        # update the shared dict in place (no key is ever missing), so modules holding it see the new values
+        _config.update(raw)
+        for key in set(_config) - set(raw):
+            del _config[key]
+        _settings = settings
+        _mtime = mtime
+    return _settings
+
+
+def load_config():
+    """
+    Get the parsed config.yaml as a dict, shared by all modules. Prefer get_settings() in new code.
+    """
+    get_settings()
+    return _config
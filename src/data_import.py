@@ -1,26 +1,31 @@
 ##################
 #  CREATE SEPARATE EMBEDDINGS FOR EACH QA
+#  Run from the repository root: python -m src.data_import [file] [--full]
 ###############
 
 import os
-import uuid
-import pandas as pd
+import argparse
+import hashlib
+import json
 import pinecone     
 import time
 from dotenv import load_dotenv
-import openpyxl
-from bot_embeddings import get_embeddings_sync
-import re
+from src.faq_reader import SUPPORTED_EXTENSIONS, iter_faq_records
+from src.bot_embeddings import get_embeddings_batch_sync, OPENAI_API_AZURE_EMBEDDING
+from src.embedding_store import EmbeddingStore
+from src.answer_cache import write_faq_version
 import sys
-import yaml
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from src.config import load_config
 
 load_dotenv()
 pinecone_api_key = os.getenv('PINECONE_API_KEY')
 pinecone_environment = os.getenv('PINECONE_ENVIRONMENT')
 #pinecone_index = os.getenv('PINECONE_INDEX')
 pinecone_index = "demo-test"
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+config = load_config()
+import_config = config.get("data_import", {})
 
 pinecone.init(      
     api_key=pinecone_api_key,      
@@ -34,95 +39,253 @@ def chunks(lst, n):
         yield lst[i:i + n]
 
 
-def process_data(file_path, batch_size=100):
+def embed_batch(batch, max_retries=6, initial_delay_seconds=2, max_delay_seconds=60):
+    """
+    Embed one batch of texts, backing off on rate limits (HTTP 429).
+
+    Returns:
+        list: The embeddings, None if the batch still failed after max_retries retries
+    """
+    delay = initial_delay_seconds
+    for attempt in range(max_retries + 1):
+        try:
+            return get_embeddings_batch_sync(batch)
+        except openai.RateLimitError as e:
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            wait = float(retry_after) if retry_after and retry_after.replace(".", "", 1).isdigit() else delay
+            print(f"Rate limit beim Embedding (Versuch {attempt + 1}), warte {wait:.1f}s", file=sys.stderr)
+            time.sleep(wait)
+            delay = min(delay * 2, max_delay_seconds)
+        except openai.APIError as e:
+            print(f"Fehler beim Embedding eines Batches von {len(batch)} Texten: {e}", file=sys.stderr)
+            return None
+    return None
+
+
+def embed_texts(texts, batch_size=16, max_concurrency=8, max_retries=6):
+    """
+    Embed texts in batches, with at most max_concurrency requests in flight. Identical texts are embedded once.
+
+    Returns:
+        dict: text -> embedding, texts of failed batches are missing
+    """
+    unique_texts = list(dict.fromkeys(texts))
+    batches = list(chunks(unique_texts, batch_size))
+    print(f"Erzeuge Embeddings für {len(unique_texts)} Texte in {len(batches)} Batches ({max_concurrency} parallel)")
+    embeddings = {}
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for batch, vectors in zip(batches, executor.map(lambda batch: embed_batch(batch, max_retries=max_retries), batches)):
+            if vectors is not None:
+                embeddings.update(zip(batch, vectors))
+    print(f"Embeddings erzeugt in {time.time() - start_time:.1f}s")
+    return embeddings
+
+
+def faq_vector_id(location, language, phrase, answer):
+    """
+    Deterministic vector ID of an FAQ entry, so an unchanged entry keeps its ID across imports.
+    """
+    content = json.dumps([location, language, phrase, answer], ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def read_records(file_path):
+    """
+    Read the FAQ spreadsheet (.xlsx, .csv or .parquet), streamed row by row.
+
+    Returns:
+        dict: vector ID -> (vector_qa, metadata), one entry per question phrase and location
+    """
+    records = {}
+    locations = config["hotel_info"]["properties"].keys()
+    for record in iter_faq_records(file_path, locations, sheets=import_config.get("sheets"), columns=import_config.get("columns"), match_substring=import_config.get("match_header_substring", False)):
+        phrase_vector = record.phrase.strip('.').strip(',').strip('?').lower()
+        answer_vector = record.answer.strip().strip('.').strip(',').strip('?').lower()
+
+        meta = {
+            "location": record.location,
+            "uniqe": record.uniqe,
+            "text": f"{record.phrase}: {record.answer}",
+            "language": record.language
+        }
+        vector_qa = f'Q: {phrase_vector} A: {answer_vector}'
+        records[faq_vector_id(record.location, record.language, record.phrase, record.answer)] = (vector_qa, meta)
+    return records
+
+
+def load_manifest(path, index_name):
+    """
+    Load the manifest of the vectors in the index (vector ID -> metadata), empty if it belongs to another index.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("index") != index_name:
+        print(f"Manifest {path} gehört zum Index {manifest.get('index')}, alle Vektoren werden neu importiert")
+        return {}
+    return manifest.get("vectors", {})
+
+
+def save_manifest(path, index_name, vectors):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"index": index_name, "vectors": vectors}, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def ensure_index(index_name, dimension=1536, timeout_seconds=300):
+    """
+    Create the Pinecone index if it does not exist and wait until it is ready.
+    """
+    if index_name in pinecone.list_indexes():
+        return
+    print(f"Creating index {index_name}")
+    pinecone.create_index(index_name, dimension=dimension, pod_type="s1")
+    deadline = time.time() + timeout_seconds
+    while not pinecone.describe_index(index_name).status.get("ready"):
+        if time.time() > deadline:
+            raise TimeoutError(f"Index {index_name} is not ready after {timeout_seconds}s")
+        time.sleep(2)
+
+
+def load_store(path):
+    """
+    Load the embedding store of the previous import, None if there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return EmbeddingStore.load(path, mmap=False)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Embedding-Store {path} konnte nicht geladen werden: {e}", file=sys.stderr)
+        return None
+
+
+def process_data(file_path, batch_size=100, full=False):
+    """
+    Import the FAQ spreadsheet into the index.
+
+    Only entries that are new since the last import are embedded and upserted, entries with
+    changed metadata are updated and entries removed from the spreadsheet are deleted. The
+    manifest records what is in the index; full=True ignores it and re-imports everything.
+    Without a manifest (first import, another index, full=True) the index is cleared before the
+    upload, as its vector IDs are unknown.
+    """
     print("Using Index: " + str(pinecone_index))
-    print("Waiting 10s")
-    time.sleep(10)
-    # print("Deleting index")
-    # pinecone.delete_index(pinecone_index)
-    # print("Waiting 10s")
-    # time.sleep(10)
-    print("Creating index")
-    pinecone.create_index(pinecone_index, dimension=1536, pod_type="s1")
-    print("Waiting 10s")
-    time.sleep(10)
-
-    if file_path.endswith(".xls") or file_path.endswith(".xlsx"):
-        df = pd.read_excel(file_path, engine='openpyxl')
-        
-        # Normalize column names to lowercase for case-insensitive access
-        df.columns = [col.lower() for col in df.columns]
-
-        # Rename columns to simplify access
-        frage_col = next((c for c in df.columns if "frage von onsai ergänzt" in c), None)
-        spezifisch_col = next((c for c in df.columns if "spezifisch" in c), None)
-        zur_bearbeitung_col = next((c for c in df.columns if "zur bearbeitung" in c), None)
-
-        if zur_bearbeitung_col:
-            df = df[~df[zur_bearbeitung_col].astype(str).str.lower().str.contains('x', na=False)]
-
-        locations = config["hotel_info"]["properties"].keys()
-
-        final_list = []
-        failed_embeddings = []
-
-        for idx, row in df.iterrows():
-            question_raw = row.get(frage_col)
-            if pd.isna(question_raw):
-                continue
-
-            # Split questions by comma or period
-            phrases = re.split(r'[,]', question_raw)
-            phrases = [phrase.strip() for phrase in phrases if phrase.strip()]
-
-            # Get language and 'spezifisch' fields
-            uniqe_string = str(row.get(spezifisch_col, "")).strip().lower()
-            language = str(row.get("language", "de-DE")).strip()
-            if not language or language.lower() == 'nan':
-                language = "de-DE"
-
-            uniqe = uniqe_string == "ja"
-
-            for phrase in phrases:
-                print(phrase)
-                for location_name in locations:
-                    answer = row.get(location_name.lower())
-                    if pd.isna(answer) or not answer:
-                        continue
-
-                    phrase_vector = phrase.strip().strip('.').strip(',').strip('?').lower()
-                    answer_vector = answer.strip().strip('.').strip(',').strip('?').lower()
-                    print("Phrase after cleaning: " + phrase_vector)
-
-                    meta = {
-                        "location": location_name,
-                        "uniqe": uniqe,
-                        "text": f"{phrase}: {answer}",
-                        "language": language
-                    }
-                    vector_qa = f'Q: {phrase_vector} A: {answer_vector}'
-                    vector = get_embeddings_sync(vector_qa)
-
-                    print(f"Phrase: {phrase}, Location: {location_name}, Answer: {answer}, Embedding: {vector}")
-
-                    if not vector:
-                        failed_embeddings.append(vector_qa)
-                        print(f"Konnte kein Vektor für Phrase generieren: {phrase}", file=sys.stderr)
-                        continue
-
-                    tmp = (str(uuid.uuid4()), vector, meta)
-                    final_list.append(tmp)
-
-        # Upload in batches
-        print(f"Gesamtzahl der Embeddings zum Hochladen: {len(final_list)}")
-        print(f"Anzahl der fehlgeschlagenen Embeddings: {len(failed_embeddings)}")
-        for batch in chunks(final_list, batch_size):
-            try:
-                index.upsert(vectors=batch)
-                print(f"Hochgeladenes Batch von {len(batch)} Vektoren.")
-            except pinecone.core.client.exceptions.ApiException as e:
-                print(f"Fehler beim Hochladen eines Batches: {e}", file=sys.stderr)
-                continue
+    ensure_index(pinecone_index)
+
+    if not file_path.lower().endswith(SUPPORTED_EXTENSIONS):
+        print(f"Nicht unterstütztes Dateiformat: {file_path}", file=sys.stderr)
+        return
+
+    records = read_records(file_path)
+    manifest_path = import_config.get("manifest_path", "data/faq_manifest.json")
+    manifest = {} if full else load_manifest(manifest_path, pinecone_index)
+    # Without a manifest the vectors in the index are unknown (e.g. uuid IDs of older imports),
+    # they would stay next to the new content-hash IDs, so the index is cleared before the upload
+    rebuild = not manifest
+
+    new_ids = [vector_id for vector_id in records if vector_id not in manifest]
+    changed_ids = [vector_id for vector_id in records if vector_id in manifest and manifest[vector_id] != records[vector_id][1]]
+    removed_ids = [vector_id for vector_id in manifest if vector_id not in records]
+    print(
+        f"FAQ-Einträge: {len(records)}, neu: {len(new_ids)}, geändert: {len(changed_ids)}, "
+        f"gelöscht: {len(removed_ids)}, unverändert: {len(records) - len(new_ids) - len(changed_ids)}"
+    )
+
+    # Embed only the new entries that are not in the embedding store yet, in batches instead of
+    # one request per phrase and location
+    store_path = config["retrieval"]["local"]["store_path"]
+    store = load_store(store_path)
+    embeddings = {}
+    if store is not None:
+        for vector_id in new_ids:
+            vector = store.vector_for_text(records[vector_id][0], model=OPENAI_API_AZURE_EMBEDDING)
+            if vector is not None:
+                embeddings[records[vector_id][0]] = vector.tolist()
+        print(f"Embeddings aus dem Embedding-Store übernommen: {len(embeddings)}")
+    embeddings.update(embed_texts(
+        [records[vector_id][0] for vector_id in new_ids if records[vector_id][0] not in embeddings],
+        batch_size=import_config.get("embedding_batch_size", 16),
+        max_concurrency=import_config.get("embedding_concurrency", 8),
+        max_retries=import_config.get("embedding_max_retries", 6),
+    ))
+
+    final_list = []
+    failed_embeddings = []
+    for vector_id in new_ids:
+        vector_qa, meta = records[vector_id]
+        vector = embeddings.get(vector_qa)
+        if not vector:
+            failed_embeddings.append(vector_qa)
+            print(f"Konnte kein Vektor für Phrase generieren: {meta['text']}", file=sys.stderr)
+            continue
+        final_list.append((vector_id, vector, meta))
+
+    if rebuild:
+        vector_count = index.describe_index_stats().get("total_vector_count", 0)
+        if vector_count:
+            print(f"Kein Manifest vorhanden, lösche alle {vector_count} Vektoren im Index {pinecone_index} vor dem Hochladen")
+            index.delete(delete_all=True)
+
+    # Upload in batches
+    print(f"Gesamtzahl der Embeddings zum Hochladen: {len(final_list)}")
+    print(f"Anzahl der fehlgeschlagenen Embeddings: {len(failed_embeddings)}")
+    for batch in chunks(final_list, batch_size):
+        try:
+            index.upsert(vectors=batch)
+            manifest.update({vector_id: meta for vector_id, _, meta in batch})
+            print(f"Hochgeladenes Batch von {len(batch)} Vektoren.")
+        except pinecone.core.client.exceptions.ApiException as e:
+            print(f"Fehler beim Hochladen eines Batches: {e}", file=sys.stderr)
+            continue
+
+    for vector_id in changed_ids:
+        try:
+            index.update(id=vector_id, set_metadata=records[vector_id][1])
+            manifest[vector_id] = records[vector_id][1]
+        except pinecone.core.client.exceptions.ApiException as e:
+            print(f"Fehler beim Aktualisieren von {vector_id}: {e}", file=sys.stderr)
+
+    for batch in chunks(removed_ids, batch_size):
+        try:
+            index.delete(ids=batch)
+            for vector_id in batch:
+                del manifest[vector_id]
+            print(f"Gelöschtes Batch von {len(batch)} Vektoren.")
+        except pinecone.core.client.exceptions.ApiException as e:
+            print(f"Fehler beim Löschen eines Batches: {e}", file=sys.stderr)
+
+    save_manifest(manifest_path, pinecone_index, manifest)
+
+    # Embedding store with all vectors of the index, for the local retrieval backend and to rebuild
+    # the index without embedding again
+    vectors = {vector_id: vector for vector_id, vector, _ in final_list}
+    if store is not None:
+        vectors.update({vector_id: store.get_vector(vector_id) for vector_id in manifest if vector_id not in vectors and vector_id in store.entries})
+    missing_ids = [vector_id for vector_id in manifest if vector_id not in vectors]
+    for batch in chunks(missing_ids, batch_size):
+        fetched = index.fetch(ids=batch)["vectors"]
+        vectors.update({vector_id: fetched[vector_id]["values"] for vector_id in batch if vector_id in fetched})
+    store = EmbeddingStore.from_records(
+        [(vector_id, records[vector_id][0] if vector_id in records else None, vectors[vector_id], meta) for vector_id, meta in manifest.items() if vector_id in vectors],
+        model=OPENAI_API_AZURE_EMBEDDING,
+    )
+    store.save(store_path)
+    print(f"Embedding-Store mit {len(store)} Vektoren gespeichert: {store_path}")
+
+    if final_list or changed_ids or removed_ids:
+        # New FAQ version, invalidates cached FAQ answers (answer_cache in backend.py)
+        faq_version = write_faq_version(config["answer_cache"]["faq_version_path"])
+        print(f"Neue FAQ-Version: {faq_version}")
 
 if __name__ == "__main__":
-    process_data("./data/Demo_FAQ.xlsx")
+    parser = argparse.ArgumentParser(description="Import the FAQ spreadsheet into the vector index")
+    parser.add_argument("file_path", nargs="?", default="./data/Demo_FAQ.xlsx", help="FAQ spreadsheet (.xlsx, .csv or .parquet)")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-import all entries")
+    args = parser.parse_args()
+    process_data(args.file_path, full=args.full)
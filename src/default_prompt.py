@@ -1,6 +1,9 @@
 from datetime import datetime 
+from functools import lru_cache
+from string import Formatter
 from src.helpers import get_text, get_current_date_with_weekday
 from src.pydantic_models import FAQResponse, Booking, Farewell, EmployeeHandover
+from src.config import get_settings
 import json
 
 def get_ai_prompt_template(language: str = "de-DE") -> str:
@@ -9,7 +12,7 @@ def get_ai_prompt_template(language: str = "de-DE") -> str:
     return '<break time="200ms"/>{0}'.format(ai_message)
 
 SYSTEM_PROMPT_TEMPLATE_DE = """
-Du bist Sora, die KI-Telefonassistentin bei Onsai Hotels International. Duzen ist obligatorisch.
+Du bist {bot_name}, die KI-Telefonassistentin bei Onsai Hotels International. Duzen ist obligatorisch.
 Das heutige Datum ist {str_date}.
 Du sprichst ausschließlich auf Deutsch.
 Sei immer höflich und hilfsbereit. Du kannst AUSSCHLIEßLICH die Informationen aus dem CONTEXT für die Beantwortung der Fragen verwenden. 
@@ -59,7 +62,7 @@ Wichtig:
 """
 
 SYSTEM_PROMPT_TEMPLATE_EN = """
-You are Sora, the AI phone assistant at onsai Hotels International.
+You are {bot_name}, the AI phone assistant at onsai Hotels International.
 Today's date is {str_date}.
 You speak only in English. 
 Always be polite and helpful. You can ONLY use the information from the CONTEXT to answer the questions.
@@ -108,23 +111,78 @@ Important:
 - If the user says goodbye or ends the conversation, say goodbye politely and appropriately for the phone conversation and always add the word "Goodbye" at the end. Use {farewell_schema}.
 """
 
-def get_system_prompt_template(context=None, language=None, offers=None, guest_phone_number=None):
+# Fields that change with every turn, everything else is rendered once per (language, bot name)
+DYNAMIC_FIELDS = ("str_date", "context", "guest_phone_number")
+
+
+@lru_cache(maxsize=None)
+def get_schemas():
+    """
+    JSON schemas of the response models, they never change at runtime.
+    """
+    return {
+        "faq_schema": json.dumps(FAQResponse.model_json_schema(), indent=2),
+        "booking_schema": json.dumps(Booking.model_json_schema(), indent=2),
+        "farewell_schema": json.dumps(Farewell.model_json_schema(), indent=2),
+        "employee_handover_schema": json.dumps(EmployeeHandover.model_json_schema(), indent=2),
+    }
+
+
+# Placeholders for the dynamic fields in the "prefix_cache" layout, the values follow in the turn context message
+PREFIX_CACHE_MARKERS = {
+    "str_date": "[DATE]",
+    "context": "[CONTEXT]",
+    "guest_phone_number": "[GUEST_PHONE_NUMBER]",
+}
+
+
+@lru_cache(maxsize=32)
+def compile_system_prompt(language, bot_name, layout="inline"):
+    """
+    Split the system prompt template of a language into literal text and dynamic fields.
+
+    The static fields (schemas, bot name) are rendered into the literal text once. With the
+    "prefix_cache" layout the dynamic fields are replaced by the PREFIX_CACHE_MARKERS as well, so the
+    whole system prompt is one literal that stays byte-identical across turns.
+
+    Returns:
+        tuple: (literal, field) pairs, field is one of DYNAMIC_FIELDS or None
+    """
+    template = SYSTEM_PROMPT_TEMPLATE_EN if language == "en-US" else SYSTEM_PROMPT_TEMPLATE_DE
+    static_fields = {**get_schemas(), "bot_name": bot_name}
+    if layout == "prefix_cache":
+        static_fields.update(PREFIX_CACHE_MARKERS)
+    parts = []
+    literal = ""
+    for text, field, format_spec, conversion in Formatter().parse(template):
+        literal += text
+        if field is None:
+            continue
+        if field in DYNAMIC_FIELDS and field not in static_fields:
+            parts.append((literal, field))
+            literal = ""
+        else:
+            literal += format(static_fields[field], format_spec)
+    parts.append((literal, None))
+    return tuple(parts)
+
+
+def render_system_prompt(parts, **fields):
+    return "".join(literal + (str(fields[field]) if field else "") for literal, field in parts)
+
+
+def get_turn_fields(context=None, language=None, offers=None):
     """
-    Get the system prompt template.
+    Get the values of the dynamic fields that do not depend on the guest.
+
+    Returns:
+        str_date (str): Today's date with weekday
+        context (str): The retrieved paragraphs and the room description of the offers
     """
     current_date_with_weekday = get_current_date_with_weekday(language=language)
     print("Current date with weekday: ", current_date_with_weekday)
     print("Offers in PROMPT TEMPLATE: ", offers)
 
-    faq_model = FAQResponse.model_json_schema()
-    faq_schema = json.dumps(faq_model, indent=2)
-    booking_model = Booking.model_json_schema()
-    booking_schema = json.dumps(booking_model, indent=2)
-    farewell_model = Farewell.model_json_schema()
-    farewell_schema = json.dumps(farewell_model, indent=2)
-    employee_handover_model = EmployeeHandover.model_json_schema()
-    employee_handover_schema = json.dumps(employee_handover_model, indent=2)
-
     room_description = None
     if offers is not None:
         # get unit group and room description
@@ -136,13 +194,45 @@ def get_system_prompt_template(context=None, language=None, offers=None, guest_p
     if room_description is not None:
         context = f"{context}\n{room_description}"
     print("Context in PROMPT TEMPLATE: ", context)
+    return current_date_with_weekday, context
+
+
+def get_system_prompt_template(context=None, language=None, offers=None, guest_phone_number=None):
+    """
+    Get the system prompt for a turn from the precompiled template.
+    """
+    str_date, context = get_turn_fields(context, language=language, offers=offers)
+    settings = get_settings()
+    parts = compile_system_prompt(language, settings.bot.name)
+    return render_system_prompt(parts, str_date=str_date, context=context, guest_phone_number=guest_phone_number)
 
 
-    # Format date into the initial templates
-    if language == "en-US":
-        prompt = SYSTEM_PROMPT_TEMPLATE_EN.format(str_date=current_date_with_weekday, faq_schema=faq_schema, booking_schema=booking_schema, context=context, guest_phone_number=guest_phone_number, farewell_schema=farewell_schema,employee_handover_schema=employee_handover_schema)
-        
-    else:
-        prompt = SYSTEM_PROMPT_TEMPLATE_DE.format(str_date=current_date_with_weekday, faq_schema=faq_schema, booking_schema=booking_schema, context=context, guest_phone_number=guest_phone_number, farewell_schema=farewell_schema, employee_handover_schema=employee_handover_schema)
-    
-    return prompt
\ No newline at end of file
+def get_prefix_cache_prompt(context=None, language=None, offers=None, guest_phone_number=None):
+    """
+    Get the system prompt split for provider-side prompt caching.
+
+    The system prompt only contains static instructions and schemas, with placeholders for the
+    dynamic fields, so it is the same for every turn of every call in a language. The date, the
+    retrieved context and the phone number are sent in a separate turn context message right
+    before the latest user message.
+
+    Returns:
+        system_prompt (str): The static system prompt
+        turn_context (str): The content of the turn context message
+    """
+    str_date, context = get_turn_fields(context, language=language, offers=offers)
+    settings = get_settings()
+    parts = compile_system_prompt(language, settings.bot.name, layout="prefix_cache")
+    turn_context = (
+        f"{PREFIX_CACHE_MARKERS['str_date']}: {str_date}\n"
+        f"{PREFIX_CACHE_MARKERS['guest_phone_number']}: {guest_phone_number}\n"
+        f"{PREFIX_CACHE_MARKERS['context']}:\n{context}"
+    )
+    return render_system_prompt(parts), turn_context
+
+
+def estimate_tokens(text):
+    """
+    Rough token count (about 4 characters per token), good enough to compare prompt segments.
+    """
+    return (len(text) + 3) // 4 if text else 0
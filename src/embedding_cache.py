@@ -0,0 +1,166 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+import boto3
+
+
+def normalize_text(text):
+    """
+    Normalize an utterance for cache lookups: lowercase, collapse whitespace, strip punctuation at the ends.
+    """
+    return " ".join(text.lower().split()).strip(".,?! ")
+
+
+def _encode_vector(embedding):
+    return array("f", embedding).tobytes()
+
+
+def _decode_vector(data):
+    vector = array("f")
+    vector.frombytes(bytes(data))
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache with TTL for query embeddings, keyed on (embedding model, normalized text).
+
+    An optional second tier (SQLiteEmbeddingStore or DynamoDBEmbeddingStore) keeps embeddings
+    across process restarts and Lambda cold starts.
+    """
+
+    def __init__(self, max_entries=2048, ttl_seconds=86400, store=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def key(self, model, text):
+        return f"{model}:{normalize_text(text)}"
+
+    def get(self, model, text):
+        """
+        Look up an embedding in memory only. Returns None on a miss.
+        """
+        key = self.key(model, text)
+        entry = self.entries.get(key)
+        if entry is not None:
+            embedding, expires_at = entry
+            if expires_at > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            del self.entries[key]
+        return None
+
+    def get_from_store(self, model, text):
+        """
+        Look up an embedding in the second tier (blocking) and promote it to memory.
+        Counts a miss if it is not found there either or the store is unavailable, so the
+        caller falls through to the embeddings API.
+        """
+        key = self.key(model, text)
+        embedding = None
+        if self.store is not None:
+            try:
+                embedding = self.store.get(key)
+            except Exception as e:
+                print(f"Error reading embedding from the cache store: {e}")
+        if embedding is None:
+            self.misses += 1
+            return None
+        self.store_hits += 1
+        self._remember(key, embedding)
+        return embedding
+
+    def put(self, model, text, embedding):
+        """
+        Store an embedding in memory and in the second tier (blocking).
+        """
+        key = self.key(model, text)
+        self._remember(key, embedding)
+        if self.store is not None:
+            try:
+                self.store.put(key, embedding, self.ttl_seconds)
+            except Exception as e:
+                print(f"Error writing embedding to the cache store: {e}")
+
+    def _remember(self, key, embedding):
+        self.entries[key] = (embedding, time.time() + self.ttl_seconds)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.store_hits + self.misses
+        return {
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.store_hits) / lookups if lookups else 0.0,
+            "size": len(self.entries),
+        }
+
+
+class SQLiteEmbeddingStore:
+    """
+    File-backed second tier for the embedding cache.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, expires_at REAL)"
+        )
+        self.connection.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT vector FROM embeddings WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return _decode_vector(row[0]) if row else None
+
+    def put(self, key, embedding, ttl_seconds):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, expires_at) VALUES (?, ?, ?)",
+                (key, _encode_vector(embedding), time.time() + ttl_seconds),
+            )
+            self.connection.commit()
+
+
+class DynamoDBEmbeddingStore:
+    """
+    DynamoDB-backed second tier for the embedding cache, shared by all Lambda instances.
+
+    Expects a table with the string partition key "id" and TTL enabled on "expires_at".
+    """
+
+    def __init__(self, table_name, region_name, endpoint_url=None):
+        dynamodb = boto3.resource("dynamodb", region_name=region_name, endpoint_url=endpoint_url)
+        self.table = dynamodb.Table(table_name)
+
+    def _id(self, key):
+        return "embedding#" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        item = self.table.get_item(Key={"id": self._id(key)}).get("Item")
+        if item is None or int(item["expires_at"]) <= time.time():
+            return None
+        return _decode_vector(item["vector"].value)
+
+    def put(self, key, embedding, ttl_seconds):
+        self.table.put_item(Item={
+            "id": self._id(key),
+            "vector": _encode_vector(embedding),
+            "expires_at": int(time.time() + ttl_seconds),
+        })
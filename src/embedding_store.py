@@ -0,0 +1,229 @@
+"""
+On-disk store of the FAQ embeddings, the source of truth for the vector backends.
+
+A store is a directory with two files:
+
+    vectors.npy   float32 matrix, one L2-normalised row per FAQ entry, loaded with mmap
+    index.json    embedding model, dimension and one entry per vector ID (content hash):
+                  {"row": ..., "text": the embedded Q/A text, "metadata": the Pinecone metadata}
+
+The rows are sorted by (location, language), so every partition of the local index is a
+contiguous slice of the memory map and loading the store copies no vectors. It is written by
+src/data_import.py. The command line tool exports and imports stores and rebuilds a Pinecone
+index from one without calling the embeddings API:
+
+    python -m src.embedding_store info data/embedding_store
+    python -m src.embedding_store export data/embedding_store faq_vectors.npz
+    python -m src.embedding_store import faq_vectors.npz data/embedding_store
+    python -m src.embedding_store push-pinecone data/embedding_store --index demo-test
+"""
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+INDEX_FILE = "index.json"
+
+
+class EmbeddingStore:
+    """
+    FAQ embeddings with their metadata, keyed by vector ID.
+    """
+
+    def __init__(self, vectors, entries, model=None):
+        """
+        Args:
+            vectors (np.ndarray): float32 matrix (may be a memory map)
+            entries (dict): vector ID -> {"row": int, "text": str, "metadata": dict}
+            model (str): Name of the embedding model (deployment)
+        """
+        self.vectors = vectors
+        self.entries = entries
+        self.model = model
+        self.rows_by_text = {entry["text"]: entry["row"] for entry in entries.values() if entry.get("text")}
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def dimension(self):
+        return int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0
+
+    @classmethod
+    def from_records(cls, records, model=None):
+        """
+        Build a store from (vector ID, text, vector, metadata) tuples.
+        """
+        records = sorted(records, key=lambda record: (str(record[3].get("location")), str(record[3].get("language")), record[0]))
+        vectors = np.array([vector for _, _, vector, _ in records], dtype=np.float32)
+        if len(records):
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors /= norms
+        entries = {
+            vector_id: {"row": row, "text": text, "metadata": metadata}
+            for row, (vector_id, text, _, metadata) in enumerate(records)
+        }
+        return cls(vectors, entries, model=model)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a store, with mmap the vectors are mapped read-only instead of read into memory.
+        """
+        with open(os.path.join(path, INDEX_FILE), encoding="utf-8") as f:
+            index = json.load(f)
+        vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r" if mmap else None, allow_pickle=False)
+        if len(vectors) != len(index["entries"]):
+            raise ValueError(f"Embedding store {path} is inconsistent: {len(vectors)} vectors, {len(index['entries'])} entries")
+        return cls(vectors, index["entries"], model=index.get("model"))
+
+    def save(self, path):
+        """
+        Write the store. The new files are written next to the old store and swapped in, so a
+        process that has the old store mapped keeps a consistent view.
+        """
+        tmp_path = path.rstrip("/") + ".tmp"
+        old_path = path.rstrip("/") + ".old"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, VECTORS_FILE), np.asarray(self.vectors, dtype=np.float32))
+        with open(os.path.join(tmp_path, INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "dimension": self.dimension, "entries": self.entries}, f, ensure_ascii=False)
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    def get_vector(self, vector_id):
+        entry = self.entries.get(vector_id)
+        return self.vectors[entry["row"]] if entry is not None else None
+
+    def vector_for_text(self, text, model=None):
+        """
+        Get the stored embedding of an identical text, None if it is unknown or was embedded with another model.
+        """
+        if model is not None and self.model is not None and model != self.model:
+            return None
+        row = self.rows_by_text.get(text)
+        return self.vectors[row] if row is not None else None
+
+    def partitions(self):
+        """
+        Yields ((location, language), start row, end row, IDs, metadata) for every partition.
+        """
+        ordered = sorted(self.entries.items(), key=lambda item: item[1]["row"])
+        start = 0
+        while start < len(ordered):
+            metadata = ordered[start][1]["metadata"]
+            key = (metadata.get("location"), metadata.get("language"))
+            end = start
+            while end < len(ordered) and (ordered[end][1]["metadata"].get("location"), ordered[end][1]["metadata"].get("language")) == key:
+                end += 1
+            yield key, ordered[start][1]["row"], ordered[end - 1][1]["row"] + 1, [vector_id for vector_id, _ in ordered[start:end]], [entry["metadata"] for _, entry in ordered[start:end]]
+            start = end
+
+    def items(self):
+        """
+        Yields (vector ID, vector, metadata), the tuples uploaded to Pinecone.
+        """
+        for vector_id, entry in self.entries.items():
+            yield vector_id, self.vectors[entry["row"]], entry["metadata"]
+
+
+def export_store(store, file_path):
+    """
+    Export to a snapshot .npz (as read by LocalVectorIndex.from_file) or to JSON lines.
+    """
+    if file_path.endswith(".jsonl"):
+        with open(file_path, "w", encoding="utf-8") as f:
+            for vector_id, entry in store.entries.items():
+                f.write(json.dumps({
+                    "id": vector_id,
+                    "text": entry.get("text"),
+                    "metadata": entry["metadata"],
+                    "values": store.vectors[entry["row"]].tolist(),
+                }, ensure_ascii=False) + "\n")
+        return
+    from src.local_index import save_snapshot
+    save_snapshot(file_path, list(store.items()))
+
+
+def import_store(file_path, model=None):
+    """
+    Build a store from a .npz snapshot or a JSON lines export.
+    """
+    records = []
+    if file_path.endswith(".jsonl"):
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records.append((record["id"], record.get("text"), record["values"], record["metadata"]))
+    else:
+        with np.load(file_path, allow_pickle=False) as data:
+            for vector_id, vector, metadata in zip(data["ids"].tolist(), data["vectors"], data["metadata"].tolist()):
+                records.append((vector_id, None, vector, json.loads(metadata)))
+    return EmbeddingStore.from_records(records, model=model)
+
+
+def push_to_pinecone(store, index_name, batch_size=100):
+    """
+    Upsert all vectors of the store into a Pinecone index, e.g. after an index migration.
+    """
+    import pinecone
+    from src.config import load_config
+    config = load_config()
+    pinecone.init(api_key=os.getenv("PINECONE_API_KEY"), environment=config["pinecone"]["environment"])
+    index = pinecone.Index(index_name)
+    batch = []
+    for vector_id, vector, metadata in store.items():
+        batch.append((vector_id, vector.tolist(), metadata))
+        if len(batch) == batch_size:
+            index.upsert(vectors=batch)
+            batch = []
+    if batch:
+        index.upsert(vectors=batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, export and import the FAQ embedding store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="Print the size of a store")
+    info.add_argument("store")
+    export = commands.add_parser("export", help="Export a store to .npz or .jsonl")
+    export.add_argument("store")
+    export.add_argument("file")
+    import_ = commands.add_parser("import", help="Create a store from a .npz or .jsonl export")
+    import_.add_argument("file")
+    import_.add_argument("store")
+    import_.add_argument("--model", help="Embedding model of the vectors")
+    push = commands.add_parser("push-pinecone", help="Upsert a store into a Pinecone index")
+    push.add_argument("store")
+    push.add_argument("--index", required=True, help="Pinecone index name")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        store = import_store(args.file, model=args.model)
+        store.save(args.store)
+        print(f"Imported {len(store)} vectors into {args.store}")
+        return
+    store = EmbeddingStore.load(args.store)
+    if args.command == "info":
+        partitions = {f"{location}/{language}": end - start for (location, language), start, end, _, _ in store.partitions()}
+        print(f"{args.store}: {len(store)} vectors, dimension {store.dimension}, model {store.model}")
+        print(json.dumps(partitions, indent=2, ensure_ascii=False))
+    elif args.command == "export":
+        export_store(store, args.file)
+        print(f"Exported {len(store)} vectors to {args.file}")
+    elif args.command == "push-pinecone":
+        push_to_pinecone(store, args.index)
+        print(f"Upserted {len(store)} vectors into {args.index}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Streaming reader for the FAQ spreadsheets imported by src/data_import.py.
+
+Rows are read one at a time (openpyxl read-only mode, csv module, Parquet record batches), so
+the import memory does not grow with the size of the workbook. Every row yields one FAQRecord per
+question phrase and property with an answer.
+"""
+import csv
+import re
+from collections import namedtuple
+
+import openpyxl
+
+SUPPORTED_EXTENSIONS = (".xlsx", ".xlsm", ".csv", ".parquet")
+
+FAQRecord = namedtuple("FAQRecord", ["phrase", "location", "language", "uniqe", "answer"])
+
+# Header names per column, compared stripped and lowercase
+DEFAULT_COLUMNS = {
+    "question": ["frage von onsai ergänzt", "question"],
+    "unique": ["spezifisch", "unique"],
+    "skip": ["zur bearbeitung", "skip"],
+    "language": ["language", "sprache"],
+}
+
+
+def _is_empty(value):
+    if value is None:
+        return True
+    if isinstance(value, float) and value != value:  # NaN from Parquet
+        return True
+    return isinstance(value, str) and (not value.strip() or value.strip().lower() == "nan")
+
+
+def _find_column(headers, names, match_substring=False):
+    for index, header in enumerate(headers):
+        if header in names or (match_substring and any(name in header for name in names)):
+            return index
+    return None
+
+
+class HeaderMapping:
+    """
+    Column positions of one sheet, detected from its header row. Headers match a column name
+    exactly; with match_substring a header containing the name matches too (question, unique
+    and skip columns only).
+    """
+
+    def __init__(self, header_row, locations, columns=None, match_substring=False):
+        columns = {name: [value.strip().lower() for value in values] for name, values in {**DEFAULT_COLUMNS, **(columns or {})}.items()}
+        headers = [str(header).strip().lower() if header is not None else "" for header in header_row]
+        self.question = _find_column(headers, columns["question"], match_substring)
+        self.unique = _find_column(headers, columns["unique"], match_substring)
+        self.skip = _find_column(headers, columns["skip"], match_substring)
+        self.language = _find_column(headers, columns["language"])
+        # one answer column per property, matched on the exact (lowercase) property name
+        self.locations = [(location, headers.index(location.lower())) for location in locations if location.lower() in headers]
+
+    def records(self, row):
+        """
+        Yields the FAQRecords of a data row.
+        """
+        def cell(index):
+            return row[index] if index is not None and index < len(row) else None
+
+        question = cell(self.question)
+        if _is_empty(question):
+            return
+        if self.skip is not None and "x" in str(cell(self.skip)).lower():
+            return
+        language = cell(self.language)
+        language = "de-DE" if _is_empty(language) else str(language).strip()
+        uniqe = str(cell(self.unique) or "").strip().lower() == "ja"
+
+        # Split questions by comma
+        phrases = [phrase.strip() for phrase in re.split(r'[,]', str(question)) if phrase.strip()]
+        for phrase in phrases:
+            for location, index in self.locations:
+                answer = cell(index)
+                if _is_empty(answer):
+                    continue
+                # the answer text is kept as written, it is part of the vector ID (data_import.faq_vector_id)
+                yield FAQRecord(phrase, location, language, uniqe, answer if isinstance(answer, str) else str(answer))
+
+
+def _iter_xlsx(file_path, sheets=None):
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            if sheets and worksheet.title not in sheets:
+                continue
+            yield worksheet.title, worksheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _iter_csv(file_path):
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        yield file_path, csv.reader(f, dialect)
+
+
+def _iter_parquet(file_path, batch_size=1024):
+    try:
+        import pyarrow.parquet as pq  # optional, only needed for Parquet input
+    except ImportError as e:
+        raise ImportError(f"Reading {file_path} needs pyarrow, install it with: pip install pyarrow") from e
+
+    parquet_file = pq.ParquetFile(file_path)
+
+    def rows():
+        yield parquet_file.schema_arrow.names
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            columns = batch.to_pydict()
+            names = list(columns)
+            for index in range(batch.num_rows):
+                yield [columns[name][index] for name in names]
+
+    yield file_path, rows()
+
+
+def iter_faq_records(file_path, locations, sheets=None, columns=None, match_substring=False):
+    """
+    Read the FAQ entries of a spreadsheet lazily.
+
+    Args:
+        file_path (str): .xlsx/.xlsm workbook (all sheets with a question column), .csv or .parquet
+        locations (iterable): Property names, every property is an answer column
+        sheets (list): Only read these sheets of a workbook
+        columns (dict): Header names per column, overrides DEFAULT_COLUMNS
+        match_substring (bool): Also match headers that contain a column name, e.g.
+            "Frage von onsai ergänzt (DE)"
+
+    Yields:
+        FAQRecord: One record per question phrase and property with an answer
+    """
+    locations = list(locations)
+    lower_path = file_path.lower()
+    if lower_path.endswith((".xlsx", ".xlsm")):
+        tables = _iter_xlsx(file_path, sheets)
+    elif lower_path.endswith(".csv"):
+        tables = _iter_csv(file_path)
+    elif lower_path.endswith(".parquet"):
+        tables = _iter_parquet(file_path)
+    else:
+        raise ValueError(f"Unsupported FAQ file format: {file_path}")
+
+    for name, rows in tables:
+        header_row = next(rows, None)
+        if header_row is None:
+            continue
+        mapping = HeaderMapping(header_row, locations, columns, match_substring)
+        if mapping.question is None:
+            print(f"Überspringe {name}: keine Fragen-Spalte gefunden")
+            continue
+        if not mapping.locations:
+            print(f"Überspringe {name}: keine Spalte für die Properties {locations}")
+            continue
+        for row in rows:
+            yield from mapping.records(row)
@@ -6,8 +6,8 @@ from datetime import datetime
 from decimal import Decimal
 import random
 import re
-import requests
 from dotenv import load_dotenv
+from src.http_client import request_with_retry
 
 
 load_dotenv()
@@ -178,7 +178,7 @@ def convert_floats_to_decimals(obj):
     return obj
 
 
-def send_teams_message(webhook_url, title, message, details=None, is_error=False):
+async def send_teams_message(webhook_url, title, message, details=None, is_error=False):
     """
     Send a message to a Microsoft Teams channel via webhook using Adaptive Cards.
 
@@ -236,7 +236,7 @@ def send_teams_message(webhook_url, title, message, details=None, is_error=False
     }
 
     try:
-        response = requests.post(webhook_url, headers=headers, data=json.dumps(payload))
+        response = await request_with_retry("POST", webhook_url, headers=headers, content=json.dumps(payload))
         if response.status_code == 200:
             print("Message posted successfully to Teams.")
         else:
@@ -0,0 +1,69 @@
+import json
+
+from src.default_prompt import estimate_tokens
+
+# Booking slots collected by the LLM, see pydantic_models.Booking
+BOOKING_SLOTS = ("arrival_date", "departure_date", "number_of_adults", "first_name", "last_name", "guest_whatsapp_number", "booking_confirmed")
+
+
+class HistoryManager:
+    """
+    Bounds the conversation that is sent to the LLM on every turn.
+
+    The stored history is not changed. For the LLM call the system prompt is kept, the last
+    keep_exchanges exchanges (user message and assistant answer) are sent verbatim and older turns
+    are dropped. The booking slots collected in the dropped turns are not lost, they are sent as a
+    short system note instead of the raw dialogue. If the kept turns still exceed max_tokens, the
+    oldest of them are dropped as well; the latest user message is always kept.
+    """
+
+    def __init__(self, keep_exchanges=6, max_tokens=3000):
+        self.keep_exchanges = keep_exchanges
+        self.max_tokens = max_tokens
+
+    @staticmethod
+    def booking_note(booking_data):
+        """
+        Get the system note with the booking slots collected so far, None if there are none.
+        """
+        slots = {slot: booking_data[slot] for slot in BOOKING_SLOTS if (booking_data or {}).get(slot) not in (None, "", "none", "null")}
+        if not slots:
+            return None
+        return "Earlier turns of this call were removed. Booking data collected so far: " + json.dumps(slots, ensure_ascii=False, default=str)
+
+    def compact(self, history, booking_data=None):
+        """
+        Get the messages for the LLM call.
+
+        Args:
+            history (list): The full history, history[0] is the system prompt
+            booking_data (dict): The booking data collected by follow_up
+
+        Returns:
+            list: The system prompt, the booking note if turns were dropped, and the latest turns
+        """
+        if len(history) < 2:
+            return history
+        system_prompt, turns = history[0], history[1:]
+
+        # keep the last keep_exchanges user messages and everything after the first of them
+        user_indexes = [index for index, message in enumerate(turns) if message["role"] == "user"]
+        start = user_indexes[-self.keep_exchanges] if len(user_indexes) > self.keep_exchanges else 0
+        kept = turns[start:]
+
+        # drop the oldest kept messages until the budget is met, the latest user message stays
+        last_user = max((index for index, message in enumerate(kept) if message["role"] == "user"), default=len(kept) - 1)
+        tokens = sum(estimate_tokens(message["content"]) for message in kept)
+        drop = 0
+        while tokens > self.max_tokens and drop < last_user:
+            tokens -= estimate_tokens(kept[drop]["content"])
+            drop += 1
+        kept = kept[drop:]
+
+        if len(kept) == len(turns):
+            return history
+        messages = [system_prompt]
+        note = self.booking_note(booking_data)
+        if note is not None:
+            messages.append({"role": "system", "content": note})
+        return messages + kept
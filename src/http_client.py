@@ -0,0 +1,82 @@
+import asyncio
+import random
+import httpx
+from src.config import load_config
+
+config = load_config()
+
+http_config = config.get("http_client", {})
+retry_config = http_config.get("retries", {})
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# raised before the request was sent, so even a non-idempotent request can be repeated
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+http_client = None
+
+
+def get_http_client():
+    """
+    Get the process-wide HTTP client with connection pooling and keep-alive, created on first use.
+    All Apaleo and Teams requests share its connections.
+    """
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            http2=http_config.get("http2", True),
+            timeout=httpx.Timeout(
+                http_config.get("timeout_seconds", 10.0),
+                connect=http_config.get("connect_timeout_seconds", 3.0),
+            ),
+            limits=httpx.Limits(
+                max_connections=http_config.get("max_connections", 50),
+                max_keepalive_connections=http_config.get("max_keepalive_connections", 20),
+                keepalive_expiry=http_config.get("keepalive_expiry_seconds", 60.0),
+            ),
+        )
+    return http_client
+
+
+def _retry_delay(attempt, response=None):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), retry_config.get("max_backoff_seconds", 5.0))
+    delay = retry_config.get("backoff_seconds", 0.5) * (2 ** attempt)
+    return min(delay, retry_config.get("max_backoff_seconds", 5.0)) * random.uniform(0.5, 1.0)
+
+
+async def request_with_retry(method, url, idempotent=None, **kwargs):
+    """
+    Send a request with the shared client and retry with exponential backoff on 429/5xx
+    responses and connection errors.
+
+    A non-idempotent request (e.g. the Teams webhook or the OAuth token POST) may already have been
+    processed when a timeout or a 5xx response arrives, so it is only retried if the connection
+    could not be established and nothing was sent.
+
+    Args:
+    - idempotent (bool): Whether the request may be repeated. Default: True for GET, HEAD, OPTIONS,
+      PUT and DELETE and for requests with an Idempotency-Key header (Apaleo), False otherwise.
+
+    Returns:
+    - httpx.Response: The last response. The last connection error is raised if no response was received.
+    """
+    if idempotent is None:
+        headers = {key.lower() for key in (kwargs.get("headers") or {})}
+        idempotent = method.upper() in IDEMPOTENT_METHODS or "idempotency-key" in headers
+    max_attempts = retry_config.get("max_attempts", 3)
+    for attempt in range(max_attempts):
+        last_attempt = attempt == max_attempts - 1
+        try:
+            response = await get_http_client().request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if last_attempt or not (idempotent or isinstance(e, UNSENT_ERRORS)):
+                raise
+            print(f"{method} {url} failed ({e}), retrying")
+            await asyncio.sleep(_retry_delay(attempt))
+            continue
+        if response.status_code not in RETRY_STATUS_CODES or last_attempt or not idempotent:
+            return response
+        print(f"{method} {url} returned {response.status_code}, retrying")
+        await asyncio.sleep(_retry_delay(attempt, response))
@@ -0,0 +1,187 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+
+# Frequent words of phone questions that carry no FAQ topic
+STOPWORDS = {
+    "aber", "am", "an", "auch", "auf", "bei", "bin", "bis", "bitte", "da", "das", "dass", "dem", "den",
+    "der", "des", "die", "du", "ein", "eine", "einen", "einem", "einer", "es", "fur", "gibt", "hab",
+    "habe", "haben", "hallo", "hat", "ich", "ihr", "im", "in", "ist", "ja", "kann", "konnen", "konnte",
+    "man", "mein", "meine", "mich", "mir", "mit", "nach", "noch", "nicht", "oder", "sie", "sind", "so",
+    "um", "und", "uns", "von", "vom", "was", "welche", "wie", "wir", "wo", "zu", "zum", "zur",
+    "a", "and", "are", "can", "do", "does", "for", "have", "hello", "i", "in", "is", "it", "my",
+    "of", "on", "please", "the", "there", "to", "what", "when", "where", "you",
+}
+UMLAUTS = str.maketrans({"ä": "a", "ö": "o", "ü": "u", "ß": "ss"})
+SUFFIXES = ("en", "er", "e", "n", "s")
+
+
+def tokenize(text):
+    """
+    Split a text into normalised terms: lowercase, umlauts folded, hyphenated words joined
+    ("W-LAN" -> "wlan"), stopwords removed and common German/English plural endings stripped.
+    """
+    terms = []
+    for word in re.findall(r"\w+", text.lower().translate(UMLAUTS).replace("-", "")):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 4:
+            for suffix in SUFFIXES:
+                if word.endswith(suffix):
+                    word = word[:-len(suffix)]
+                    break
+        terms.append(word)
+    return terms
+
+
+def question_of(text):
+    """
+    Get the question phrase of the metadata text "<phrase>: <answer>" written by data_import.
+    """
+    return text.split(": ", 1)[0]
+
+
+class LexicalIndex:
+    """
+    In-process BM25 index over the FAQ metadata texts, one inverted index per (location, language)
+    partition like LocalVectorIndex. Short phone utterances ("WLAN Passwort?", "Parkplatz") often
+    have a low cosine similarity to the "Q: ... A: ..." embeddings, but match the FAQ words exactly.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.partitions = {}
+
+    def add(self, ids, metadata):
+        """
+        Index FAQ entries with their Pinecone-style metadata (location, language, text, uniqe).
+        """
+        grouped = {}
+        for vector_id, meta in zip(ids, metadata):
+            grouped.setdefault((meta.get("location"), meta.get("language")), []).append((vector_id, meta))
+        for key, entries in grouped.items():
+            if key in self.partitions:
+                entries = list(zip(self.partitions[key]["ids"], self.partitions[key]["metadata"])) + entries
+            self.partitions[key] = self._build(entries)
+
+    def _build(self, entries):
+        postings = {}
+        lengths = []
+        questions = []
+        for doc, (_, meta) in enumerate(entries):
+            text = meta.get("text") or ""
+            terms = tokenize(text)
+            lengths.append(len(terms))
+            questions.append(set(tokenize(question_of(text))))
+            for term, frequency in Counter(terms).items():
+                postings.setdefault(term, []).append((doc, frequency))
+        count = len(entries)
+        return {
+            "ids": [vector_id for vector_id, _ in entries],
+            "metadata": [meta for _, meta in entries],
+            "postings": postings,
+            "idf": {term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5)) for term, docs in postings.items()},
+            "lengths": lengths,
+            "average_length": sum(lengths) / count if count else 0.0,
+            "questions": questions,
+        }
+
+    def query(self, text, top_k=2, filter=None, min_coverage=0.6):
+        """
+        Return the top_k BM25 matches of one (location, language) partition.
+
+        The result has the shape of a Pinecone query response; the score is the BM25 score.
+        A match is "exact" if every query term is in the FAQ question and the query terms cover
+        at least min_coverage of the question terms, so "Zimmer" is no exact hit for "Kann ich
+        das Zimmer früher beziehen?".
+        """
+        filter = filter or {}
+        partition = self.partitions.get((filter.get("location"), filter.get("language")))
+        terms = set(tokenize(text))
+        matches = []
+        if partition is not None and terms:
+            scores = Counter()
+            for term in terms:
+                idf = partition["idf"].get(term)
+                if idf is None:
+                    continue
+                for doc, frequency in partition["postings"][term]:
+                    length_norm = 1 - self.b + self.b * partition["lengths"][doc] / (partition["average_length"] or 1)
+                    scores[doc] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+            for doc, score in scores.most_common(top_k):
+                question = partition["questions"][doc]
+                exact = bool(question) and terms <= question and len(terms) / len(question) >= min_coverage
+                matches.append({"id": partition["ids"][doc], "score": score, "metadata": partition["metadata"][doc], "exact": exact})
+        return {"results": [{"matches": matches}]}
+
+    def __len__(self):
+        return sum(len(partition["ids"]) for partition in self.partitions.values())
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        Build the index from the metadata of an EmbeddingStore.
+        """
+        index = cls()
+        index.add(list(store.entries), [entry["metadata"] for entry in store.entries.values()])
+        return index
+
+    @classmethod
+    def from_manifest(cls, path):
+        """
+        Build the index from the import manifest (vector ID -> metadata) of src/data_import.py.
+        """
+        with open(path, encoding="utf-8") as f:
+            vectors = json.load(f)["vectors"]
+        index = cls()
+        index.add(list(vectors), list(vectors.values()))
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k=60, top_k=2, keep=None):
+    """
+    Fuse ranked match lists with reciprocal rank fusion: every list adds 1 / (k + rank) to the
+    fused score of its matches, so the scores of the lists do not need to be comparable.
+
+    Args:
+        rankings (dict): Name of the ranking ("vector", "lexical") -> list of matches, best first
+        k (int): RRF constant, larger values weaken the influence of the top ranks
+        keep (callable): Optional filter on the fused matches, applied before the cut to top_k so
+            a discarded match does not take the slot of a match ranked below it
+
+    Returns:
+        list: The top_k matches, with the "rrf_score" and the original score of every ranking
+        ("vector_score", "lexical_score"). "score" stays the vector score (0.0 if the match was only
+        found lexically), so the confidence filter keeps working on cosine similarity.
+    """
+    fused = {}
+    for name, matches in rankings.items():
+        for rank, match in enumerate(matches, start=1):
+            entry = fused.setdefault(match["id"], {"id": match["id"], "metadata": match["metadata"], "score": 0.0, "rrf_score": 0.0, "exact": False})
+            entry["rrf_score"] += 1 / (k + rank)
+            entry[f"{name}_score"] = match["score"]
+            if name == "vector":
+                entry["score"] = match["score"]
+            entry["exact"] = entry["exact"] or match.get("exact", False)
+    matches = sorted(fused.values(), key=lambda match: match["rrf_score"], reverse=True)
+    if keep is not None:
+        matches = [match for match in matches if keep(match)]
+    return matches[:top_k]
+
+
+def load_lexical_index(store_path=None, manifest_path=None):
+    """
+    Build the lexical index from the embedding store, or from the import manifest if there is no store.
+
+    Returns:
+        LexicalIndex: The index, None if neither exists
+    """
+    if store_path and os.path.exists(store_path):
+        from src.embedding_store import EmbeddingStore
+        return LexicalIndex.from_store(EmbeddingStore.load(store_path))
+    if manifest_path and os.path.exists(manifest_path):
+        return LexicalIndex.from_manifest(manifest_path)
+    return None
@@ -0,0 +1,113 @@
+import json
+import os
+import numpy as np
+
+
+class LocalVectorIndex:
+    """
+    In-process FAQ vector index, used instead of Pinecone when retrieval.backend is "local".
+
+    Vectors are L2-normalised once at load time and kept in one float32 matrix per
+    (location, language) partition, so a cosine top-k query is a single matrix-vector product.
+    """
+
+    def __init__(self):
+        self.partitions = {}
+
+    def add(self, ids, vectors, metadata):
+        """
+        Add vectors with their Pinecone-style metadata to the index.
+
+        Args:
+            ids (list): Vector IDs
+            vectors (list or np.ndarray): Embeddings, one row per ID
+            metadata (list): Metadata dicts with at least location, language, uniqe and text
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        grouped = {}
+        for row, (vector_id, meta) in enumerate(zip(ids, metadata)):
+            key = (meta.get("location"), meta.get("language"))
+            grouped.setdefault(key, []).append((row, vector_id, meta))
+
+        for key, entries in grouped.items():
+            rows = [row for row, _, _ in entries]
+            matrix = _normalize(vectors[rows])
+            partition_ids = [vector_id for _, vector_id, _ in entries]
+            partition_meta = [meta for _, _, meta in entries]
+            if key in self.partitions:
+                old_matrix, old_ids, old_meta = self.partitions[key]
+                matrix = np.vstack([old_matrix, matrix])
+                partition_ids = old_ids + partition_ids
+                partition_meta = old_meta + partition_meta
+            self.partitions[key] = (matrix, partition_ids, partition_meta)
+
+    def query(self, vector, top_k=2, filter=None):
+        """
+        Return the top_k most similar vectors of one (location, language) partition.
+
+        The result has the same shape as a Pinecone query response, so it can be
+        passed to confidence_score_filter unchanged.
+        """
+        filter = filter or {}
+        key = (filter.get("location"), filter.get("language"))
+        matches = []
+        if key in self.partitions:
+            matrix, ids, metadata = self.partitions[key]
+            query = _normalize(np.asarray(vector, dtype=np.float32))
+            scores = matrix @ query
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            matches = [{"id": ids[i], "score": float(scores[i]), "metadata": metadata[i]} for i in top]
+        return {"results": [{"matches": matches}]}
+
+    def __len__(self):
+        return sum(len(ids) for _, ids, _ in self.partitions.values())
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Load an index from a snapshot written by save_snapshot.
+        """
+        index = cls()
+        with np.load(path, allow_pickle=False) as data:
+            ids = data["ids"].tolist()
+            metadata = [json.loads(meta) for meta in data["metadata"].tolist()]
+            index.add(ids, data["vectors"], metadata)
+        return index
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        Build an index on an EmbeddingStore without copying the vectors: the rows of the store are
+        normalised and sorted by partition, so every partition is a slice of the memory map.
+        """
+        index = cls()
+        for key, start, end, ids, metadata in store.partitions():
+            index.partitions[key] = (store.vectors[start:end], ids, metadata)
+        return index
+
+
+def save_snapshot(path, vectors):
+    """
+    Save (id, vector, metadata) tuples, as uploaded to Pinecone, to a snapshot file.
+
+    Args:
+        path (str): Target .npz file
+        vectors (list): List of (id, vector, metadata) tuples
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez(
+        path,
+        ids=np.array([vector_id for vector_id, _, _ in vectors], dtype=str),
+        vectors=np.array([vector for _, vector, _ in vectors], dtype=np.float32),
+        metadata=np.array([json.dumps(meta, ensure_ascii=False) for _, _, meta in vectors], dtype=str),
+    )
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
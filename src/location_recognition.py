@@ -2,21 +2,13 @@ import os
 from dotenv import load_dotenv
 import boto3
 import json
-from azure.ai.inference import ChatCompletionsClient
-from azure.core.credentials import AzureKeyCredential
+from src.clients import get_chat_client
 from rapidfuzz import process, fuzz
 from src.helpers import get_text
 import re
 
 load_dotenv()
 
-# Initialize the Azure LLM client for chat completions
-azure_client = ChatCompletionsClient(
-    endpoint=os.getenv("AZURE_LLM_URL"),
-    credential=AzureKeyCredential(os.getenv("AZURE_LLM_KEY"))
-)
-
-
 prompt_de_location = """
     ## Analysiere den folgenden Benutzereingabentext {user_query} und bestimme den Standort aus der Liste der Standorte: {locations}
 
@@ -56,7 +48,7 @@ KNOWN_LOCATIONS = {
        "Unterhaching": "Unterhaching",
     }
 
-def get_location(user_query, language, city=None):
+async def get_location(user_query, language, city=None):
 
     history = []
 
@@ -88,7 +80,7 @@ def get_location(user_query, language, city=None):
     history.append({"role": "user", "content": user_query.strip()})
 
     try:
-        response = azure_client.complete(
+        response = await get_chat_client().complete(
             messages=history,
             response_format="json_object",
             temperature=0, 
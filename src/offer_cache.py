@@ -0,0 +1,64 @@
+import copy
+import time
+from collections import OrderedDict
+
+
+class OfferCache:
+    """
+    Short-lived cache for Apaleo offer lookups, keyed on
+    (property, arrival, departure, adults, children ages, language).
+
+    Empty results are cached as well, so repeated questions about a fully booked weekend
+    do not hit Apaleo again. Values are copied on the way in and out because the offers are
+    converted in place (floats <-> Decimals) before they are stored in the session.
+    """
+
+    def __init__(self, ttl_seconds=120, max_entries=2048):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(location_id, arrival_date, departure_date, adults_num, language, children_ages=None):
+        return (location_id, arrival_date, departure_date, int(adults_num), language, tuple(children_ages or ()))
+
+    def get(self, key):
+        """
+        Returns:
+            found (bool): True if a fresh entry exists
+            offers (list): The cached offers, or None if Apaleo had no suitable offer
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            offers, expires_at = entry
+            if expires_at > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, copy.deepcopy(offers)
+            del self.entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key, offers, ttl_seconds=None):
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self.entries[key] = (copy.deepcopy(offers), time.time() + ttl_seconds)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "size": len(self.entries),
+        }
@@ -0,0 +1,102 @@
+import asyncio
+import math
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+
+
+class CallRateLimiter:
+    """
+    Sliding-window limit for the calls of one caller, checked when a conversation starts.
+
+    The calls are kept per caller in memory. If a DynamoDB table is given, the calls are also
+    counted in the table, so all instances (Lambda containers, server workers) share the count.
+    DynamoDB uses the sliding window counter approximation: one counter item per caller and
+    fixed window, incremented atomically, and the count of the previous window weighted by its
+    overlap with the sliding window. The items expire with the table's TTL attribute expires_at.
+
+    Without a counter table, the conversations of the caller started within the window are
+    counted with the caller-timestamp GSI of the session table (session_table and caller_index),
+    so the limit still holds across Lambda containers.
+    """
+
+    def __init__(self, window_minutes=5, max_calls=3, table=None, max_callers=100000, session_table=None, caller_index=None):
+        self.window_seconds = window_minutes * 60
+        self.max_calls = max_calls
+        self.table = table  # AsyncTable with the string partition key "id", or None
+        self.max_callers = max_callers
+        self.session_table = session_table  # AsyncTable of the conversations, or None
+        self.caller_index = caller_index
+        self.calls = defaultdict(deque)
+
+    def _count_local(self, caller, now):
+        calls = self.calls[caller]
+        while calls and calls[0] <= now - self.window_seconds:
+            calls.popleft()
+        return len(calls)
+
+    def _record_local(self, caller, now):
+        self.calls[caller].append(now)
+        if len(self.calls) > self.max_callers:
+            # drop the callers without a call in the window
+            for other in [other for other, calls in self.calls.items() if not calls or calls[-1] <= now - self.window_seconds]:
+                del self.calls[other]
+
+    async def _count_shared(self, caller, now):
+        """
+        Count the call in DynamoDB and return the number of earlier calls in the sliding window.
+        """
+        window = math.floor(now / self.window_seconds)
+        expires_at = int((window + 2) * self.window_seconds)
+        current, previous = await asyncio.gather(
+            self.table.update_item(
+                Key={"id": f"calls#{caller}#{window}"},
+                UpdateExpression="ADD #calls :one SET #expires_at = :expires_at",
+                ExpressionAttributeNames={"#calls": "calls", "#expires_at": "expires_at"},
+                ExpressionAttributeValues={":one": 1, ":expires_at": expires_at},
+                ReturnValues="UPDATED_NEW",
+            ),
+            self.table.get_item(Key={"id": f"calls#{caller}#{window - 1}"}),
+        )
+        current_calls = int(current["Attributes"]["calls"]) - 1
+        previous_calls = int((previous.get("Item") or {}).get("calls", 0))
+        overlap = 1 - (now - window * self.window_seconds) / self.window_seconds
+        return current_calls + previous_calls * overlap
+
+    async def _count_sessions(self, caller, now):
+        """
+        Count the conversations of the caller started within the window, using the caller-timestamp GSI.
+        """
+        window_start = datetime.fromtimestamp(now - self.window_seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        response = await self.session_table.query(
+            IndexName=self.caller_index,
+            KeyConditionExpression='#caller = :caller_value AND #ts > :ts',
+            ExpressionAttributeNames={'#caller': 'caller', '#ts': 'timestamp'},
+            ExpressionAttributeValues={':caller_value': caller, ':ts': window_start},
+            Select='COUNT',
+        )
+        return response['Count']
+
+    async def register_call(self, caller):
+        """
+        Record a new call of the caller.
+
+        Returns:
+            bool: True if the caller already made max_calls calls within the window
+        """
+        if not caller:
+            return False
+        now = time.time()
+        earlier_calls = self._count_local(caller, now)
+        self._record_local(caller, now)
+        try:
+            if self.table is not None:
+                earlier_calls = max(earlier_calls, await self._count_shared(caller, now))
+            elif self.session_table is not None:
+                earlier_calls = max(earlier_calls, await self._count_sessions(caller, now))
+        except Exception as e:
+            # the local count still applies
+            print("Error in the shared call counter")
+            print(e)
+        print(f"Calls of {caller} in the last {self.window_seconds / 60:g} minutes: {earlier_calls:.1f}")
+        return earlier_calls >= self.max_calls
@@ -1,15 +1,26 @@
 import json
 import re
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timedelta, UTC, timezone
 import time
+from src.config import get_settings
 from src.default_prompt import get_ai_prompt_template
-from src.backend import generate_conversation
+from src.backend import generate_conversation, embed_user_query, streaming_config, get_booking_queue, booking_queue_config
+from src.booking_worker import BookingWorkerPool
+from src.streaming import unspoken_remainder
+from src.async_dynamodb import AsyncTable
+from src.session_schema import SCHEMA_VERSION, rebuild_history, decompress
+from src.session_store import create_session_store, SessionConflictError
+from src.rate_limiter import CallRateLimiter
+from src.timing import timed
+from src.api_connection import offer_cache, offer_cache_config, prefetch_offers_loop
 from src.helpers import enhance_pronunciation, remove_emojis, get_text, convert_to_international
 import uuid
 import boto3
 import sentry_sdk
-import yaml
 from pathlib import Path
 
 import os
@@ -17,45 +28,69 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-def load_config():
-    config_path = Path("config.yaml")
-    with open(config_path) as f:
-        config = yaml.safe_load(f)
-    
-    # Replace environment variables
-    # You might want to add more sophisticated environment variable handling
-    if "${DYNAMO_DB_TABLE}" in config["database"]["table_name"]:
-        config["database"]["table_name"] = os.getenv("DYNAMO_DB_TABLE")
-    if "${LOCAL_DYNAMO_DB_URL}" in config["database"]["local"]["url"]:
-        config["database"]["local"]["url"] = os.getenv("LOCAL_DYNAMO_DB_URL")
-    
-    return config
-
 # Load configuration at startup
-config = load_config()
+settings = get_settings()
 
 # Then use it in your code like:
-LANGUAGE = config["speech"]["default_language"]
-VOICE_NAME = config["speech"]["default_voice"]
+LANGUAGE = settings.speech.default_language
+VOICE_NAME = settings.speech.default_voice
 
-LOCAL_DYNAMO_DB_URL = config["database"]["local"]["url"]
-DYNAMO_DB_TABLE = config["database"]["table_name"]
-WHITE_LIST = config["call"]["whitelist"]
+LOCAL_DYNAMO_DB_URL = settings.database.local.url
+DYNAMO_DB_TABLE = settings.database.table_name
 
 CALLER = None
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Start the background jobs of a long-running server (uvicorn). Not used on Lambda, where Mangum runs with lifespan="off".
+    """
+    background_tasks = []
+    if offer_cache is not None and offer_cache_config.get("prefetch", {}).get("enabled"):
+        print("Starting offer prefetch ...")
+        background_tasks.append(asyncio.create_task(prefetch_offers_loop()))
+    worker_pool = None
+    booking_queue, booking_job_store = get_booking_queue() if booking_queue_config.get("workers", 0) > 0 else (None, None)
+    if booking_queue is not None:
+        print("Starting booking workers ...")
+        worker_pool = BookingWorkerPool(
+            booking_queue,
+            booking_job_store,
+            workers=booking_queue_config["workers"],
+            poll_interval_seconds=booking_queue_config.get("poll_interval_seconds", 1),
+            max_attempts=booking_queue_config.get("max_attempts", 3),
+            retry_delay_seconds=booking_queue_config.get("retry_delay_seconds", 60),
+        )
+        worker_pool.start()
+    yield
+    for task in background_tasks:
+        task.cancel()
+    if worker_pool is not None:
+        await worker_pool.stop()
+    await session_store.flush()
+
+app = FastAPI(lifespan=lifespan)
 
 
 if LOCAL_DYNAMO_DB_URL:
     print("Using local DynamoDB ...")
-    dynamodb = boto3.resource('dynamodb', endpoint_url=LOCAL_DYNAMO_DB_URL, region_name=config["database"]["local"]["region"])
+    dynamodb = boto3.resource('dynamodb', endpoint_url=LOCAL_DYNAMO_DB_URL, region_name=settings.database.local.region)
 else:
     print("Using remote DynamoDB ...")
     print(DYNAMO_DB_TABLE)
-    dynamodb = boto3.resource('dynamodb', region_name=config["database"]["region"])
-
-table = dynamodb.Table(DYNAMO_DB_TABLE)
+    dynamodb = boto3.resource('dynamodb', region_name=settings.database.region)
+
+table = AsyncTable(dynamodb.Table(DYNAMO_DB_TABLE))
+session_store_config = settings.session_store
+call_rate_limiter = CallRateLimiter(
+    window_minutes=settings.call.repeat_caller.window_minutes,
+    max_calls=settings.call.repeat_caller.max_calls,
+    table=AsyncTable(dynamodb.Table(settings.call.repeat_caller.shared_table)) if settings.call.repeat_caller.shared_table else None,
+    # without a counter table, count the caller's conversations in the session table (remote DynamoDB only)
+    session_table=table if not LOCAL_DYNAMO_DB_URL and session_store_config.backend == "dynamodb" and settings.database.indexes.get("caller_timestamp") else None,
+    caller_index=settings.database.indexes.get("caller_timestamp"),
+)
+session_store = create_session_store(session_store_config.model_dump(), table=table, compress_min_bytes=settings.database.compress_min_bytes)
 
 @app.get("/onsei")
 @app.post("/onsei")
@@ -70,6 +105,7 @@ async def capture_request_test():
 @app.put("/")
 @app.delete("/")
 async def capture_request(request: Request):
+    settings = get_settings()
     print("Request received")
     request_json = await request.json()
     if LOCAL_DYNAMO_DB_URL:
@@ -78,15 +114,15 @@ async def capture_request(request: Request):
         print(request_json)
 
     # Response
-    activitiesURL = config["api"]["conversation_paths"]["activities"] + request_json['conversation']
-    refreshURL = config["api"]["conversation_paths"]["refresh"] + request_json['conversation']
-    disconnectURL = config["api"]["conversation_paths"]["disconnect"] + request_json['conversation']
+    activitiesURL = settings.api.conversation_paths.activities + request_json['conversation']
+    refreshURL = settings.api.conversation_paths.refresh + request_json['conversation']
+    disconnectURL = settings.api.conversation_paths.disconnect + request_json['conversation']
 
     response = {
         "activitiesURL": activitiesURL,
         "refreshURL": refreshURL,
         "disconnectURL": disconnectURL,
-        "expiresSeconds": config["call"]["timeout"]["session_expiry_seconds"]
+        "expiresSeconds": settings.call.timeout.session_expiry_seconds
     }
 
     return response
@@ -96,13 +132,131 @@ async def capture_request(request: Request):
 @app.put("/conversation/activities/{conversation_id}")
 @app.delete("/conversation/activities/{conversation_id}")
 async def capture_activitie(conversation_id: str, request: Request):
+    print("Activitie received")
+    request_json = await request.json()
+    # Mangum buffers the whole response on Lambda, streaming only helps on the uvicorn server
+    if streaming_config().get("enabled", False) and not os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+        return StreamingResponse(stream_activities(conversation_id, request_json), media_type="application/json")
+    return await handle_activity(conversation_id, request_json)
+
+def build_message_activity(bot_response, timestamp):
+    """
+    Build the SSML message activity for a bot response.
+    """
+    settings = get_settings()
+    clean_bot_response = remove_emojis(bot_response)
+    enhanced_bot_response = enhance_pronunciation(clean_bot_response, language=LANGUAGE)
+   
+    bot_response_ssml = settings.response.bot_response_format.format(
+        speech_rate=settings.voice.speech_rate,
+        message=enhanced_bot_response
+    )
+
+    print("\n\n\nBOT: " + bot_response_ssml)   
+
+    return {
+        "id": str(uuid.uuid4()),
+        "timestamp": timestamp,
+        "language": LANGUAGE,
+        "type": "message",
+        "text": bot_response_ssml,
+        "activityParams": {
+            "language": LANGUAGE,
+            "voiceName": VOICE_NAME
+        }
+    }
+
+def build_fallback_activities(timestamp):
+    """
+    Activities for a turn that failed after the response was started: transfer the caller to the team.
+    """
+    settings = get_settings()
+    return [
+        build_message_activity(get_text("service_hotline_open", LANGUAGE), timestamp),
+        {
+            "id": str(uuid.uuid4()),
+            "timestamp": timestamp,
+            "type": "event",
+            "name": "transfer",
+            "activityParams": {
+                "transferTarget": settings.call.transfer.target
+            }
+        },
+    ]
+
+async def stream_activities(conversation_id, request_json):
+    """
+    Stream the activities JSON to the voice gateway: every sentence of an FAQ answer is sent as its
+    own message activity as soon as the LLM has generated it, the remaining activities follow once
+    the turn is complete.
+
+    The chunks form one JSON document, so this only shortens the response time if the gateway
+    reads the activities incrementally, and only on the uvicorn server (Mangum buffers the response
+    on Lambda). If the turn fails, the document is still completed with a transfer to the team.
+    """
+    start_time = time.time()
+    sentence_queue = asyncio.Queue()
+
+    async def run_activity():
+        try:
+            return await handle_activity(conversation_id, request_json, sentence_queue=sentence_queue)
+        finally:
+            sentence_queue.put_nowait(None)
+
+    task = asyncio.create_task(run_activity())
+    streamed = False
+    while (sentence := await sentence_queue.get()) is not None:
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+        if not streamed:
+            print("Time to first sentence: " + str(time.time() - start_time))
+        yield ('{"activities": [' if not streamed else ", ") + json.dumps(build_message_activity(sentence, timestamp))
+        streamed = True
+
+    try:
+        system_response = await task
+    except Exception as e:
+        print(f"Error in the streamed turn: {e}")
+        sentry_sdk.capture_exception(e)
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+        system_response = {"activities": build_fallback_activities(timestamp)}
+    if not streamed:
+        yield json.dumps(system_response)
+        return
+    for activity in system_response["activities"]:
+        yield ", " + json.dumps(activity)
+    yield "]}"
+
+async def handle_activity(conversation_id, request_json, sentence_queue=None):
+    """
+    Process one activity of the voice gateway and return the activities to send back.
+
+    If sentence_queue is given, FAQ answer sentences streamed from the LLM are put into it and
+    left out of the returned message activity.
+    """
+    try:
+        return await process_activity(conversation_id, request_json, sentence_queue)
+    except SessionConflictError:
+        # another worker changed the conversation since it was read (e.g. a stale session cache).
+        # The turn is rejected instead of run again: the LLM call, the offer lookup and a booking
+        # job have already happened once, and the next turn starts from the stored item.
+        print("Session conflict, the turn is rejected")
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+        return {"activities": [build_message_activity(get_text("turn_not_stored", LANGUAGE), timestamp)]}
+
+async def process_activity(conversation_id, request_json, sentence_queue=None):
+    settings = get_settings()
     global LANGUAGE
     global VOICE_NAME
     global CALLER
-    
-    print("Activitie received")
+
     start_time = time.time()
-    request_json = await request.json()
+    spoken_sentences = []
+    on_sentence = None
+    if sentence_queue is not None:
+        def on_sentence(sentence):
+            spoken_sentences.append(sentence)
+            sentence_queue.put_nowait(sentence)
+
     current_time = datetime.now(timezone.utc)
     timestamp = current_time.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
 
@@ -117,80 +271,56 @@ async def capture_activitie(conversation_id: str, request: Request):
     except (IndexError, KeyError):
         caller = None
 
-    if not LOCAL_DYNAMO_DB_URL:
-        try:
-            # Calculate the timestamp for 15 minutes ago in ISO 8601 format
-            current_time = datetime.utcnow()
-            five_minutes_ago_iso = (current_time - timedelta(
-                minutes=config["call"]["repeat_caller"]["window_minutes"]
-            )).isoformat(timespec='seconds') + 'Z'
-
-            response_gsi = table.query(
-                IndexName=config["database"]["indexes"]["caller_timestamp"],
-                KeyConditionExpression='#caller = :caller_value AND #ts > :ts',
-                ExpressionAttributeNames={
-                    '#caller': 'caller',      # The caller attribute name
-                    '#ts': 'timestamp'        # The timestamp attribute name
-                },
-                ExpressionAttributeValues={
-                    ':caller_value': caller,  # Replace with the caller value you are querying for
-                    ':ts': five_minutes_ago_iso  # Timestamp for 5 minutes ago
-                }
-            )
-
-            print("Response from the GSI: ")
-            print(response_gsi)
-            items = response_gsi['Items']
-            
-            print("Number of items in GSI in the last 5 minutes:")
-            print(len(items))
+    try:
+        user_query = request_json['activities'][0]['text']
+    except (IndexError, KeyError):
+        user_query = None
 
-            num_calls_in_last_5_minutes = len(items)
-    
+    # The session read and the query embedding do not depend on each other, so they run concurrently
+    # and the critical path is the slower of them instead of their sum
+    timings = {}
+    session_task = asyncio.create_task(timed(timings, "session_read", session_store.get(conversation_id)))
+    embedding_task = asyncio.create_task(timed(timings, "embedding", embed_user_query(user_query))) if user_query else None
 
-            if num_calls_in_last_5_minutes >= config["call"]["repeat_caller"]["max_calls"]:
-                print("Transfer the call")
-                activities = list()
-                activities.append({
-                    "id": str(uuid.uuid4()),
-                    "timestamp": timestamp,
-                    "language": config["speech"]["default_language"],
-                    "type": "message",
-                    "text": config["call"]["repeat_caller"]["transfer_message"],
-                    "activityParams": {
-                        "language": config["speech"]["default_language"],
-                        "voiceName": config["speech"]["default_voice"]
-                    }
-                })
-                activities.append({
-                    "id": str(uuid.uuid4()),
-                    "timestamp": timestamp,
-                    "type": "event",
-                    "name": "transfer",
-                    "activityParams": {
-                        "transferTarget": config["call"]["transfer"]["target"]
-                    }
-                })
-                print(activities)
-                system_response = {"activities": activities}
-                return system_response
-            
-        except Exception as e:
-            print("\n\nError in the GSI query")
-            print(e)
-            pass
-
-    ## End of Call Redirection Part###
-
-    item = table.get_item(Key={'id': conversation_id}).get("Item")
+    item = await session_task
     print("\n\n\nItem")
     print(item)
     if item is None:
         print("New conversation")
+        # repeated calls are only counted when a conversation starts
+        if await timed(timings, "repeat_caller_check", call_rate_limiter.register_call(caller)):
+            print("Transfer the call")
+            activities = list()
+            activities.append({
+                "id": str(uuid.uuid4()),
+                "timestamp": timestamp,
+                "language": settings.speech.default_language,
+                "type": "message",
+                "text": settings.call.repeat_caller.transfer_message,
+                "activityParams": {
+                    "language": settings.speech.default_language,
+                    "voiceName": settings.speech.default_voice
+                }
+            })
+            activities.append({
+                "id": str(uuid.uuid4()),
+                "timestamp": timestamp,
+                "type": "event",
+                "name": "transfer",
+                "activityParams": {
+                    "transferTarget": settings.call.transfer.target
+                }
+            })
+            print(activities)
+            system_response = {"activities": activities}
+            if embedding_task is not None:
+                embedding_task.cancel()
+            return system_response
+
         booking_data = {}
         # Set language at the beginning of the conversation to German
-        LANGUAGE = config["speech"]["default_language"]
-        VOICE_NAME = config["speech"]["default_voice"]
+        LANGUAGE = settings.speech.default_language
+        VOICE_NAME = settings.speech.default_voice
         try:
             parts = request_json['activities'][0]['parameters']['callerDisplayName'].split(":", 1)
             get_id = parts[0] if not parts[0].isdigit() else parts[1]
@@ -205,29 +335,32 @@ async def capture_activitie(conversation_id: str, request: Request):
             caller = None
 
         print("Caller: " + str(caller))
-        if caller in WHITE_LIST:
+        if caller in settings.call.whitelist:
             white_list_transfer = {
                 "id": str(uuid.uuid4()),
                 "timestamp": timestamp,
                 "type": "event",
                 "name": "transfer",
                 "activityParams": {
-                    "transferTarget": config["call"]["transfer"]["target"]
+                    "transferTarget": settings.call.transfer.target
                 }
             }
             print(white_list_transfer)
+            if embedding_task is not None:
+                embedding_task.cancel()
             return json.dumps({"activities": [white_list_transfer]})
 
         # Get the hotel properties from the YAML configuration file
-        properties = config.get("hotel_info", {}).get("properties", {})
+        properties = settings.hotel_info.properties
         # Get the hotel name based on the get_id value
         property_name = next((hotel_name for hotel_name, id_value in properties.items() if id_value == get_id and get_id != None), None)
         property_name = "Stuttgart" 
 
-        table.put_item(Item={'id': conversation_id, 'messages': config["response"]["init_message"], "system_history": [], "timestamp": timestamp, "property_name": property_name, "caller": caller, "booking_data": booking_data, "voice_name": VOICE_NAME})
+        await session_store.create({'id': conversation_id, 'schema_version': SCHEMA_VERSION, 'turns': [], "timestamp": timestamp, "property_name": property_name, "caller": caller, "booking_data": booking_data, "voice_name": VOICE_NAME})
         bot_response = get_ai_prompt_template() # get the German AI prompt
 
-    elif item.get('messages') == config["response"]["init_message"]:
+    elif rebuild_history(item) is None:
+        # the welcome message has been played, this is the first user query
         print(request_json)
         user_query = request_json['activities'][0]['text']
         property_name = item.get('property_name')
@@ -241,7 +374,7 @@ async def capture_activitie(conversation_id: str, request: Request):
             print("USER QUERY> 2 : " + user_query)
             LANGUAGE = str(request_json['activities'][0]['parameters']['recognitionOutput']['PrimaryLanguage']['Language'])
             print("Language: " + LANGUAGE)
-        VOICE_NAME = config["speech"]["default_voice"]
+        VOICE_NAME = settings.speech.default_voice
         print("USER: " + user_query)
 
 
@@ -250,28 +383,28 @@ async def capture_activitie(conversation_id: str, request: Request):
                     convert_to_international(CALLER) if CALLER and CALLER.isdigit() else None
                 )
 
-        backend_respone = await generate_conversation(user_query, property_name=property_name, language=LANGUAGE, location_data=location_data, booking_data=booking_data)
+        backend_respone = await generate_conversation(user_query, property_name=property_name, language=LANGUAGE, location_data=location_data, booking_data=booking_data, on_sentence=on_sentence, embedding_task=embedding_task, timings=timings)
         print(backend_respone)
 
-        table.update_item(
-            Key={'id': conversation_id}, 
-            UpdateExpression="set messages=:m, property_name=:p, location_data=:l, offers=:o, booking_data=:b, voice_name=:v",
-            ExpressionAttributeValues={
-                ':m': backend_respone['history'], 
-                ':p': backend_respone['property_name'],
-                ':l': {"city": backend_respone.get('city', None), "location_attempts": backend_respone.get('location_attempts', 0)},
-                ':o': backend_respone.get('offers', []),
-                ':b': backend_respone.get('booking_data', {}),
-                ':v': VOICE_NAME
-            }
-        )
+        await timed(timings, "session_write", session_store.save_turn(
+            item,
+            backend_respone['history'],
+            {
+                'property_name': backend_respone['property_name'],
+                'location_data': {"city": backend_respone.get('city', None), "location_attempts": backend_respone.get('location_attempts', 0)},
+                'offers': backend_respone.get('offers', []),
+                'booking_data': backend_respone.get('booking_data', {}),
+                'voice_name': VOICE_NAME,
+            },
+            faq_ids=backend_respone.get('match_ids'),
+            timings=timings,
+            timestamp=timestamp,
+        ))
         bot_response = backend_respone['gpt_response']
     else:   
-        history = item.get('messages')
+        history = rebuild_history(item)
         property_name = item.get('property_name')
-        system_history = item.get('system_history')
-        system_history.append(history[0])
-        offers = item.get('offers')
+        offers = decompress(item.get('offers'))
         booking_data = item.get('booking_data', {})
         location_data = item.get('location_data', {})
         VOICE_NAME = item.get('voice_name')
@@ -289,45 +422,30 @@ async def capture_activitie(conversation_id: str, request: Request):
 
         user_query = request_json['activities'][0]['text']
         print("USER: " + user_query)
-        backend_respone = await generate_conversation(user_query, history=history, property_name=property_name, language=LANGUAGE, offers=offers, booking_data=booking_data, location_data=location_data)
-
-        table.update_item(
-            Key={'id': conversation_id}, 
-            UpdateExpression="set messages=:m, property_name=:p, system_history=:s, location_data=:l, offers=:o, booking_data=:b",
-            ExpressionAttributeValues={
-                ':m': backend_respone['history'], 
-                ':p': backend_respone['property_name'],
-                ':s': system_history,
-                ':l': {"city": backend_respone.get('city', None), "location_attempts": backend_respone.get('location_attempts', 0)},
-                ':o': backend_respone['offers'],
-                ':b': backend_respone['booking_data']
-            }
-        )      
+        backend_respone = await generate_conversation(user_query, history=history, property_name=property_name, language=LANGUAGE, offers=offers, booking_data=booking_data, location_data=location_data, on_sentence=on_sentence, embedding_task=embedding_task, timings=timings)
+
+        await timed(timings, "session_write", session_store.save_turn(
+            item,
+            backend_respone['history'],
+            {
+                'property_name': backend_respone['property_name'],
+                'location_data': {"city": backend_respone.get('city', None), "location_attempts": backend_respone.get('location_attempts', 0)},
+                'offers': backend_respone['offers'],
+                'booking_data': backend_respone['booking_data'],
+            },
+            faq_ids=backend_respone.get('match_ids'),
+            timings=timings,
+            timestamp=timestamp,
+        ))
         bot_response = backend_respone['gpt_response']
 
     activities = list()
 
-    clean_bot_response = remove_emojis(bot_response)
-    enhanced_bot_response = enhance_pronunciation(clean_bot_response, language=LANGUAGE)
-   
-    bot_response_ssml = config["response"]["bot_response_format"].format(
-        speech_rate=config["voice"]["speech_rate"],
-        message=enhanced_bot_response
-    )
-
-    print("\n\n\nBOT: " + bot_response_ssml)   
-
-    activities.append({
-    "id": str(uuid.uuid4()),
-    "timestamp": timestamp,
-    "language": LANGUAGE,
-    "type": "message",
-    "text": bot_response_ssml,
-    "activityParams": {
-        "language": LANGUAGE,
-        "voiceName": VOICE_NAME
-        }
-    })
+    if spoken_sentences:
+        # the beginning of the answer has already been streamed to the voice gateway
+        bot_response = unspoken_remainder(bot_response, spoken_sentences)
+    if bot_response or not spoken_sentences:
+        activities.append(build_message_activity(bot_response, timestamp))
 
     try:
         if backend_respone.get('end_of_conversation'):
@@ -340,7 +458,7 @@ async def capture_activitie(conversation_id: str, request: Request):
         phone_number = backend_respone.get('phone_number')
         print(phone_number)
 
-        phone_number = config["call"]["transfer"]["default_extension"]
+        phone_number = settings.call.transfer.default_extension
 
         if backend_respone.get('phone_number'):
             activities.append({
@@ -349,7 +467,7 @@ async def capture_activitie(conversation_id: str, request: Request):
                 "type": "event",
                 "name": "transfer",
                 "activityParams": {
-                    "transferTarget": "sip:" + phone_number + config["call"]["transfer"]["sip_domain"],
+                    "transferTarget": "sip:" + phone_number + settings.call.transfer.sip_domain,
                 }
             })
 
@@ -367,11 +485,12 @@ async def capture_activitie(conversation_id: str, request: Request):
     print(activities)
     end_time = time.time()  # get current time after the API call
     print("Time taken for phonecall response call: " + str(end_time - start_time))
+    print("Stage timings: " + json.dumps(timings))
     system_response = {"activities": activities}
     
     # If the response time exceeds the warning threshold, send a warning to Sentry
-    if (end_time - start_time) > config["call"]["timeout"]["warning_threshold_seconds"]:
-        exceeding_time_message = f"Phonetical response exceeds {config['call']['timeout']['warning_threshold_seconds']} seconds: {end_time - start_time}"
+    if (end_time - start_time) > settings.call.timeout.warning_threshold_seconds:
+        exceeding_time_message = f"Phonetical response exceeds {settings.call.timeout.warning_threshold_seconds} seconds: {end_time - start_time}, stage timings: {json.dumps(timings)}"
         sentry_sdk.capture_message(exceeding_time_message, "warning")
         print(exceeding_time_message)
 
@@ -403,6 +522,7 @@ async def capture_disconnect(conversation_id: str, request: Request):
 @app.put("/conversation/refresh/{conversation_id}")
 @app.delete("/conversation/refresh/{conversation_id}")
 async def capture_refresh(conversation_id: str, request: Request):
+    settings = get_settings()
     print("Refresh received")
     request_json = await request.json()
     if  LOCAL_DYNAMO_DB_URL:
@@ -411,6 +531,6 @@ async def capture_refresh(conversation_id: str, request: Request):
         print(request_json)
 
     # Response
-    response = { "expiresSeconds": config["call"]["timeout"]["refresh_expiry_seconds"]}
+    response = { "expiresSeconds": settings.call.timeout.refresh_expiry_seconds}
 
     return response
\ No newline at end of file
@@ -0,0 +1,205 @@
+"""
+Compact schema of the conversation items in DynamoDB.
+
+Version 1 items store the whole history in `messages` (including the rendered system prompt with
+the retrieved contexts) and append the previous system prompt to `system_history` on every turn,
+so the item and the write capacity grow with every turn.
+
+Version 2 items (schema_version = 2) store one delta per turn in `turns`, appended with
+list_append:
+
+    {"messages": [...], "faq_ids": [...], "timings_ms": {...}, "timestamp": "..."}
+
+`messages` are the messages added in that turn (user query, assistant answer, ...). The system
+prompt is not stored: it is rendered again from the retrieved contexts on every turn, so
+rebuild_history only puts an empty placeholder at history[0]. Large attributes (offers, big turn
+deltas) are stored zlib-compressed as Binary. Version 1 items are still read, and converted on
+their next write.
+
+This keeps the item small: it grows by one compact delta per turn instead of a full transcript
+and a system prompt. The write cost per turn is not constant, though. DynamoDB charges an
+UpdateItem by the size of the whole item, so the write units still grow slowly with the length
+of the call, only from a much smaller base.
+"""
+import json
+import zlib
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary
+
+SCHEMA_VERSION = 2
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def compress(value, min_bytes=2048):
+    """
+    Compress a value with zlib if its JSON is at least min_bytes long, otherwise return it unchanged.
+    """
+    if value is None or min_bytes is None:
+        return value
+    data = json.dumps(value, default=_json_default, ensure_ascii=False).encode("utf-8")
+    if len(data) < min_bytes:
+        return value
+    return Binary(zlib.compress(data))
+
+
+def decompress(value):
+    """
+    Reverse compress, numbers come back as Decimal like in every other DynamoDB attribute.
+    """
+    if isinstance(value, (Binary, bytes, bytearray)):
+        data = value.value if isinstance(value, Binary) else bytes(value)
+        return json.loads(zlib.decompress(data), parse_float=Decimal, parse_int=Decimal)
+    return value
+
+
+def get_messages(item):
+    """
+    Get the stored messages of a conversation without the system prompt.
+
+    Returns:
+        list: The messages, None if the conversation has not started yet (or the item is None)
+    """
+    if item is None:
+        return None
+    if item.get("schema_version") == SCHEMA_VERSION:
+        turns = item.get("turns") or []
+        if not turns:
+            return None
+        messages = []
+        for turn in turns:
+            messages.extend(decompress(turn.get("messages")) or [])
+        return messages
+    messages = item.get("messages")
+    if not isinstance(messages, list):
+        # "initialized" marker of a new version 1 conversation
+        return None
+    return [message for message in messages if message.get("role") != "system"]
+
+
+def rebuild_history(item):
+    """
+    Rebuild the history for generate_conversation, with a placeholder for the system prompt at history[0].
+    """
+    messages = get_messages(item)
+    if messages is None:
+        return None
+    return [{"role": "system", "content": ""}] + messages
+
+
+def expand_item(item):
+    """
+    Get a conversation item with the full transcript in `messages` and decompressed attributes,
+    for exports. Version 1 items are returned unchanged.
+    """
+    if item.get("schema_version") != SCHEMA_VERSION:
+        return item
+    expanded = {key: decompress(value) for key, value in item.items()}
+    expanded["turns"] = [{key: decompress(value) for key, value in turn.items()} for turn in item.get("turns") or []]
+    expanded["messages"] = get_messages(item) or []
+    return expanded
+
+
+def build_turn(item, history, faq_ids=None, timings=None, timestamp=None, compress_min_bytes=2048):
+    """
+    Build the delta of a turn.
+
+    Only the messages added in this turn are stored. If the stored messages are no prefix of
+    the new history (e.g. the location retry removed messages, or a version 1 item), the turns
+    have to be rewritten as one delta with all messages.
+
+    Returns:
+        turn (dict): The delta to append
+        rewrite (bool): True if the turns must be replaced by [turn]
+    """
+    stored = get_messages(item) or []
+    messages = [message for message in history if message.get("role") != "system"]
+    rewrite = item.get("schema_version") != SCHEMA_VERSION or messages[:len(stored)] != stored
+    turn = {
+        "messages": compress(messages if rewrite else messages[len(stored):], compress_min_bytes),
+        "faq_ids": list(faq_ids or []),
+        "timings_ms": {stage: int(seconds * 1000) for stage, seconds in (timings or {}).items()},
+        "timestamp": timestamp,
+    }
+    return turn, rewrite
+
+
+def build_session_update(item, history, attributes, faq_ids=None, timings=None, timestamp=None, compress_min_bytes=2048, versioned=False):
+    """
+    Build the update of a conversation item after a turn.
+
+    Args:
+        item (dict): The item read at the beginning of the turn
+        history (list): The history returned by generate_conversation
+        attributes (dict): Other attributes to set, e.g. booking_data; offers are compressed
+        faq_ids (list): The IDs of the retrieved FAQ entries
+        timings (dict): Stage timings in seconds
+        versioned (bool): Only update if the stored item still has the version of item (optimistic
+            locking) and increment the version
+
+    Returns:
+        dict: Keyword arguments for table.update_item (without Key)
+    """
+    turn, rewrite = build_turn(item, history, faq_ids, timings, timestamp, compress_min_bytes)
+
+    names = {"#turns": "turns", "#schema_version": "schema_version"}
+    values = {":turn": [turn], ":schema_version": SCHEMA_VERSION}
+    sets = ["#schema_version = :schema_version"]
+    if rewrite:
+        sets.append("#turns = :turn")
+    else:
+        sets.append("#turns = list_append(if_not_exists(#turns, :empty), :turn)")
+        values[":empty"] = []
+    for index, (name, value) in enumerate(attributes.items()):
+        if name == "offers":
+            value = compress(value, compress_min_bytes)
+        names[f"#a{index}"] = name
+        values[f":a{index}"] = value
+        sets.append(f"#a{index} = :a{index}")
+
+    condition = None
+    if versioned:
+        names["#version"] = "version"
+        values[":next_version"] = int(item.get("version") or 0) + 1
+        sets.append("#version = :next_version")
+        if item.get("version") is None:
+            condition = "attribute_not_exists(#version)"
+        else:
+            values[":version"] = item["version"]
+            condition = "#version = :version"
+
+    update_expression = "SET " + ", ".join(sets)
+    if item.get("schema_version") != SCHEMA_VERSION:
+        names["#messages"] = "messages"
+        names["#system_history"] = "system_history"
+        update_expression += " REMOVE #messages, #system_history"
+    update = {
+        "UpdateExpression": update_expression,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+    if condition is not None:
+        update["ConditionExpression"] = condition
+    return update
+
+
+def apply_session_update(item, history, attributes, faq_ids=None, timings=None, timestamp=None, compress_min_bytes=2048):
+    """
+    Apply the update of build_session_update to a copy of the item, for the session cache and the
+    local session backends.
+    """
+    turn, rewrite = build_turn(item, history, faq_ids, timings, timestamp, compress_min_bytes)
+    updated = dict(item)
+    updated.pop("messages", None)
+    updated.pop("system_history", None)
+    updated["schema_version"] = SCHEMA_VERSION
+    updated["turns"] = [turn] if rewrite else list(item.get("turns") or []) + [turn]
+    for name, value in attributes.items():
+        updated[name] = compress(value, compress_min_bytes) if name == "offers" else value
+    updated["version"] = int(item.get("version") or 0) + 1
+    return updated
@@ -0,0 +1,261 @@
+import asyncio
+import copy
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import sentry_sdk
+from botocore.exceptions import ClientError
+
+from src.session_schema import apply_session_update, build_session_update
+
+
+class SessionConflictError(Exception):
+    """
+    The conversation item was changed by another worker since it was read.
+    """
+
+
+class DynamoDBSessionBackend:
+    """
+    Conversation items in DynamoDB, written with one conditional update per turn.
+    """
+
+    def __init__(self, table, compress_min_bytes=2048):
+        self.table = table  # AsyncTable
+        self.compress_min_bytes = compress_min_bytes
+
+    async def get(self, conversation_id):
+        return (await self.table.get_item(Key={"id": conversation_id})).get("Item")
+
+    async def create(self, item):
+        try:
+            await self.table.put_item(Item=item, ConditionExpression="attribute_not_exists(id)")
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                raise SessionConflictError(item["id"]) from e
+            raise
+
+    async def update(self, item, history, attributes, **turn):
+        """
+        Returns:
+            dict: The updated item
+        """
+        try:
+            response = await self.table.update_item(
+                Key={"id": item["id"]},
+                ReturnValues="ALL_NEW",
+                **build_session_update(item, history, attributes, compress_min_bytes=self.compress_min_bytes, versioned=True, **turn),
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                raise SessionConflictError(item["id"]) from e
+            raise
+        return response["Attributes"]
+
+
+class SQLiteSessionBackend:
+    """
+    Local stand-in for DynamoDB, e.g. to load test the server without a table. Items are pickled,
+    so they keep the DynamoDB types (Decimal, Binary). path=":memory:" keeps them in memory only.
+    """
+
+    def __init__(self, path=":memory:", compress_min_bytes=2048):
+        self.compress_min_bytes = compress_min_bytes
+        self.lock = threading.Lock()
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, version INTEGER, item BLOB)")
+        self.connection.commit()
+
+    def _get(self, conversation_id):
+        with self.lock:
+            row = self.connection.execute("SELECT item FROM sessions WHERE id = ?", (conversation_id,)).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def _create(self, item):
+        try:
+            with self.lock:
+                self.connection.execute(
+                    "INSERT INTO sessions VALUES (?, ?, ?)", (item["id"], item.get("version"), pickle.dumps(item))
+                )
+                self.connection.commit()
+        except sqlite3.IntegrityError as e:
+            raise SessionConflictError(item["id"]) from e
+
+    def _update(self, item, history, attributes, **turn):
+        updated = apply_session_update(item, history, attributes, compress_min_bytes=self.compress_min_bytes, **turn)
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE sessions SET version = ?, item = ? WHERE id = ? AND version IS ?",
+                (updated["version"], pickle.dumps(updated), item["id"], item.get("version")),
+            )
+            self.connection.commit()
+        if cursor.rowcount != 1:
+            raise SessionConflictError(item["id"])
+        return updated
+
+    async def get(self, conversation_id):
+        return await asyncio.to_thread(self._get, conversation_id)
+
+    async def create(self, item):
+        return await asyncio.to_thread(self._create, item)
+
+    async def update(self, item, history, attributes, **turn):
+        return await asyncio.to_thread(self._update, item, history, attributes, **turn)
+
+
+class SessionStore:
+    """
+    Reads and writes the conversation items for server.py.
+
+    Active conversations are cached per worker (the calls of the voice gateway stick to one worker),
+    so a turn usually starts without a read. Every write is conditional on the version that was read;
+    if another worker changed the item in between, the turn ran on an outdated item: the cached item
+    is dropped and SessionConflictError is raised, so the caller can reject the turn and the next turn
+    reads the stored item. With write_behind the write is started in the background and the response is returned
+    without waiting for it. The writes of a conversation stay in order and the cache already holds the
+    new item, so the next turn does not wait for the write either. Only use write_behind on a
+    long-running server: a frozen Lambda container may never finish the write.
+    """
+
+    def __init__(self, backend, cache_max_entries=1024, cache_ttl_seconds=900, write_behind=False):
+        self.backend = backend
+        self.cache_max_entries = cache_max_entries
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.write_behind = write_behind
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.conflicts = 0
+
+    def _cache_get(self, conversation_id):
+        entry = self.cache.get(conversation_id)
+        if entry is not None:
+            item, expires_at = entry
+            if expires_at > time.time():
+                self.cache.move_to_end(conversation_id)
+                return item
+            del self.cache[conversation_id]
+        return None
+
+    def _cache_put(self, item):
+        if self.cache_max_entries <= 0:
+            return
+        self.cache[item["id"]] = (item, time.time() + self.cache_ttl_seconds)
+        self.cache.move_to_end(item["id"])
+        while len(self.cache) > self.cache_max_entries:
+            self.cache.popitem(last=False)
+
+    async def get(self, conversation_id):
+        """
+        Get a copy of the conversation item, None for a new conversation.
+        """
+        item = self._cache_get(conversation_id)
+        if item is not None:
+            self.hits += 1
+            return copy.deepcopy(item)
+        self.misses += 1
+        pending = self.pending.get(conversation_id)
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+        item = await self.backend.get(conversation_id)
+        if item is not None:
+            self._cache_put(item)
+        return copy.deepcopy(item)
+
+    async def create(self, item):
+        item = {**item, "version": 1}
+        await self.backend.create(item)
+        self._cache_put(copy.deepcopy(item))
+
+    async def save_turn(self, item, history, attributes, faq_ids=None, timings=None, timestamp=None):
+        """
+        Store a turn of the conversation that was read as item.
+        """
+        turn = {"faq_ids": faq_ids, "timings": timings, "timestamp": timestamp}
+        if not self.write_behind:
+            await self._write(item, history, attributes, turn)
+            return
+        # the next turn on this worker continues from the cache while the write is running
+        self._cache_put(apply_session_update(item, history, attributes, compress_min_bytes=self.backend.compress_min_bytes, **turn))
+        conversation_id = item["id"]
+        task = asyncio.create_task(self._write_after(self.pending.get(conversation_id), item, history, attributes, turn))
+        self.pending[conversation_id] = task
+        task.add_done_callback(lambda done: self.pending.pop(conversation_id, None) if self.pending.get(conversation_id) is done else None)
+
+    async def _write_after(self, previous, item, history, attributes, turn):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            await self._write(item, history, attributes, turn)
+        except Exception as e:
+            print(f"Session write of {item['id']} failed: {e}")
+            sentry_sdk.capture_exception(e)
+            self.cache.pop(item["id"], None)
+
+    async def _write(self, item, history, attributes, turn):
+        try:
+            updated = await self.backend.update(item, history, attributes, **turn)
+        except SessionConflictError:
+            # the turn was based on an outdated item, merging it would overwrite the newer
+            # booking data and offers with stale values
+            self.conflicts += 1
+            self.cache.pop(item["id"], None)
+            message = f"Session {item['id']} was changed by another worker, the turn is not stored"
+            print(message)
+            sentry_sdk.capture_message(message, "warning")
+            raise
+        cached = self._cache_get(item["id"])
+        # with write_behind the cache may already hold a later turn
+        if cached is None or int(cached.get("version") or 0) <= int(updated.get("version") or 0):
+            self._cache_put(updated)
+
+    async def flush(self):
+        """
+        Wait for the pending background writes, e.g. on shutdown.
+        """
+        while self.pending:
+            await asyncio.gather(*list(self.pending.values()), return_exceptions=True)
+
+    def stats(self):
+        return {
+            "cached": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "conflicts": self.conflicts,
+            "pending_writes": len(self.pending),
+        }
+
+
+def create_session_store(store_config, table=None, compress_min_bytes=2048):
+    """
+    Create the session store for the configured backend ("dynamodb", "sqlite" or "memory").
+    """
+    backend_name = store_config.get("backend", "dynamodb")
+    if backend_name == "dynamodb":
+        backend = DynamoDBSessionBackend(table, compress_min_bytes=compress_min_bytes)
+    elif backend_name == "sqlite":
+        backend = SQLiteSessionBackend(store_config.get("path", "data/sessions.db"), compress_min_bytes=compress_min_bytes)
+    elif backend_name == "memory":
+        backend = SQLiteSessionBackend(":memory:", compress_min_bytes=compress_min_bytes)
+    else:
+        raise ValueError(f"Unknown session store backend: {backend_name}")
+    cache_max_entries = store_config.get("cache_max_entries")
+    if cache_max_entries is None:
+        # the turns of a call are spread over the Lambda containers, a cached item would be stale
+        cache_max_entries = 0 if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else 1024
+    return SessionStore(
+        backend,
+        cache_max_entries=cache_max_entries,
+        cache_ttl_seconds=store_config.get("cache_ttl_seconds", 900),
+        write_behind=store_config.get("write_behind", False),
+    )
@@ -8,6 +8,7 @@ from datetime import datetime
 import pandas as pd
 import openpyxl
 from openpyxl import Workbook
+from src.session_schema import expand_item
 
 
 
@@ -46,6 +47,8 @@ def fetch_conversations(table):
     # response = table.scan()  # Get all items from the table
     # items = response.get('Items', [])  # Fetch the items
     items = exponential_backoff_scan(table)
+    # compact (schema version 2) items store per-turn deltas, rebuild the full transcript
+    items = [expand_item(item) for item in items]
 
     # Filter and sort items based on the start datetime if given
 
@@ -0,0 +1,121 @@
+import re
+
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+# Sentences containing one of these words are post-processed in backend.follow_up
+# (hangup or transfer), so early delivery stops before them
+STOP_WORDS = ["verabschiedung", "goodbye", "telefonzentrale", "switchboard"]
+
+
+def extract_string_field(buffer, field):
+    """
+    Extract the value of a top-level string field from a possibly incomplete JSON object.
+
+    Args:
+        buffer (str): The JSON received so far
+        field (str): The field name, e.g. "response"
+
+    Returns:
+        value (str): The decoded value so far, or None if the field has not started yet
+        complete (bool): True if the closing quote of the value has been received
+    """
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(field), buffer)
+    if not match:
+        return None, False
+    chars = []
+    i = match.end()
+    while i < len(buffer):
+        char = buffer[i]
+        if char == '"':
+            return "".join(chars), True
+        if char != "\\":
+            chars.append(char)
+            i += 1
+            continue
+        if i + 1 >= len(buffer):
+            break
+        escaped = buffer[i + 1]
+        if escaped != "u":
+            chars.append(_ESCAPES.get(escaped, escaped))
+            i += 2
+            continue
+        if i + 6 > len(buffer):
+            break
+        code = int(buffer[i + 2:i + 6], 16)
+        i += 6
+        if 0xD800 <= code < 0xDC00:
+            # surrogate pair, wait until the low surrogate is complete
+            if i + 6 > len(buffer):
+                break
+            low = int(buffer[i + 2:i + 6], 16)
+            code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+            i += 6
+        chars.append(chr(code))
+    return "".join(chars), False
+
+
+class ResponseSentenceStream:
+    """
+    Turn streamed LLM JSON chunks into complete sentences of the "response" field.
+
+    Sentences are only released for FAQ-mode answers, because booking, handover and farewell
+    answers are rewritten in backend.follow_up before they are spoken.
+    """
+
+    def __init__(self, min_sentence_chars=20):
+        self.min_sentence_chars = min_sentence_chars
+        self.buffer = ""
+        self.emitted = 0
+        self.stopped = False
+
+    def feed(self, delta):
+        """
+        Add a chunk of the completion and return the sentences that became complete.
+        """
+        self.buffer += delta
+        if self.stopped:
+            return []
+        mode, mode_complete = extract_string_field(self.buffer, "mode")
+        if not mode_complete:
+            return []
+        if mode != "faq":
+            self.stopped = True
+            return []
+        response, response_complete = extract_string_field(self.buffer, "response")
+        if response is None:
+            return []
+
+        pending = response[self.emitted:]
+        boundaries = [match.end() for match in re.finditer(r"[.!?](?=\s)", pending)]
+        if response_complete and pending.strip():
+            boundaries.append(len(pending))
+
+        sentences = []
+        start = 0
+        for end in boundaries:
+            sentence = pending[start:end].strip()
+            if len(sentence) < self.min_sentence_chars and end != len(pending):
+                continue
+            if any(word in sentence.lower() for word in STOP_WORDS):
+                self.stopped = True
+                break
+            sentences.append(sentence)
+            start = end
+        self.emitted += start
+        if response_complete:
+            self.stopped = True
+        return sentences
+
+
+def unspoken_remainder(text, spoken_sentences):
+    """
+    Return the part of the final bot response that has not been delivered early.
+
+    If the final response does not start with the spoken sentences (e.g. because the answer was
+    replaced in backend.follow_up), the whole final response is returned.
+    """
+    spoken = " ".join(" ".join(spoken_sentences).split())
+    normalized_text = " ".join(text.split())
+    if spoken and normalized_text.startswith(spoken):
+        return normalized_text[len(spoken):].strip()
+    return text
@@ -0,0 +1,12 @@
+import time
+
+
+async def timed(timings, stage, awaitable):
+    """
+    Await an awaitable and record its duration in seconds under timings[stage].
+    """
+    start_time = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = round(time.perf_counter() - start_time, 3)